@@ -43,6 +43,7 @@ QUEST_RESTRICTIONS =  [restrictions.SingleStartStateWithNoEnters(), # only one s
 # create a quest
 # this function can throw a questgen.exceptions.RollBackError exception and this is its normal behavior
 # the exception means that the quest could not be created and the attempt should be repeated
+# questgen.generation.generate_quest repeats attempts on the already validated world and collects statistics of rollbacks
 def create_quest():
 
     # form a list of quests for generation
@@ -1,56 +1,80 @@
 # coding: utf-8
 
-# TODO: tests
 from questgen import facts
 
+
 def percents_collector(knowledge_base):
 
     states_to_percents = {}
 
     for start in knowledge_base.filter(facts.Start):
-        states_to_longest_path = {}
-        processed_states = {}
-
-        _persents_collector(knowledge_base=knowledge_base,
-                            path=[start],
-                            internal_quests=-1,
-                            states_to_longest_path=states_to_longest_path,
-                            processed_states=processed_states)
+        states_to_longest_path, states_to_internal_quests = _longest_paths(knowledge_base, start)
 
         longest_path = max(states_to_longest_path.values())
 
-        for state_uid, is_internal in processed_states.items():
-            if not is_internal:
+        for state_uid, internal_quests in states_to_internal_quests.items():
+            if not internal_quests:
                 states_to_percents[state_uid] = 1.0 - float(states_to_longest_path[state_uid]) / longest_path
 
     return states_to_percents
 
 
-def _update_longest_paths(path, paths, delta):
-    for i, state in enumerate(reversed(path)):
-        if state.uid not in paths or paths[state.uid] < i + delta:
-            paths[state.uid] = i + delta
+def _internal_quests(state, internal_quests):
+    '''
+    number of opened nested quests after entering state,
+    None for finish of quest, for which paths are collected
+    '''
+    if isinstance(state, facts.Finish):
+        if not internal_quests:
+            return None
+        return internal_quests - 1
 
+    if isinstance(state, facts.Start):
+        return internal_quests + 1
 
-def _persents_collector(knowledge_base, path, internal_quests, states_to_longest_path, processed_states):
+    return internal_quests
 
-    if isinstance(path[-1], facts.Finish):
-        if not internal_quests:
-            _update_longest_paths(path, states_to_longest_path, 0)
-            processed_states[path[-1].uid] = internal_quests
-            return
-        internal_quests -= 1
 
-    elif isinstance(path[-1], facts.Start):
-        internal_quests += 1
+def _longest_paths(knowledge_base, start):
+    '''
+    longest path (in jumps) from every state reachable from start to finish of start's quest
+
+    graph MUST be a DAG (validated quest), so every state processed once in depth-first post-order
+    '''
+    states_to_longest_path = {}
+    states_to_internal_quests = {}
+
+    stack = [(start.uid, _internal_quests(start, -1), iter(knowledge_base.jumps_from(start.uid)))]
+
+    while stack:
+        state_uid, internal_quests, jumps = stack[-1]
+
+        for jump in jumps:
+            next_state_uid = jump.state_to
+
+            if next_state_uid in states_to_internal_quests:
+                continue
+
+            next_internal_quests = _internal_quests(knowledge_base[next_state_uid], internal_quests)
+
+            if next_internal_quests is None:
+                states_to_longest_path[next_state_uid] = 0
+                states_to_internal_quests[next_state_uid] = 0
+                continue
+
+            stack.append((next_state_uid, next_internal_quests, iter(knowledge_base.jumps_from(next_state_uid))))
+            break
+
+        else:
+            stack.pop()
+
+            paths = [states_to_longest_path[jump.state_to] + 1
+                     for jump in knowledge_base.jumps_from(state_uid)
+                     if jump.state_to in states_to_longest_path]
 
-    for jump in (jump for jump in knowledge_base.filter(facts.Jump) if jump.state_from == path[-1].uid):
-        if jump.state_from in processed_states:
-            _update_longest_paths(path, states_to_longest_path, states_to_longest_path[jump.state_from])
-            continue
+            if paths:
+                states_to_longest_path[state_uid] = max(paths)
 
-        path.append(knowledge_base[jump.state_to])
-        _persents_collector(knowledge_base, path, internal_quests, states_to_longest_path, processed_states)
-        path.pop()
+            states_to_internal_quests[state_uid] = internal_quests
 
-    processed_states[path[-1].uid] = internal_quests
+    return states_to_longest_path, states_to_internal_quests
@@ -0,0 +1,7 @@
+# coding: utf-8
+import sys
+
+from questgen.benchmarks import suite
+
+
+sys.exit(suite.main())
@@ -0,0 +1,35 @@
+# coding: utf-8
+'''
+percents collector on bundled quest templates: one topological pass versus paths enumeration
+
+run: python -m questgen.benchmarks.analysers
+'''
+from questgen import facts
+from questgen import analysers
+from questgen.tests import worlds
+from questgen.tests.legacy import legacy_percents_collector
+from questgen.benchmarks.utils import measure, report
+
+
+# paths enumeration is recursive, so bigger graphs hit recursion limit
+DIAMONDS = (20, 100, 300)
+
+
+def run():
+    for quest_class in worlds.QUESTS:
+        kb = worlds.create_valid_quest(quest_class, quests=worlds.BASE_QUESTS)
+
+        states_number = len(list(kb.filter(facts.State)))
+
+        report('topological pass, %s (%d states)' % (quest_class.TYPE, states_number), measure(lambda: analysers.percents_collector(kb), number=10))
+        report('paths enumeration, %s (%d states)' % (quest_class.TYPE, states_number), measure(lambda: legacy_percents_collector(kb), number=10))
+
+    for diamonds_number in DIAMONDS:
+        kb = worlds.create_diamonds_graph(diamonds_number)
+
+        report('topological pass, %d diamonds' % diamonds_number, measure(lambda: analysers.percents_collector(kb)))
+        report('paths enumeration, %d diamonds' % diamonds_number, measure(lambda: legacy_percents_collector(kb)))
+
+
+if __name__ == '__main__':
+    run()
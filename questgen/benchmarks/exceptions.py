@@ -0,0 +1,67 @@
+# coding: utf-8
+'''
+creation of rollback errors: message formatted by str() versus message formatted in constructor
+
+run: python -m questgen.benchmarks.exceptions
+'''
+from questgen import facts
+from questgen import exceptions
+from questgen.benchmarks.utils import measure, report
+
+
+class LegacyNoFactSelectedError(Exception):
+    MSG = exceptions.NoFactSelectedError.MSG
+
+    def __init__(self, **kwargs):
+        super(LegacyNoFactSelectedError, self).__init__(self.MSG % kwargs)
+        self.arguments = kwargs
+
+
+class LegacyRestrictionError(Exception):
+    MSG = 'wrong requirement %(requirement)r in state %(state)r'
+
+    def __init__(self, **kwargs):
+        super(LegacyRestrictionError, self).__init__(self.MSG % kwargs)
+        self.arguments = kwargs
+
+
+class RestrictionError(exceptions.RollBackError):
+    MSG = LegacyRestrictionError.MSG
+
+
+def raise_and_catch(error_class, number, **kwargs):
+    for i in range(number):
+        try:
+            raise error_class(**kwargs)
+        except Exception as e:
+            e.arguments.get('method')
+
+
+def raise_and_catch_with_snapshot(error_class, number, reserved, **kwargs):
+    # selectors pass copy of reserved uids, since message is formatted later
+    for i in range(number):
+        try:
+            raise error_class(reserved=frozenset(reserved), **kwargs)
+        except Exception as e:
+            e.arguments.get('method')
+
+
+def run(number=10000):
+    for reserved_number in (10, 100, 1000):
+        reserved = set('place_%d' % i for i in range(reserved_number))
+        kwargs = {'method': 'new_place', 'arguments': {'terrains': ('+', '-'), 'professions': None}}
+
+        report('lazy, no fact selected, %d reserved' % reserved_number,
+               measure(lambda: raise_and_catch_with_snapshot(exceptions.NoFactSelectedError, number, reserved, **kwargs)) / number)
+        report('eager, no fact selected, %d reserved' % reserved_number,
+               measure(lambda: raise_and_catch(LegacyNoFactSelectedError, number, reserved=reserved, **kwargs)) / number)
+
+    state = facts.State(uid='state', require=[facts.LocatedIn(object='hero', place='place_%d' % i) for i in range(10)])
+    kwargs = {'requirement': state.require[0], 'state': state}
+
+    report('lazy, restriction', measure(lambda: raise_and_catch(RestrictionError, number, **kwargs)) / number)
+    report('eager, restriction', measure(lambda: raise_and_catch(LegacyRestrictionError, number, **kwargs)) / number)
+
+
+if __name__ == '__main__':
+    run()
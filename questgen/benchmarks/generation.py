@@ -0,0 +1,127 @@
+# coding: utf-8
+'''
+quest generation with retries: rollbacks rate, failed selector methods and time per stage
+
+run: python -m questgen.benchmarks.generation [quests number]
+'''
+import sys
+import time
+import random
+import collections
+
+from questgen import generation
+from questgen.tests import worlds
+
+
+WORLD_SIZES = (100, 1000)
+
+
+def run(quests_number=100):
+    random.seed(0)
+
+    for places_number in WORLD_SIZES:
+        world = worlds.create_world(places_number, places_number * 2)
+        qb = worlds.create_quests_base()
+
+        attempts = []
+        times = []
+
+        for i in range(quests_number):
+            result = generation.generate_quest(world,
+                                               qb,
+                                               restrictions=worlds.WORLD_RESTRICTIONS + worlds.QUEST_RESTRICTIONS,
+                                               world_restrictions=worlds.WORLD_RESTRICTIONS)
+            attempts.extend(result.attempts)
+            times.append(result.time)
+
+        times.sort()
+
+        rollbacks = [attempt for attempt in attempts if attempt.error is not None]
+
+        print('%d places: %d quests, %d attempts, %.1f%% rollbacks' % (places_number,
+                                                                      quests_number,
+                                                                      len(attempts),
+                                                                      100.0 * len(rollbacks) / len(attempts)))
+
+        print('    quest time: median %.3f ms, p95 %.3f ms, max %.3f ms' % (times[len(times) // 2] * 1000,
+                                                                           times[int(len(times) * 0.95)] * 1000,
+                                                                           times[-1] * 1000))
+
+        for stage in (generation.STAGE.CONSTRUCT, generation.STAGE.TRANSFORM, generation.STAGE.VALIDATE):
+            stage_times = [attempt.stages_times[stage] for attempt in attempts if stage in attempt.stages_times]
+            print('    %-10s %8.3f ms per attempt' % (stage, sum(stage_times) / len(stage_times) * 1000))
+
+        reasons = collections.Counter((attempt.error.__qualname__, attempt.method) for attempt in rollbacks)
+
+        for (error, method), number in reasons.most_common():
+            print('    %5d %s %s' % (number, error, method or ''))
+
+
+SPARSE_WORLD_SIZES = ((10, 10), (100, 200))
+
+
+def run_weighted(quests_number=300):
+    '''
+    attempts per quest with uniform and adaptive choice of quest templates
+    '''
+    for places_number, persons_number in SPARSE_WORLD_SIZES:
+        world = worlds.create_world(places_number, persons_number)
+
+        for name, adaptive in (('uniform', False), ('adaptive', True)):
+            random.seed(0)
+
+            qb = worlds.create_quests_base(adaptive=adaptive)
+
+            attempts_number = 0
+            started_at = time.perf_counter()
+
+            for i in range(quests_number):
+                result = generation.generate_quest(world,
+                                                   qb,
+                                                   restrictions=worlds.WORLD_RESTRICTIONS + worlds.QUEST_RESTRICTIONS,
+                                                   world_restrictions=worlds.WORLD_RESTRICTIONS)
+                attempts_number += len(result.attempts)
+
+            print('%d places, %d persons, %-8s: %.3f attempts per quest, %.3f ms per quest' % (places_number,
+                                                                                              persons_number,
+                                                                                              name,
+                                                                                              float(attempts_number) / quests_number,
+                                                                                              (time.perf_counter() - started_at) / quests_number * 1000))
+
+
+CACHED_SEEDS_NUMBER = 10
+
+
+def run_cache(quests_number=300):
+    '''
+    burst of requests for equal world (and hero) with few seeds: generation versus GenerationCache
+    '''
+    for places_number in WORLD_SIZES:
+        world = worlds.create_world(places_number, places_number * 2)
+        qb = worlds.create_quests_base()
+
+        for name, cache in (('without cache', None), ('with cache', generation.GenerationCache(max_size=100))):
+            started_at = time.perf_counter()
+
+            for i in range(quests_number):
+                generation.generate_quest(world,
+                                          qb,
+                                          restrictions=worlds.WORLD_RESTRICTIONS + worlds.QUEST_RESTRICTIONS,
+                                          world_restrictions=worlds.WORLD_RESTRICTIONS,
+                                          seed=i % CACHED_SEEDS_NUMBER,
+                                          cache=cache)
+
+            print('%d places, %-13s: %.3f ms per quest' % (places_number,
+                                                           name,
+                                                           (time.perf_counter() - started_at) / quests_number * 1000), end='')
+
+            if cache is not None:
+                print(', %d hits, %d misses, %d evictions' % (cache.hits, cache.misses, cache.evictions), end='')
+
+            print()
+
+
+if __name__ == '__main__':
+    run(*[int(argument) for argument in sys.argv[1:]])
+    run_weighted()
+    run_cache()
@@ -0,0 +1,69 @@
+# coding: utf-8
+'''
+cost of instrumentation: no callbacks versus aggregator, and percentiles of stages of quests generation
+
+run: python -m questgen.benchmarks.instrumentation [quests number]
+'''
+import sys
+import random
+
+from questgen import facts
+from questgen import generation
+from questgen import instrumentation
+from questgen.machine import Machine
+from questgen.knowledge_base import KnowledgeBase
+from questgen.tests import worlds
+from questgen.benchmarks.utils import measure, report
+
+
+def run(quests_number=100):
+    def empty_loop():
+        for i in range(100000):
+            pass
+
+    def stages_loop():
+        for i in range(100000):
+            with instrumentation.stage(instrumentation.STAGE.MACHINE_STEP):
+                pass
+
+    report('disabled stage context, per call', (measure(stages_loop) - measure(empty_loop)) / 100000)
+
+    random.seed(0)
+
+    data = worlds.create_valid_quest(worlds.Caravan, quests=worlds.BASE_QUESTS).serialize()
+    world = worlds.create_world(100, 200)
+    qb = worlds.create_quests_base()
+
+    def process_quest():
+        worlds.run_machine(Machine(knowledge_base=KnowledgeBase.deserialize(data, facts.FACTS), interpreter=worlds.Interpreter()))
+
+    def generate_quests():
+        random.seed(0)
+
+        for i in range(quests_number):
+            generation.generate_quest(world,
+                                      qb,
+                                      restrictions=worlds.QUEST_RESTRICTIONS,
+                                      world_restrictions=worlds.WORLD_RESTRICTIONS)
+
+    for name, callback in (('disabled', None), ('aggregator', instrumentation.Aggregator())):
+        if callback is not None:
+            instrumentation.register(callback)
+
+        try:
+            report('%s, machine run to finish' % name, measure(process_quest, number=10))
+            report('%s, %d quests generation' % (name, quests_number), measure(generate_quests, repeat=1))
+        finally:
+            if callback is not None:
+                instrumentation.unregister(callback)
+
+    aggregator = instrumentation.Aggregator()
+
+    with instrumentation.collect(aggregator):
+        generate_quests()
+
+    print(aggregator.report())
+
+
+if __name__ == '__main__':
+    run(*[int(argument) for argument in sys.argv[1:]])
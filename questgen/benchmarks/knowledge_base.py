@@ -0,0 +1,132 @@
+# coding: utf-8
+'''
+memory and setup time of per-hero knowledge bases: full copy of world versus layer over shared world
+
+and cost of returning to world state after failed attempt: rebuilding of knowledge base versus rollback to savepoint
+
+and fingerprint of world: first calculation versus incremental updates
+
+run: python -m questgen.benchmarks.knowledge_base
+'''
+import random
+import tracemalloc
+
+from questgen import facts
+from questgen.knowledge_base import KnowledgeBase, LayeredKnowledgeBase
+from questgen import generation
+from questgen.tests import worlds
+from questgen.benchmarks.utils import measure, report
+
+
+WORLD_SIZES = (1000, 10000)
+
+HEROES_NUMBER = 100
+
+
+def create_heroes_knowledge_bases(world, quest_facts, create_knowledge_base):
+    knowledge_bases = []
+
+    for i in range(HEROES_NUMBER):
+        kb = create_knowledge_base(world)
+        kb += quest_facts
+        knowledge_bases.append(kb)
+
+    return knowledge_bases
+
+
+def measure_memory(function):
+    tracemalloc.start()
+
+    try:
+        result = function()
+        memory, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return memory
+
+
+def run():
+    random.seed(0)
+
+    for places_number in WORLD_SIZES:
+        world = worlds.create_world(places_number, places_number * 2)
+
+        result = generation.generate_quest(world, worlds.create_quests_base(), restrictions=())
+        quest_facts = [fact for fact in result.knowledge_base.facts() if fact.uid not in world]
+
+        for name, create_knowledge_base in (('world copy', lambda world: world.copy()),
+                                            ('layered', LayeredKnowledgeBase)):
+
+            report('%s, setup, %d places' % (name, places_number), measure(lambda: create_knowledge_base(world), number=10))
+
+            memory = measure_memory(lambda: create_heroes_knowledge_bases(world, quest_facts, create_knowledge_base))
+
+            print('%-60s %12.1f KB' % ('%s, memory per hero, %d places' % (name, places_number), memory / HEROES_NUMBER / 1024))
+
+
+def run_rollback():
+    random.seed(0)
+
+    for places_number in WORLD_SIZES:
+        world = worlds.create_world(places_number, places_number * 2)
+        world_facts = list(world.facts())
+
+        # raw quest facts, which are not transformed yet
+        result = generation.generate_quest(world, worlds.create_quests_base(), restrictions=(), transformators=())
+        quest_facts = [fact for fact in result.knowledge_base.facts() if fact.uid not in world]
+
+        def rebuild():
+            kb = KnowledgeBase()
+            kb += world_facts
+            kb.validate_consistency(worlds.WORLD_RESTRICTIONS)
+
+        report('rebuild and validate world, %d places' % places_number, measure(rebuild))
+
+        kb = world.copy()
+        kb.validate_consistency(worlds.WORLD_RESTRICTIONS)
+        savepoint = kb.savepoint()
+
+        def rollback():
+            kb.__iadd__(quest_facts)
+            worlds.transform(kb)
+            kb.rollback(savepoint)
+            kb.validate_consistency(worlds.WORLD_RESTRICTIONS)
+
+        report('quest, transformations and rollback, %d places' % places_number, measure(rollback, number=10))
+
+
+def run_fingerprint():
+    for places_number in WORLD_SIZES:
+        world_facts = worlds.create_world_facts(places_number, places_number * 2)
+
+        def calculate():
+            kb = KnowledgeBase()
+            kb += world_facts
+            kb.fingerprint()
+
+        def add():
+            kb = KnowledgeBase()
+            kb += world_facts
+
+        report('add facts and calculate fingerprint, %d places' % places_number, measure(calculate) - measure(add))
+
+        kb = KnowledgeBase()
+        kb += world_facts
+        kb.fingerprint()
+
+        place = facts.Place(uid='new_place')
+
+        def update():
+            kb.__iadd__(place)
+            kb.fingerprint()
+            kb.__isub__(place)
+            kb.fingerprint()
+
+        report('update fingerprint on added and removed fact, %d places' % places_number, measure(update, number=1000) / 2)
+
+
+if __name__ == '__main__':
+    run()
+    run_rollback()
+    run_fingerprint()
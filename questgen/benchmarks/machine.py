@@ -0,0 +1,167 @@
+# coding: utf-8
+'''
+cost of quest processing by Machine: knowledge base mode versus compiled quest,
+per-step time and memory allocations with Pointer replaced in place and removed/added on every step,
+and per-tick cost of many concurrent quests: Machine.do_step loop versus MachinePool
+
+run: python -m questgen.benchmarks.machine [--world-size N] [--machines N]
+'''
+import argparse
+import gc
+import time
+import tracemalloc
+
+from questgen.knowledge_base import KnowledgeBase
+from questgen import facts
+from questgen.machine import Machine, CompiledQuest, MachinePool, STEP_RESULT
+from questgen.tests import worlds
+from questgen.tests.legacy import LegacyMachine
+from questgen.benchmarks.utils import measure, report
+
+
+WORLD_SIZE = 1000
+
+MACHINES_NUMBER = 10000
+
+
+class BulkChecker(object):
+
+    def _check_many(self, requirements, interpreters):
+        return [requirement in interpreter.satisfied_requirements for requirement, interpreter in zip(requirements, interpreters)]
+
+    check_located_in_many = check_located_near_many = check_located_on_road_many = check_has_money_many = check_is_alive_many = _check_many
+
+
+def run_to_finish(kb, compiled_quest=None):
+    if Machine.POINTER_UID in kb:
+        del kb[Machine.POINTER_UID]
+
+    machine = Machine(knowledge_base=kb, interpreter=worlds.Interpreter(), compiled_quest=compiled_quest)
+
+    return worlds.run_machine(machine)
+
+
+def run_single(world_size=WORLD_SIZE):
+    for quest_class in worlds.QUESTS:
+        kb = worlds.create_valid_quest(quest_class, places_number=world_size, persons_number=world_size, quests=worlds.BASE_QUESTS)
+
+        steps = run_to_finish(kb)
+
+        compiled_quest = CompiledQuest(kb)
+
+        name = '%s, %d facts' % (quest_class.TYPE, len(kb.uids()))
+
+        report('knowledge base, %s, per step' % name, measure(lambda: run_to_finish(kb), number=10) / steps)
+        report('compiled, %s, per step' % name, measure(lambda: run_to_finish(kb, compiled_quest), number=10) / steps)
+        report('compilation, %s' % name, measure(lambda: CompiledQuest(kb), number=10))
+
+
+def measure_step_allocations(machine_class, data):
+    '''
+    average peak of memory allocated by single step, in bytes
+    '''
+    kb = KnowledgeBase.deserialize(data, facts.FACTS)
+    machine = machine_class(knowledge_base=kb, interpreter=worlds.Interpreter())
+
+    machine.pointer # pointer creation is not a part of step
+
+    allocated = 0
+    steps = 0
+
+    tracemalloc.start()
+
+    try:
+        while True:
+            memory_before, peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+
+            if not machine.do_step():
+                break
+
+            memory_after, peak = tracemalloc.get_traced_memory()
+
+            allocated += peak - memory_before
+            steps += 1
+    finally:
+        tracemalloc.stop()
+
+    return allocated / steps
+
+
+def run_steps():
+    for quest_class in worlds.QUESTS:
+        kb = worlds.create_valid_quest(quest_class, quests=worlds.BASE_QUESTS)
+        data = kb.serialize()
+
+        for machine_class in (LegacyMachine, Machine):
+            name = '%s, %s' % ('removed and added pointer' if machine_class is LegacyMachine else 'pointer replaced in place', quest_class.TYPE)
+
+            def process():
+                machine = machine_class(knowledge_base=KnowledgeBase.deserialize(data, facts.FACTS), interpreter=worlds.Interpreter())
+                return worlds.run_machine(machine)
+
+            steps = process()
+
+            base_time = measure(lambda: KnowledgeBase.deserialize(data, facts.FACTS), number=10)
+
+            report('%s, per step' % name, (measure(process, number=10) - base_time) / steps)
+            print('%-60s %12.0f B' % ('%s, allocated per step' % name, measure_step_allocations(machine_class, data)))
+
+
+def create_machines(data, machines_number):
+    return [Machine(knowledge_base=KnowledgeBase.deserialize(data, facts.FACTS), interpreter=worlds.Interpreter())
+            for i in range(machines_number)]
+
+
+def run_ticks(do_tick):
+    ticks_time = 0
+    ticks = 0
+
+    # many live knowledge bases make garbage collector passes dominate timings
+    gc.collect()
+    gc.disable()
+
+    try:
+        while True:
+            started_at = time.perf_counter()
+            finished = do_tick()
+            ticks_time += time.perf_counter() - started_at
+            ticks += 1
+
+            if finished:
+                return ticks_time / ticks
+    finally:
+        gc.enable()
+
+
+def run_concurrent(machines_number=MACHINES_NUMBER):
+    data = worlds.create_valid_quest(worlds.Caravan, quests=worlds.BASE_QUESTS).serialize()
+
+    machines = create_machines(data, machines_number)
+
+    def do_tick():
+        return not any([machine.do_step() for machine in machines])
+
+    report('Machine.do_step, %d quests, per tick' % machines_number, run_ticks(do_tick))
+
+    pool = MachinePool(create_machines(data, machines_number))
+
+    def do_pool_tick():
+        return all(result == STEP_RESULT.FINISHED for result in pool.do_step())
+
+    report('MachinePool.do_step, %d quests, per tick' % machines_number, run_ticks(do_pool_tick))
+
+    pool = MachinePool(create_machines(data, machines_number), checker=BulkChecker())
+
+    report('MachinePool.do_step with bulk checker, %d quests, per tick' % machines_number, run_ticks(do_pool_tick))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='quests processing cost')
+    parser.add_argument('--world-size', type=int, default=WORLD_SIZE, help='places and persons number for single quest benchmark')
+    parser.add_argument('--machines', type=int, default=MACHINES_NUMBER, help='number of concurrent quests')
+    arguments = parser.parse_args()
+
+    run_single(world_size=arguments.world_size)
+    run_steps()
+    run_concurrent(machines_number=arguments.machines)
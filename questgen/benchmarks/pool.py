@@ -0,0 +1,88 @@
+# coding: utf-8
+'''
+sustained quests per second: QuestPool with different number of workers versus generation in current process
+
+run: python -m questgen.benchmarks.pool [quests number]
+'''
+import os
+import sys
+import time
+import random
+
+from questgen import generation
+from questgen.pool import QuestPool
+from questgen.knowledge_base import LayeredKnowledgeBase
+from questgen.tests import worlds
+
+
+PLACES_NUMBER = 100
+
+HEROES_NUMBER = 16
+
+
+def create_heroes():
+    return {('hero_%d' % i, 'place_%d' % i): worlds.create_hero_facts(uid='hero_%d' % i, place='place_%d' % i)
+            for i in range(HEROES_NUMBER)}
+
+
+def run(quests_number=500):
+    world = worlds.create_world(PLACES_NUMBER, PLACES_NUMBER * 2, hero=False)
+    qb = worlds.create_quests_base()
+    heroes = create_heroes()
+    keys = list(heroes.keys())
+
+    random.seed(0)
+
+    started_at = time.perf_counter()
+
+    for i in range(quests_number):
+        kb = LayeredKnowledgeBase(world)
+        kb += heroes[keys[i % len(keys)]]
+        generation.generate_quest(kb, qb, restrictions=worlds.QUEST_RESTRICTIONS)
+
+    print('%-40s %8.1f quests/s' % ('current process', quests_number / (time.perf_counter() - started_at)))
+
+    workers_numbers = sorted(set((1, 2, 4, os.cpu_count() or 1)))
+
+    for workers_number in workers_numbers:
+        with QuestPool(world,
+                       qb,
+                       restrictions=worlds.QUEST_RESTRICTIONS,
+                       world_restrictions=worlds.WORLD_RESTRICTIONS,
+                       size=2,
+                       max_workers=workers_number) as pool:
+
+            for key, hero_facts in heroes.items():
+                pool.register(key, hero_facts)
+
+            # warm up: workers are started and pools are filled
+            for key in keys:
+                pool.get(key, timeout=None)
+
+            started_at = time.perf_counter()
+
+            for i in range(quests_number):
+                pool.get(keys[i % len(keys)], timeout=None)
+
+            print('%-40s %8.1f quests/s, %d errors' % ('pool, %d workers' % workers_number,
+                                                      quests_number / (time.perf_counter() - started_at),
+                                                      pool.errors))
+
+            # time of serving ready quest, it is what hero waits for; measured, when workers are idle
+            while any(pool.ready_number(key) < pool.size for key in keys):
+                time.sleep(0.01)
+
+            times = []
+
+            for key in keys:
+                started_at = time.perf_counter()
+                pool.get(key)
+                times.append(time.perf_counter() - started_at)
+
+            times.sort()
+
+            print('%-40s %8.3f ms' % ('    get of ready quest, median', times[len(times) // 2] * 1000))
+
+
+if __name__ == '__main__':
+    run(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,36 @@
+# coding: utf-8
+'''
+QuestsBase.quest_from_*: precomputed candidates versus filtering of all quests on every call
+
+run: python -m questgen.benchmarks.quests_base
+'''
+import random
+
+from questgen import exceptions
+from questgen.quests.quests_base import QuestsBase
+from questgen.tests import worlds
+from questgen.tests.legacy import LegacyQuestsBase
+from questgen.benchmarks.utils import measure, report
+
+
+def run():
+    rng = random.Random(0)
+    calls = [worlds.random_quest_arguments(rng, worlds.QUESTS) for i in range(100)]
+
+    for name, quests_base_class in (('precomputed candidates', QuestsBase), ('filtering', LegacyQuestsBase)):
+        qb = quests_base_class()
+        qb += worlds.QUESTS
+
+        def process():
+            for arguments in calls:
+                for method in (qb.quest_from_place, qb.quest_from_person, qb.quest_between_2):
+                    try:
+                        method(**arguments)
+                    except exceptions.NoQuestChoicesRollBackError:
+                        pass
+
+        report('quest choice, %s' % name, measure(process) / (len(calls) * 3))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,48 @@
+# coding: utf-8
+'''
+set building cost for facts with content hash and with legacy per-class hash
+
+run: python -m questgen.benchmarks.records [--full]
+'''
+import argparse
+
+from questgen import facts
+from questgen.benchmarks.utils import measure, report
+
+
+SIZES = (1000, 2000, 10000)
+
+# legacy hash puts all facts of one class into single bucket, so building set is quadratic
+LEGACY_LIMIT = 2000
+
+
+class LegacyLocatedIn(facts.LocatedIn):
+
+    def __hash__(self):
+        return hash(self.__class__)
+
+
+def create_facts(fact_class, number):
+    return [fact_class(object='person_%d' % i, place='place_%d' % (i % 100)) for i in range(number)]
+
+
+def run(sizes=SIZES, full=False):
+    for number in sizes:
+        current_facts = create_facts(facts.LocatedIn, number)
+        report('content hash, set of %d facts (first build)' % number, measure(lambda: set(current_facts), repeat=1))
+        report('content hash, set of %d facts (cached hash)' % number, measure(lambda: set(current_facts)))
+
+        if number > LEGACY_LIMIT and not full:
+            print('%-60s %15s' % ('legacy hash, set of %d facts' % number, 'skipped'))
+            continue
+
+        legacy_facts = create_facts(LegacyLocatedIn, number)
+        report('legacy hash, set of %d facts' % number, measure(lambda: set(legacy_facts), repeat=1))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='set building cost for facts')
+    parser.add_argument('--full', action='store_true', help='run legacy hash on all sizes (quadratic, 10k facts takes minutes)')
+    arguments = parser.parse_args()
+
+    run(full=arguments.full)
@@ -0,0 +1,113 @@
+# coding: utf-8
+'''
+cycle detection cost on graphs with chained diamond-shaped branches
+
+every diamond doubles number of paths from start, so path enumeration is exponential in number of diamonds
+
+cost of quest restrictions with separate and shared ValidationContext
+
+and cost of repeated validate_consistency calls on unchanged and partly changed knowledge base
+
+run: python -m questgen.benchmarks.restrictions
+'''
+import sys
+
+from questgen import facts
+from questgen import logic
+from questgen import restrictions
+from questgen.benchmarks.utils import measure, report
+from questgen.tests import worlds
+
+
+DIAMONDS = (10, 14, 18, 20, 25, 100, 1000)
+
+# path enumeration on bigger graphs takes minutes
+LEGACY_LIMIT = 18
+
+
+class LegacyNoCirclesInStateJumpGraph(restrictions.NoCirclesInStateJumpGraph):
+
+    def _bruteforce(self, path, table):
+        current_state = path[-1]
+
+        if not table.get(current_state):
+            return
+
+        for next_state in table[current_state]:
+
+            if next_state in path:
+                raise self.Error(jumps=path+[next_state])
+
+            path.append(next_state)
+            self._bruteforce(path, table)
+            path.pop()
+
+    def validate(self, knowledge_base):
+        start_uid = logic.get_absolute_start(knowledge_base).uid
+
+        table = {}
+        for jump in knowledge_base.filter(facts.Jump):
+            if jump.state_from not in table:
+                table[jump.state_from] = []
+            table[jump.state_from].append(jump.state_to)
+        self._bruteforce([start_uid], table)
+
+
+def run(diamonds=DIAMONDS):
+    restriction = restrictions.NoCirclesInStateJumpGraph()
+    legacy_restriction = LegacyNoCirclesInStateJumpGraph()
+
+    for diamonds_number in diamonds:
+        kb = worlds.create_diamonds_graph(diamonds_number)
+
+        report('three-colour dfs, %d diamonds' % diamonds_number, measure(lambda: restriction.validate(kb)))
+
+        if diamonds_number > LEGACY_LIMIT:
+            print('%-60s %15s' % ('path enumeration, %d diamonds' % diamonds_number, 'skipped'))
+            continue
+
+        report('path enumeration, %d diamonds' % diamonds_number, measure(lambda: legacy_restriction.validate(kb), repeat=1))
+
+
+def run_validation(world_sizes=(100, 1000, 10000)):
+    for places_number in world_sizes:
+        kb = worlds.create_valid_quest(worlds.Simple, places_number=places_number, persons_number=places_number * 2)
+
+        restrictions_list = worlds.WORLD_RESTRICTIONS + worlds.QUEST_RESTRICTIONS
+
+        def validate_from_scratch():
+            for restriction in restrictions_list:
+                restriction.validate(kb)
+
+        def validate_quest_separately():
+            for restriction in worlds.QUEST_RESTRICTIONS:
+                restriction.validate(kb)
+
+        def validate_quest_with_context():
+            context = restrictions.ValidationContext(kb)
+            for restriction in worlds.QUEST_RESTRICTIONS:
+                restriction.validate_with_context(kb, context)
+
+        report('quest restrictions, separate contexts, %d places' % places_number, measure(validate_quest_separately, number=10))
+        report('quest restrictions, shared context, %d places' % places_number, measure(validate_quest_with_context, number=10))
+
+        kb.validate_consistency(restrictions_list)
+
+        report('full validation, %d places' % places_number, measure(validate_from_scratch))
+        report('memoized validation, unchanged, %d places' % places_number, measure(lambda: kb.validate_consistency(restrictions_list)))
+
+        place = facts.Place(uid='benchmark_place')
+
+        def validate_after_world_changed(kb):
+            if place.uid in kb:
+                kb -= place
+            else:
+                kb += place
+            kb.validate_consistency(restrictions_list)
+
+        # only ReferencesIntegrity depends on Place
+        report('memoized validation, Place changed, %d places' % places_number, measure(lambda: validate_after_world_changed(kb)))
+
+if __name__ == '__main__':
+    run(diamonds=[int(argument) for argument in sys.argv[1:]] or DIAMONDS)
+    run_validation()
@@ -0,0 +1,66 @@
+# coding: utf-8
+'''
+Selector.new_person and Selector.new_place: indexes versus scanning of facts
+
+run: python -m questgen.benchmarks.selectors
+'''
+import random
+
+from questgen import exceptions
+from questgen.selectors import Selector
+from questgen.tests import worlds
+from questgen.tests.legacy import LegacySelector
+from questgen.benchmarks.utils import measure, report
+
+
+WORLD_SIZES = ((100, 500), (1000, 5000))
+
+
+def run_places():
+    for places_number in (1000, 10000):
+        kb = worlds.create_world(places_number, 10)
+        qb = worlds.create_quests_base()
+
+        rng = random.Random(0)
+        calls = [worlds.random_new_place_arguments(rng, places_number) for i in range(10)]
+
+        for name, selector_class in (('index', Selector), ('facts scanning', LegacySelector)):
+
+            def process():
+                selector = selector_class(kb, qb)
+
+                for arguments in calls:
+                    try:
+                        selector.new_place(**arguments)
+                    except exceptions.NoFactSelectedError:
+                        pass
+
+            report('new_place, %s, %d places' % (name, places_number), measure(process) / len(calls))
+
+
+def run():
+    for places_number, persons_number in WORLD_SIZES:
+        kb = worlds.create_world(places_number, persons_number, social_connections_number=persons_number)
+        qb = worlds.create_quests_base()
+
+        rng = random.Random(0)
+        calls = [worlds.random_new_person_arguments(rng, places_number, persons_number) for i in range(10)]
+
+        # facts scanning is quadratic in persons number, so it is measured once
+        for name, selector_class, repeat in (('index', Selector, 3), ('facts scanning', LegacySelector, 1)):
+
+            def process():
+                selector = selector_class(kb, qb, social_connection_probability=0.5)
+
+                for arguments in calls:
+                    try:
+                        selector.new_person(**arguments)
+                    except exceptions.NoFactSelectedError:
+                        pass
+
+            report('new_person, %s, %d persons' % (name, persons_number), measure(process, repeat=repeat) / len(calls))
+
+
+if __name__ == '__main__':
+    run_places()
+    run()
@@ -0,0 +1,39 @@
+# coding: utf-8
+'''
+binary serialization versus json: size of data and time of encoding/decoding
+
+run: python -m questgen.benchmarks.serialization
+'''
+import json
+import random
+
+from questgen import facts
+from questgen import serialization
+from questgen.tests import worlds
+from questgen.benchmarks.utils import measure, report
+
+
+def run():
+    random.seed(0)
+
+    for quest_class in worlds.QUESTS:
+        kb = worlds.transform(worlds.create_quest(quest_class, quests=worlds.BASE_QUESTS))
+
+        data = kb.serialize()
+
+        json_data = json.dumps(data)
+        binary_data = serialization.encode(data, facts.FACTS)
+
+        print('%s: json %d bytes, binary %d bytes (%.1f%%)' % (quest_class.TYPE,
+                                                               len(json_data),
+                                                               len(binary_data),
+                                                               100.0 * len(binary_data) / len(json_data)))
+
+        report('    json encode', measure(lambda: json.dumps(data), number=20))
+        report('    binary encode', measure(lambda: serialization.encode(data, facts.FACTS), number=20))
+        report('    json decode', measure(lambda: json.loads(json_data), number=20))
+        report('    binary decode', measure(lambda: serialization.decode(binary_data, facts.FACTS), number=20))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,237 @@
+# coding: utf-8
+'''
+time of every stage of quest pipeline for every quest template on synthetic worlds of different sizes
+
+results are saved to json report, reports of different runs can be compared
+
+run: python -m questgen.benchmarks.suite [--sizes 100 1000 10000] [--quests hunt caravan] [--output report.json]
+     python -m questgen.benchmarks.suite --compare old.json [new.json] [--threshold 0.1]
+
+without new.json benchmarks are run and compared with old.json;
+exit code is 1, if some stage became slower more than on threshold
+'''
+import sys
+import json
+import random
+import datetime
+import platform
+import argparse
+
+from questgen import facts
+from questgen import analysers
+from questgen import exceptions
+from questgen import transformators
+from questgen.machine import Machine
+from questgen.selectors import Selector
+from questgen.knowledge_base import KnowledgeBase, LayeredKnowledgeBase
+from questgen.tests import worlds
+from questgen.benchmarks.utils import measure, measure_with_setup
+
+
+WORLD_SIZES = (100, 1000, 10000)
+
+REPORT_VERSION = 1
+
+RESTRICTIONS = worlds.WORLD_RESTRICTIONS + worlds.QUEST_RESTRICTIONS
+
+
+class STAGE(object):
+    CONSTRUCT = 'construct'
+    ACTIVATE_EVENTS = 'activate_events'
+    REMOVE_RESTRICTED_STATES = 'remove_restricted_states'
+    REMOVE_BROKEN_STATES = 'remove_broken_states'
+    DETERMINE_DEFAULT_CHOICES = 'determine_default_choices'
+    VALIDATE_CONSISTENCY = 'validate_consistency'
+    MACHINE = 'machine'
+    SERIALIZE = 'serialize'
+    DESERIALIZE = 'deserialize'
+    PERCENTS_COLLECTOR = 'percents_collector'
+
+
+def construct(kb, quest_class, quests_base, seed):
+    selector = Selector(kb, quests_base, rng=random.Random(seed))
+    kb += quest_class.construct_from_place(nesting=0, selector=selector, start_place=selector.new_place(candidates=('place_1',)))
+    return kb
+
+
+def transformations(seed):
+    '''
+    transformators in order of generation, with random generators, which give the same results on every call
+    '''
+    return ((STAGE.ACTIVATE_EVENTS, lambda kb: transformators.activate_events(kb, rng=random.Random(seed))),
+            (STAGE.REMOVE_RESTRICTED_STATES, transformators.remove_restricted_states),
+            (STAGE.REMOVE_BROKEN_STATES, transformators.remove_broken_states),
+            (STAGE.DETERMINE_DEFAULT_CHOICES, lambda kb: transformators.determine_default_choices(kb, rng=random.Random(seed))))
+
+
+def find_seed(world, quest_class, quests_base, attempts=100):
+    '''
+    seed, with which quest is constructed, transformed and passes all restrictions
+    '''
+    for seed in range(attempts):
+        try:
+            kb = construct(LayeredKnowledgeBase(world), quest_class, quests_base, seed)
+
+            for stage, transformator in transformations(seed):
+                transformator(kb)
+
+            kb.validate_consistency(RESTRICTIONS)
+
+        except exceptions.RollBackError:
+            continue
+
+        return seed
+
+    return None
+
+
+def measure_quest(world, quest_class, quests_base, seed, number):
+    results = {}
+
+    def copy_of(kb):
+        return lambda: kb.copy()
+
+    results[STAGE.CONSTRUCT] = measure_with_setup(lambda: LayeredKnowledgeBase(world),
+                                                  lambda kb: construct(kb, quest_class, quests_base, seed),
+                                                  number=number)
+
+    kb = construct(LayeredKnowledgeBase(world), quest_class, quests_base, seed)
+
+    for stage, transformator in transformations(seed):
+        results[stage] = measure_with_setup(copy_of(kb), transformator, number=number)
+        transformator(kb)
+
+    results[STAGE.VALIDATE_CONSISTENCY] = measure_with_setup(copy_of(kb),
+                                                             lambda kb: kb.validate_consistency(RESTRICTIONS),
+                                                             number=number)
+
+    results[STAGE.MACHINE] = measure_with_setup(copy_of(kb),
+                                                lambda kb: worlds.run_machine(Machine(knowledge_base=kb, interpreter=worlds.Interpreter())),
+                                                number=number)
+
+    data = kb.serialize()
+
+    results[STAGE.SERIALIZE] = measure(kb.serialize, number=number)
+    results[STAGE.DESERIALIZE] = measure(lambda: KnowledgeBase.deserialize(data, facts.FACTS), number=number)
+    results[STAGE.PERCENTS_COLLECTOR] = measure(lambda: analysers.percents_collector(kb), number=number)
+
+    return results
+
+
+def result_key(world_size, quest_type, stage):
+    return '%d/%s/%s' % (world_size, quest_type, stage)
+
+
+def run(world_sizes=WORLD_SIZES, quests=worlds.QUESTS, number=3, log=None):
+    '''
+    returns report: {'meta': {...}, 'results': {'<world size>/<quest type>/<stage>': seconds}}
+    '''
+    report = {'meta': {'version': REPORT_VERSION,
+                       'created_at': datetime.datetime.now().isoformat(),
+                       'python': platform.python_version(),
+                       'implementation': platform.python_implementation(),
+                       'platform': platform.platform(),
+                       'number': number,
+                       'skipped': []},
+              'results': {}}
+
+    quests_base = worlds.create_quests_base(worlds.BASE_QUESTS)
+
+    for world_size in world_sizes:
+        world = worlds.create_world(world_size, world_size)
+        world.validate_consistency(worlds.WORLD_RESTRICTIONS)
+
+        for quest_class in quests:
+            seed = find_seed(world, quest_class, quests_base)
+
+            if seed is None:
+                report['meta']['skipped'].append(result_key(world_size, quest_class.TYPE, ''))
+                continue
+
+            for stage, seconds in measure_quest(world, quest_class, quests_base, seed, number).items():
+                key = result_key(world_size, quest_class.TYPE, stage)
+                report['results'][key] = seconds
+
+                if log is not None:
+                    log('%-70s %12.3f ms' % (key, seconds * 1000))
+
+    return report
+
+
+def compare(old_report, new_report, threshold=0.1):
+    '''
+    returns list of (key, old seconds, new seconds, new / old, is regression); missed values are None
+    '''
+    old_results = old_report['results']
+    new_results = new_report['results']
+
+    rows = []
+
+    for key in sorted(set(old_results) | set(new_results)):
+        old = old_results.get(key)
+        new = new_results.get(key)
+
+        ratio = new / old if old and new is not None else None
+
+        rows.append((key, old, new, ratio, ratio is not None and ratio > 1 + threshold))
+
+    return rows
+
+
+def print_comparison(rows):
+    def format_time(seconds):
+        return '%12.3f ms' % (seconds * 1000) if seconds is not None else '%15s' % '-'
+
+    for key, old, new, ratio, is_regression in rows:
+        print('%-70s %s %s %8s %s' % (key,
+                                      format_time(old),
+                                      format_time(new),
+                                      '%.2fx' % ratio if ratio is not None else '-',
+                                      'REGRESSION' if is_regression else ''))
+
+
+def load_report(path):
+    with open(path) as report_file:
+        return json.load(report_file)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='benchmarks of quest pipeline stages')
+    parser.add_argument('--sizes', type=int, nargs='+', default=WORLD_SIZES, help='numbers of places and persons in worlds')
+    parser.add_argument('--quests', nargs='+', default=None, help='types of quests, all by default')
+    parser.add_argument('--number', type=int, default=3, help='calls of every stage in single measurement')
+    parser.add_argument('--output', default=None, help='path of json report')
+    parser.add_argument('--compare', nargs='+', default=None, metavar='REPORT', help='old report [and new report]')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown, which is regression')
+
+    arguments = parser.parse_args(arguments)
+
+    if arguments.compare is not None and len(arguments.compare) > 2:
+        parser.error('--compare accepts one or two reports')
+
+    if arguments.compare is not None and len(arguments.compare) == 2:
+        new_report = load_report(arguments.compare[1])
+    else:
+        quests = worlds.QUESTS
+
+        if arguments.quests is not None:
+            quests = [quest_class for quest_class in worlds.QUESTS if quest_class.TYPE in arguments.quests]
+
+        new_report = run(world_sizes=arguments.sizes, quests=quests, number=arguments.number, log=print)
+
+        if arguments.output is not None:
+            with open(arguments.output, 'w') as report_file:
+                json.dump(new_report, report_file, indent=2, sort_keys=True)
+
+    if arguments.compare is None:
+        return 0
+
+    rows = compare(load_report(arguments.compare[0]), new_report, threshold=arguments.threshold)
+
+    print_comparison(rows)
+
+    return 1 if any(is_regression for key, old, new, ratio, is_regression in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
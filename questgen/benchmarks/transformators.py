@@ -0,0 +1,54 @@
+# coding: utf-8
+'''
+remove_broken_states: rounds over neighbours of removed facts versus full sweeps until nothing changed
+
+run: python -m questgen.benchmarks.transformators
+'''
+import random
+
+from questgen.knowledge_base import KnowledgeBase
+from questgen import facts
+from questgen import transformators
+from questgen.tests import worlds
+from questgen.tests.legacy import legacy_remove_broken_states
+from questgen.benchmarks.utils import measure, report
+
+
+DEAD_BRANCHES = (100, 1000, 3000, 10000)
+
+# full sweeps on longer branches take minutes
+LEGACY_LIMIT = 1000
+
+
+def run():
+    for depth in DEAD_BRANCHES:
+        data = worlds.create_dead_branch_quest(depth).serialize()
+
+        def process(remove_broken_states):
+            kb = KnowledgeBase.deserialize(data, facts.FACTS)
+            remove_broken_states(kb)
+
+        report('rounds over neighbours, dead branch %d' % depth, measure(lambda: process(transformators.remove_broken_states)))
+
+        if depth > LEGACY_LIMIT:
+            print('%-60s %15s' % ('full sweeps, dead branch %d' % depth, 'skipped'))
+            continue
+
+        report('full sweeps, dead branch %d' % depth, measure(lambda: process(legacy_remove_broken_states), repeat=1))
+
+    random.seed(0)
+
+    for quest_class in worlds.QUESTS:
+        data = worlds.prepare_quest(worlds.create_quest(quest_class, quests=worlds.BASE_QUESTS)).serialize()
+
+        def process(remove_broken_states):
+            kb = KnowledgeBase.deserialize(data, facts.FACTS)
+            remove_broken_states(kb)
+
+        # deserialization is included into both timings
+        report('rounds over neighbours, %s' % quest_class.TYPE, measure(lambda: process(transformators.remove_broken_states), number=20))
+        report('full sweeps, %s' % quest_class.TYPE, measure(lambda: process(legacy_remove_broken_states), number=20))
+
+
+if __name__ == '__main__':
+    run()
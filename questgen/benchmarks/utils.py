@@ -0,0 +1,35 @@
+# coding: utf-8
+import time
+import timeit
+
+
+def measure(function, number=1, repeat=3):
+    '''
+    best time of single call in seconds
+    '''
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def report(name, seconds):
+    print('%-60s %12.3f ms' % (name, seconds * 1000))
+
+
+def measure_with_setup(setup, function, number=1, repeat=3):
+    '''
+    best time of single call in seconds; setup creates argument for every call and is not measured
+    '''
+    best = None
+
+    for i in range(repeat):
+        total = 0
+
+        for j in range(number):
+            argument = setup()
+            started_at = time.perf_counter()
+            function(argument)
+            total += time.perf_counter() - started_at
+
+        if best is None or total < best:
+            best = total
+
+    return best / number
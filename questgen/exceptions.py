@@ -1,11 +1,42 @@
 # coding: utf-8
 
 
+def _create_error(error_class, arguments):
+    return error_class(**arguments)
+
+
 class QuestgenError(Exception):
+    '''
+    message is formatted only by str(), since most of errors (rollbacks) are never printed;
+    arguments are available as attributes and are not copied, so mutable arguments MUST be copied by raising code
+    '''
     MSG = None
 
     def __init__(self, **kwargs):
-        super(QuestgenError, self).__init__(self.MSG % kwargs)
+        super(QuestgenError, self).__init__(self.__class__.__name__)
+        self.arguments = kwargs
+
+    def __reduce__(self):
+        return (_create_error, (self.__class__, self.arguments), self.__dict__)
+
+    def __getattr__(self, name):
+        arguments = self.__dict__.get('arguments')
+
+        if arguments is None or name not in arguments:
+            raise AttributeError(name)
+
+        return arguments[name]
+
+    def __str__(self):
+        try:
+            return self.MSG % self.arguments
+        except (KeyError, TypeError):
+            # arguments do not match message, error is still shown with them
+            return repr(self)
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__,
+                           ', '.join('%s=%r' % (name, value) for name, value in sorted(self.arguments.items())))
 
 ####################################################################
 # knowledge base
@@ -22,6 +53,9 @@ class WrongFactTypeError(KnowledgeBaseError):
 class NoFactError(KnowledgeBaseError):
     MSG = '%(fact)s not in knowledge base'
 
+class WrongSavepointError(KnowledgeBaseError):
+    MSG = 'savepoint was released by commit or by rollback to earlier savepoint'
+
 ####################################################################
 # facts
 ####################################################################
@@ -92,7 +126,12 @@ class WrongQuestTypeError(QuestsBaseError):
 ####################################################################
 
 class RollBackError(QuestgenError):
-    MSG = 'something is wrong (%(message)), do rollback'
+    '''
+    restriction - class of restriction, which raised error in KnowledgeBase.validate_consistency
+    '''
+    MSG = 'something is wrong (%(message)s), do rollback'
+
+    restriction = None
 
 class NoQuestChoicesRollBackError(RollBackError):
     MSG = 'no quests choices for next quest'
@@ -108,6 +147,27 @@ class NoFactSelectedError(SelectorsBaseError):
     MSG = 'can not found fact with method "%(method)s" and arguments: %(arguments)s — with reserve: %(reserved)s'
 
 
+####################################################################
+# generation
+####################################################################
+
+class GenerationError(QuestgenError): pass
+
+class GenerationBudgetExceededError(GenerationError):
+    MSG = 'quest was not generated in %(attempts_number)d attempts and %(time).3f seconds'
+
+
+####################################################################
+# serialization
+####################################################################
+class SerializationError(QuestgenError): pass
+
+class UnserializableValueError(SerializationError):
+    MSG = 'can not serialize value %(value)r of type %(type)s'
+
+class WrongSerializedDataError(SerializationError):
+    MSG = 'can not decode data: %(message)s'
+
 ####################################################################
 # graph drawer
 ####################################################################p
@@ -67,6 +67,9 @@ class Fact(records.Record, metaclass=FactMetaclass):
 
         return cls(**attributes)
 
+    def _hash_key(self):
+        # equal facts always have equal uids
+        return self.uid
 
     def change(self, **kwargs):
         attributes = {attribute_name: getattr(self, attribute_name)
@@ -0,0 +1,266 @@
+# coding: utf-8
+'''
+quest generation with retries
+
+creating of quest can fail with RollBackError, it is normal behaviour: attempt should be repeated
+'''
+import time
+import random
+import inspect
+import functools
+import collections
+
+from questgen import facts
+from questgen import exceptions
+from questgen import transformators
+from questgen.knowledge_base import LayeredKnowledgeBase
+from questgen.selectors import Selector
+
+
+class STAGE(object):
+    CONSTRUCT = 'construct'
+    TRANSFORM = 'transform'
+    VALIDATE = 'validate'
+
+
+TRANSFORMATORS = (transformators.activate_events,
+                  transformators.remove_restricted_states,
+                  transformators.remove_broken_states,
+                  transformators.determine_default_choices)
+
+
+class Attempt(object):
+    '''
+    statistics of single generation attempt
+
+    error - class of RollBackError, which stopped attempt
+    method - selector method, which could not find fact
+    restriction - class of restriction, which was not passed
+    stage - stage, on which attempt stopped
+    stages_times - seconds spent on every started stage
+    '''
+
+    __slots__ = ('number', 'error', 'method', 'restriction', 'stage', 'stages_times')
+
+    def __init__(self, number):
+        self.number = number
+        self.error = None
+        self.method = None
+        self.restriction = None
+        self.stage = None
+        self.stages_times = {}
+
+    @property
+    def is_successful(self): return self.error is None and self.stage is None
+
+    @property
+    def time(self): return sum(self.stages_times.values())
+
+    def __repr__(self):
+        return 'Attempt(number=%r, error=%r, method=%r, restriction=%r, stage=%r, stages_times=%r)' % (self.number,
+                                                                                                     self.error,
+                                                                                                     self.method,
+                                                                                                     self.restriction,
+                                                                                                     self.stage,
+                                                                                                     self.stages_times)
+
+
+class GenerationResult(object):
+    '''
+    is_cached - quest is taken from GenerationCache, attempts are empty
+    '''
+    __slots__ = ('knowledge_base', 'attempts', 'is_cached')
+
+    def __init__(self, knowledge_base, attempts, is_cached=False):
+        self.knowledge_base = knowledge_base
+        self.attempts = attempts
+        self.is_cached = is_cached
+
+    @property
+    def rollbacks(self): return [attempt for attempt in self.attempts if attempt.error is not None]
+
+    @property
+    def time(self): return sum(attempt.time for attempt in self.attempts)
+
+
+class GenerationCache(object):
+    '''
+    least recently used generated quests: facts added to world and world facts removed by generation
+
+    max_size - max number of quests in cache
+    '''
+
+    __slots__ = ('max_size', 'hits', 'misses', 'evictions', '_quests')
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._quests = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._quests)
+
+    def get(self, key):
+        quest = self._quests.get(key)
+
+        if quest is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._quests.move_to_end(key)
+
+        return quest
+
+    def set(self, key, quest):
+        self._quests[key] = quest
+        self._quests.move_to_end(key)
+
+        while len(self._quests) > self.max_size:
+            self._quests.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._quests.clear()
+
+
+def construct_from_hero_position(knowledge_base, selector):
+    '''
+    root quest, which starts in place of hero
+    '''
+    hero = selector.heroes()[0]
+    location = next(location for location in knowledge_base.filter(facts.LocatedIn) if location.object == hero.uid)
+    return selector.create_quest_from_place(nesting=0,
+                                            initiator_position=knowledge_base[location.place],
+                                            tags=('can_start', ))
+
+
+def _accepts_rng(function):
+    try:
+        return 'rng' in inspect.signature(function).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def generate_quest(world,
+                   quests_base,
+                   restrictions,
+                   max_attempts=100,
+                   time_budget=None,
+                   world_restrictions=(),
+                   constructor=construct_from_hero_position,
+                   transformators=TRANSFORMATORS,
+                   social_connection_probability=0,
+                   seed=None,
+                   cache=None):
+    '''
+    world - knowledge base with world facts, it MUST NOT be changed, while generated knowledge base is used
+    world_restrictions - validated once on world, before attempts
+    restrictions - validated on every generated quest
+    time_budget - seconds; new attempt (or its next stage) is not started, when budget spent
+    seed - if specified, quest is generated with own random.Random(seed) and does not depend on global random,
+           so equal arguments give equal quests (if quests base is not adaptive)
+    transformators - functions with knowledge base argument; rng argument is passed to ones, which accept it
+    cache - GenerationCache, used only with seed; key is fingerprint of world (with hero facts: position, preferences)
+            and all arguments, which determine quest
+
+    returns GenerationResult with LayeredKnowledgeBase over world with quest facts
+    raises GenerationBudgetExceededError with list of attempts in arguments['attempts']
+    '''
+    world.validate_consistency(world_restrictions)
+
+    cache_key = None
+
+    if cache is not None and seed is not None:
+        cache_key = (world.fingerprint(),
+                     world.ns_number,
+                     seed,
+                     quests_base,
+                     tuple(restrictions),
+                     constructor,
+                     tuple(transformators),
+                     max_attempts,
+                     social_connection_probability)
+
+        quest = cache.get(cache_key)
+
+        if quest is not None:
+            added_facts, removed_facts, ns_number = quest
+
+            kb = LayeredKnowledgeBase(world)
+            kb -= removed_facts
+            kb += added_facts
+            kb.ns_number = ns_number
+
+            return GenerationResult(knowledge_base=kb, attempts=[], is_cached=True)
+
+    rng = random.Random(seed) if seed is not None else random
+
+    transformators = [functools.partial(transformator, rng=rng) if _accepts_rng(transformator) else transformator
+                      for transformator in transformators]
+
+    attempts = []
+    started_at = time.perf_counter()
+
+    # validation results of world restrictions are copied too
+    kb = LayeredKnowledgeBase(world)
+    world_savepoint = kb.savepoint()
+
+    def is_budget_spent():
+        return time_budget is not None and time.perf_counter() - started_at >= time_budget
+
+    for number in range(max_attempts):
+        if is_budget_spent():
+            break
+
+        attempt = Attempt(number)
+        attempts.append(attempt)
+
+        selector = Selector(kb, quests_base, social_connection_probability=social_connection_probability, rng=rng)
+
+        try:
+            for stage in (STAGE.CONSTRUCT, STAGE.TRANSFORM, STAGE.VALIDATE):
+                if is_budget_spent():
+                    attempt.stage = stage
+                    break
+
+                stage_started_at = time.perf_counter()
+
+                try:
+                    if stage == STAGE.CONSTRUCT:
+                        kb += constructor(kb, selector)
+                    elif stage == STAGE.TRANSFORM:
+                        for transformator in transformators:
+                            transformator(kb)
+                    else:
+                        kb.validate_consistency(restrictions)
+                finally:
+                    attempt.stages_times[stage] = time.perf_counter() - stage_started_at
+
+        except exceptions.RollBackError as e:
+            attempt.error = e.__class__
+            attempt.method = e.arguments.get('method')
+            attempt.restriction = e.restriction
+            attempt.stage = stage
+            selector.record_constructions(success=False)
+            kb.rollback(world_savepoint)
+            continue
+
+        if attempt.stage is not None:
+            break
+
+        selector.record_constructions(success=True)
+
+        kb.commit()
+
+        if cache_key is not None:
+            added_facts, removed_facts = kb.changes()
+            cache.set(cache_key, (added_facts, removed_facts, kb.ns_number))
+
+        return GenerationResult(knowledge_base=kb, attempts=attempts)
+
+    raise exceptions.GenerationBudgetExceededError(attempts_number=len(attempts),
+                                                   time=time.perf_counter() - started_at,
+                                                   attempts=attempts)
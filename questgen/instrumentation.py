@@ -0,0 +1,227 @@
+# coding: utf-8
+'''
+optional timing of generation and processing stages
+
+callbacks receive Event for every instrumented call; while no callback registered, instrumented code
+only checks that list of callbacks is empty
+
+    aggregator = instrumentation.Aggregator()
+
+    with instrumentation.collect(aggregator):
+        generation.generate_quest(...)
+
+    aggregator.percentiles(instrumentation.STAGE.RESTRICTION, name='NoCirclesInStateJumpGraph')
+'''
+import math
+import time
+import functools
+import contextlib
+
+
+class STAGE(object):
+    CONSTRUCT = 'construct' # construction of quest by template, name - quest type
+    TRANSFORMATOR = 'transformator' # name - function name
+    RESTRICTION = 'restriction' # validation by restriction, name - restriction class name
+    MACHINE_STEP = 'machine_step'
+
+
+class Event(object):
+    '''
+    facts_number - number of facts in knowledge base after stage
+    error - class of exception, raised by stage
+    '''
+
+    __slots__ = ('stage', 'name', 'duration', 'facts_number', 'error')
+
+    def __init__(self, stage, name, duration, facts_number, error):
+        self.stage = stage
+        self.name = name
+        self.duration = duration
+        self.facts_number = facts_number
+        self.error = error
+
+    def __repr__(self):
+        return 'Event(stage=%r, name=%r, duration=%r, facts_number=%r, error=%r)' % (self.stage,
+                                                                                     self.name,
+                                                                                     self.duration,
+                                                                                     self.facts_number,
+                                                                                     self.error)
+
+
+_callbacks = []
+
+
+def register(callback):
+    _callbacks.append(callback)
+
+
+def unregister(callback):
+    _callbacks.remove(callback)
+
+
+def is_enabled():
+    return bool(_callbacks)
+
+
+@contextlib.contextmanager
+def collect(callback):
+    '''
+    registers callback while in context
+    '''
+    register(callback)
+
+    try:
+        yield callback
+    finally:
+        unregister(callback)
+
+
+class _NoOp(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_OP = _NoOp()
+
+
+class _Measurement(object):
+    __slots__ = ('stage', 'name', 'knowledge_base', 'started_at')
+
+    def __init__(self, stage, name, knowledge_base):
+        self.stage = stage
+        self.name = name
+        self.knowledge_base = knowledge_base
+        self.started_at = None
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self.started_at
+
+        event = Event(stage=self.stage,
+                      name=self.name,
+                      duration=duration,
+                      facts_number=self.knowledge_base.facts_number() if self.knowledge_base is not None else None,
+                      error=exc_type)
+
+        for callback in list(_callbacks):
+            callback(event)
+
+        return False
+
+
+def stage(stage, name=None, knowledge_base=None):
+    '''
+    context manager, which reports Event to callbacks on exit
+    '''
+    if not _callbacks:
+        return _NO_OP
+
+    return _Measurement(stage, name, knowledge_base)
+
+
+def instrumented(stage_name):
+    '''
+    decorator of functions with knowledge base as first argument, name of event is name of function
+    '''
+    def decorator(function):
+
+        @functools.wraps(function)
+        def wrapper(knowledge_base, *args, **kwargs):
+            if not _callbacks:
+                return function(knowledge_base, *args, **kwargs)
+
+            with _Measurement(stage_name, function.__name__, knowledge_base):
+                return function(knowledge_base, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def percentile(sorted_values, percent):
+    '''
+    nearest-rank percentile of sorted values
+    '''
+    if not sorted_values:
+        return None
+
+    rank = int(math.ceil(percent / 100.0 * len(sorted_values)))
+
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class Aggregator(object):
+    '''
+    callback, which collects durations per stage and per (stage, name)
+    '''
+
+    PERCENTS = (50, 90, 99)
+
+    __slots__ = ('_durations', '_errors')
+
+    def __init__(self):
+        self._durations = {}
+        self._errors = {}
+
+    def __call__(self, event):
+        for key in ((event.stage, None), (event.stage, event.name)):
+            if key not in self._durations:
+                self._durations[key] = []
+                self._errors[key] = 0
+
+            self._durations[key].append(event.duration)
+
+            if event.error is not None:
+                self._errors[key] += 1
+
+            if event.name is None:
+                break
+
+    def clear(self):
+        self._durations = {}
+        self._errors = {}
+
+    def keys(self):
+        '''
+        (stage, name) of collected events; name is None for all events of stage
+        '''
+        return sorted(self._durations.keys(), key=lambda key: (key[0], key[1] is not None, key[1]))
+
+    def count(self, stage, name=None):
+        return len(self._durations.get((stage, name), ()))
+
+    def errors(self, stage, name=None):
+        return self._errors.get((stage, name), 0)
+
+    def total(self, stage, name=None):
+        return sum(self._durations.get((stage, name), ()))
+
+    def percentiles(self, stage, name=None, percents=PERCENTS):
+        '''
+        {percent: duration}, durations are None, if there are no events
+        '''
+        durations = sorted(self._durations.get((stage, name), ()))
+        return {percent: percentile(durations, percent) for percent in percents}
+
+    def report(self):
+        lines = []
+
+        for stage, name in self.keys():
+            percentiles = self.percentiles(stage, name)
+
+            lines.append('%-50s %8d calls %6d errors %12.3f ms total   %s' % ('%s %s' % (stage, name) if name is not None else stage,
+                                                                             self.count(stage, name),
+                                                                             self.errors(stage, name),
+                                                                             self.total(stage, name) * 1000,
+                                                                             '   '.join('p%d %.3f ms' % (percent, percentiles[percent] * 1000)
+                                                                                        for percent in self.PERCENTS)))
+
+        return '\n'.join(lines)
@@ -1,15 +1,70 @@
+import hashlib
+import itertools
+
 from collections.abc import Iterable
 
-from questgen.facts import Fact
+from questgen.facts import Fact, Jump
+from questgen.records import canonical
 
 from questgen import exceptions
+from questgen import instrumentation
+from questgen.restrictions import ValidationContext
+
+
+_FACT_TYPES = {}
+
+# versions are unique across all knowledge bases, so version value never repeats
+_VERSIONS = itertools.count(1)
+
+
+# operations in undo log
+_ADDED = 0
+_REMOVED = 1
+_HIDDEN = 2 # world fact removed from LayeredKnowledgeBase
+
+
+def _fact_types(fact_class):
+    '''
+    fact class and all its Fact ancestors, cached per class
+    '''
+    if fact_class not in _FACT_TYPES:
+        _FACT_TYPES[fact_class] = tuple(base for base in fact_class.__mro__ if issubclass(base, Fact))
+    return _FACT_TYPES[fact_class]
+
+
+def fact_digest(fact):
+    '''
+    digest of fact content: type and values of all attributes, equal for equal facts in all processes
+    '''
+    content = repr(canonical(fact))
+    return int.from_bytes(hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest(), 'little')
+
+
+class Savepoint(object):
+    __slots__ = ('position', 'versions', 'validated', 'ns_number')
+
+    def __init__(self, position, versions, validated, ns_number):
+        self.position = position
+        self.versions = versions
+        self.validated = validated
+        self.ns_number = ns_number
+
 
 class KnowledgeBase(object):
 
-    __slots__ = ('_facts', 'restrictions', 'ns_number')
+    __slots__ = ('_facts', '_facts_by_type', '_versions', '_jumps_from', '_jumps_to', '_validated', '_undo_log', '_savepoints', '_fingerprint', '_indexes', 'restrictions', 'ns_number')
 
     def __init__(self):
         self._facts = {}
+        self._facts_by_type = {}
+        self._versions = {}
+        self._jumps_from = {}
+        self._jumps_to = {}
+        self._validated = {}
+        self._undo_log = None # changes are logged only while there are savepoints
+        self._savepoints = []
+        self._fingerprint = None # calculated on first request, after that updated with every change
+        self._indexes = {} # index class -> (versions of its fact types, index)
         self.restrictions = []
         self.ns_number = 0
 
@@ -28,6 +83,25 @@ class KnowledgeBase(object):
 
         return kb
 
+    def copy(self):
+        '''
+        copy of knowledge base, facts are shared between copies
+        '''
+        kb = self.__class__()
+
+        kb._facts = dict(self._facts)
+        kb._facts_by_type = {fact_type: dict(facts) for fact_type, facts in self._facts_by_type.items()}
+        kb._versions = dict(self._versions)
+        kb._jumps_from = {state_uid: dict(jumps) for state_uid, jumps in self._jumps_from.items()}
+        kb._jumps_to = {state_uid: dict(jumps) for state_uid, jumps in self._jumps_to.items()}
+        kb._validated = dict(self._validated)
+        kb._fingerprint = self._fingerprint
+        kb._indexes = dict(self._indexes)
+        kb.restrictions = list(self.restrictions)
+        kb.ns_number = self.ns_number
+
+        return kb
+
     def get_next_ns(self):
         ns = '[ns-%d]' % self.ns_number
         self.ns_number += 1
@@ -42,6 +116,10 @@ class KnowledgeBase(object):
             if fact.uid in self:
                 raise exceptions.DuplicatedFactError(fact=fact)
             self._facts[fact.uid] = fact
+            self._index_fact(fact)
+
+            if self._undo_log is not None:
+                self._undo_log.append((_ADDED, fact))
         else:
             raise exceptions.WrongFactTypeError(fact=fact)
 
@@ -58,6 +136,49 @@ class KnowledgeBase(object):
 
         return self
 
+    def _index_fact(self, fact):
+        version = next(_VERSIONS)
+
+        if self._fingerprint is not None:
+            self._fingerprint ^= fact_digest(fact)
+
+        for fact_type in _fact_types(fact.__class__):
+            if fact_type not in self._facts_by_type:
+                self._facts_by_type[fact_type] = {}
+            self._facts_by_type[fact_type][fact.uid] = fact
+            self._versions[fact_type] = version
+
+        if isinstance(fact, Jump):
+            self._add_adjacency(self._jumps_from, fact.state_from, fact)
+            self._add_adjacency(self._jumps_to, fact.state_to, fact)
+
+    def _unindex_fact(self, fact):
+        version = next(_VERSIONS)
+
+        if self._fingerprint is not None:
+            self._fingerprint ^= fact_digest(fact)
+
+        for fact_type in _fact_types(fact.__class__):
+            del self._facts_by_type[fact_type][fact.uid]
+            self._versions[fact_type] = version
+
+        if isinstance(fact, Jump):
+            self._remove_adjacency(self._jumps_from, fact.state_from, fact)
+            self._remove_adjacency(self._jumps_to, fact.state_to, fact)
+
+    @staticmethod
+    def _add_adjacency(adjacency, state_uid, jump):
+        if state_uid not in adjacency:
+            adjacency[state_uid] = {}
+        adjacency[state_uid][jump.uid] = jump
+
+    @staticmethod
+    def _remove_adjacency(adjacency, state_uid, jump):
+        jumps = adjacency[state_uid]
+        del jumps[jump.uid]
+        if not jumps:
+            del adjacency[state_uid]
+
     def __contains__(self, fact_uid):
         return fact_uid in self._facts
 
@@ -68,24 +189,305 @@ class KnowledgeBase(object):
     def __delitem__(self, fact_uid):
         if fact_uid not in self:
             raise exceptions.NoFactError(fact=fact_uid)
-        del self._facts[fact_uid]
+
+        fact = self._facts.pop(fact_uid)
+        self._unindex_fact(fact)
+
+        if self._undo_log is not None:
+            self._undo_log.append((_REMOVED, fact))
 
     def get(self, fact_uid, default=None):
         if fact_uid in self._facts: return self._facts[fact_uid]
         return default
 
+    def replace(self, fact):
+        '''
+        replace fact with the same uid, equivalent of removing old fact and adding new one
+        '''
+        old_fact = self._facts.get(fact.uid)
+
+        if old_fact is None:
+            # fact of world in LayeredKnowledgeBase or missed fact
+            del self[fact.uid]
+            self += fact
+            return
+
+        # order of facts is the same, as after removing and adding
+        del self._facts[fact.uid]
+        self._unindex_fact(old_fact)
+
+        self._facts[fact.uid] = fact
+        self._index_fact(fact)
+
+        if self._undo_log is not None:
+            self._undo_log.append((_REMOVED, old_fact))
+            self._undo_log.append((_ADDED, fact))
+
+    def savepoint(self):
+        '''
+        starts logging of added and removed facts, so knowledge base can be returned to current state by rollback
+        '''
+        if self._undo_log is None:
+            self._undo_log = []
+
+        savepoint = Savepoint(position=len(self._undo_log),
+                              versions=dict(self._versions),
+                              validated=dict(self._validated),
+                              ns_number=self.ns_number)
+
+        self._savepoints.append(savepoint)
+
+        return savepoint
+
+    def rollback(self, savepoint):
+        '''
+        undoes changes made after savepoint, savepoint can be used again, savepoints created after it are invalidated
+        '''
+        if not any(savepoint is active_savepoint for active_savepoint in self._savepoints):
+            raise exceptions.WrongSavepointError()
+
+        while self._savepoints[-1] is not savepoint:
+            self._savepoints.pop()
+
+        undo_log = self._undo_log
+
+        # undo operations MUST NOT be logged
+        self._undo_log = None
+
+        try:
+            while len(undo_log) > savepoint.position:
+                operation, fact = undo_log.pop()
+                self._undo(operation, fact)
+        finally:
+            self._undo_log = undo_log
+
+        # versions are unique, so restored versions can not match any state, created after savepoint
+        self._versions = dict(savepoint.versions)
+        self._validated = dict(savepoint.validated)
+        self.ns_number = savepoint.ns_number
+
+    def commit(self):
+        '''
+        keeps all changes, stops logging and invalidates all savepoints
+        '''
+        self._undo_log = None
+        self._savepoints = []
+
+    def _undo(self, operation, fact):
+        if operation == _ADDED:
+            del self[fact.uid]
+        else:
+            self += fact
+
     def validate_consistency(self, restrictions):
+        context = None
+
         for restriction in restrictions:
-            restriction.validate(self)
+            versions = tuple(self.version(fact_type) for fact_type in getattr(restriction, 'DEPENDS_ON', (Fact,)))
+
+            # restriction already passed and facts, it depends on, did not changed since that
+            if self._validated.get(restriction) == versions:
+                continue
+
+            with instrumentation.stage(instrumentation.STAGE.RESTRICTION, restriction.__class__.__name__, self):
+                try:
+                    if hasattr(restriction, 'validate_with_context'):
+                        if context is None:
+                            context = ValidationContext(self)
+                        restriction.validate_with_context(self, context)
+                    else:
+                        restriction.validate(self)
+                except exceptions.RollBackError as e:
+                    e.restriction = restriction.__class__
+                    raise
+
+            self._validated[restriction] = versions
 
     def uids(self):
         return set(self._facts.keys())
 
+    def facts_number(self):
+        return len(self._facts)
+
     def facts(self):
-        return (self[fact_uid] for fact_uid in self.uids())
+        return iter(list(self._facts.values()))
 
     def filter(self, fact_type):
-        return (fact for fact in self.facts() if isinstance(fact, fact_type))
+        # result is a snapshot, so knowledge base can be changed while iterating over it
+        if isinstance(fact_type, tuple):
+            found = {}
+            for subtype in fact_type:
+                found.update(self._facts_by_type.get(subtype, {}))
+            return iter(list(found.values()))
+
+        return iter(list(self._facts_by_type.get(fact_type, {}).values()))
+
+    def version(self, fact_type):
+        '''
+        changed every time, when fact of fact_type added to or removed from knowledge base
+        '''
+        return self._versions.get(fact_type, 0)
+
+    def index(self, index_class):
+        '''
+        index_class(knowledge_base), cached until facts of types from index_class.FACTS are changed
+        '''
+        # versions are unique, so equal versions mean the same facts
+        versions = tuple(self.version(fact_type) for fact_type in index_class.FACTS)
+
+        cached = self._indexes.get(index_class)
+
+        if cached is None or cached[0] != versions:
+            cached = (versions, index_class(self))
+            self._indexes[index_class] = cached
+
+        return cached[1]
+
+    def fingerprint(self):
+        '''
+        digest of facts in knowledge base, equal for knowledge bases with equal facts, does not depend on order of facts
+        '''
+        return '%032x' % self._fingerprint_value()
+
+    def _fingerprint_value(self):
+        if self._fingerprint is None:
+            self._fingerprint = 0
+
+            for fact in self._facts.values():
+                self._fingerprint ^= fact_digest(fact)
+
+        return self._fingerprint
+
+    def jumps_from(self, state_uid):
+        if state_uid not in self._jumps_from:
+            return []
+        return list(self._jumps_from[state_uid].values())
+
+    def jumps_to(self, state_uid):
+        if state_uid not in self._jumps_to:
+            return []
+        return list(self._jumps_to[state_uid].values())
 
     def tagged(self, tag):
         return (fact for fact in self.facts() if tag in fact.tags)
+
+
+class LayeredKnowledgeBase(KnowledgeBase):
+    '''
+    knowledge base over shared world knowledge base (it can be layered too)
+
+    own facts are stored in overlay, removed world facts are remembered as tombstones,
+    so creation of layered knowledge base does not depend on world size
+
+    world MUST NOT be changed, while layered knowledge bases use it
+    '''
+
+    __slots__ = ('world', '_removed')
+
+    def __init__(self, world=None):
+        super(LayeredKnowledgeBase, self).__init__()
+        self.world = world if world is not None else KnowledgeBase()
+        self._removed = set()
+        self._validated = dict(self.world._validated)
+        self.restrictions = list(self.world.restrictions)
+        self.ns_number = self.world.ns_number
+
+    def serialize(self, short=False):
+        return {'facts': {fact.uid: fact.serialize(short=short) for fact in self.facts()},
+                'ns_number': self.ns_number}
+
+    def copy(self):
+        kb = super(LayeredKnowledgeBase, self).copy()
+        kb.world = self.world
+        kb._removed = set(self._removed)
+        return kb
+
+    def _in_world(self, fact_uid):
+        return fact_uid in self.world and fact_uid not in self._removed
+
+    def __contains__(self, fact_uid):
+        return fact_uid in self._facts or self._in_world(fact_uid)
+
+    def __getitem__(self, fact_uid):
+        if fact_uid in self._facts: return self._facts[fact_uid]
+        if self._in_world(fact_uid): return self.world[fact_uid]
+        raise exceptions.NoFactError(fact=fact_uid)
+
+    def __delitem__(self, fact_uid):
+        if fact_uid in self._facts:
+            super(LayeredKnowledgeBase, self).__delitem__(fact_uid)
+        elif self._in_world(fact_uid):
+            self._removed.add(fact_uid)
+
+            fact = self.world[fact_uid]
+
+            version = next(_VERSIONS)
+
+            for fact_type in _fact_types(fact.__class__):
+                self._versions[fact_type] = version
+
+            if self._undo_log is not None:
+                self._undo_log.append((_HIDDEN, fact))
+        else:
+            raise exceptions.NoFactError(fact=fact_uid)
+
+    def _undo(self, operation, fact):
+        if operation == _HIDDEN:
+            self._removed.remove(fact.uid)
+        else:
+            super(LayeredKnowledgeBase, self)._undo(operation, fact)
+
+    def changes(self):
+        '''
+        (facts added to world, world facts removed from it)
+        '''
+        return list(self._facts.values()), [self.world[fact_uid] for fact_uid in self._removed]
+
+    def _fingerprint_value(self):
+        fingerprint = self.world._fingerprint_value() ^ super(LayeredKnowledgeBase, self)._fingerprint_value()
+
+        for fact_uid in self._removed:
+            fingerprint ^= fact_digest(self.world[fact_uid])
+
+        return fingerprint
+
+    def get(self, fact_uid, default=None):
+        if fact_uid in self._facts: return self._facts[fact_uid]
+        if self._in_world(fact_uid): return self.world[fact_uid]
+        return default
+
+    def _world_facts(self, facts):
+        if not self._removed:
+            return facts
+        return (fact for fact in facts if fact.uid not in self._removed)
+
+    def uids(self):
+        return (self.world.uids() - self._removed) | set(self._facts.keys())
+
+    def facts_number(self):
+        return self.world.facts_number() - len(self._removed) + len(self._facts)
+
+    def facts(self):
+        return iter(list(itertools.chain(self._world_facts(self.world.facts()), self._facts.values())))
+
+    def filter(self, fact_type):
+        return iter(list(itertools.chain(self._world_facts(self.world.filter(fact_type)),
+                                         super(LayeredKnowledgeBase, self).filter(fact_type))))
+
+    def version(self, fact_type):
+        if fact_type in self._versions:
+            return self._versions[fact_type]
+        return self.world.version(fact_type)
+
+    def index(self, index_class):
+        # facts of index types are not changed by layer, so index of world is shared by all its layers
+        if not any(fact_type in self._versions for fact_type in index_class.FACTS):
+            return self.world.index(index_class)
+
+        return super(LayeredKnowledgeBase, self).index(index_class)
+
+    def jumps_from(self, state_uid):
+        return list(self._world_facts(self.world.jumps_from(state_uid))) + super(LayeredKnowledgeBase, self).jumps_from(state_uid)
+
+    def jumps_to(self, state_uid):
+        return list(self._world_facts(self.world.jumps_to(state_uid))) + super(LayeredKnowledgeBase, self).jumps_to(state_uid)
@@ -1,27 +1,126 @@
 # coding: utf-8
+import array
 import random
 
 from questgen import facts
 from questgen import exceptions
+from questgen import instrumentation
+
+class CompiledQuest(object):
+    '''
+    quest graph, built once from knowledge base with finished (validated) quest
+
+    graph of finished quest never changes, except ChoicePath facts, so defaults of choices reloaded when they changed
+    '''
+
+    __slots__ = ('states', 'states_ids', 'jumps_from', 'jumps_targets', 'answers', 'start_state', '_choices', '_choices_version')
+
+    def __init__(self, knowledge_base):
+        self.states = tuple(knowledge_base.filter(facts.State))
+        self.states_ids = {state.uid: state_id for state_id, state in enumerate(self.states)}
+
+        self.jumps_from = tuple(tuple(knowledge_base.jumps_from(state.uid)) for state in self.states)
+
+        self.jumps_targets = {jump.uid: self.states_ids[jump.state_to]
+                              for jumps in self.jumps_from
+                              for jump in jumps}
+
+        self.answers = {}
+
+        for state_id, state in enumerate(self.states):
+            if not isinstance(state, facts.Question):
+                continue
+
+            answers = [answer for answer in self.jumps_from[state_id] if isinstance(answer, facts.Answer)]
+
+            self.answers[state_id] = (tuple(answer for answer in answers if answer.condition == False),
+                                      tuple(answer for answer in answers if answer.condition == True))
+
+        self.start_state = next((start for start in knowledge_base.filter(facts.Start) if not knowledge_base.jumps_to(start.uid)))
+
+        self._choices = {}
+        self._choices_version = None
+
+    def state(self, state_uid):
+        return self.states[self.states_ids[state_uid]]
+
+    def jump_target(self, jump_uid):
+        return self.states[self.jumps_targets[jump_uid]]
+
+    def state_jumps(self, state):
+        return self.jumps_from[self.states_ids[state.uid]]
+
+    def state_answers(self, state, condition):
+        return self.answers[self.states_ids[state.uid]][condition]
+
+    def choice_options(self, knowledge_base, state):
+        version = knowledge_base.version(facts.ChoicePath)
+
+        if self._choices_version != version:
+            self._choices = {}
+
+            for path in knowledge_base.filter(facts.ChoicePath):
+                if path.choice not in self._choices:
+                    self._choices[path.choice] = []
+                self._choices[path.choice].append(knowledge_base[path.option])
+
+            self._choices_version = version
+
+        return self._choices.get(state.uid, [])
+
 
 class Machine(object):
     POINTER_UID = facts.Pointer().uid
 
-    __slots__ = ('knowledge_base', 'interpreter', 'unsatisfied_requirements')
+    __slots__ = ('knowledge_base', 'interpreter', 'unsatisfied_requirements', 'compiled_quest', 'rng', '_pointer', '_pointer_version')
 
-    def __init__(self, knowledge_base, interpreter):
+    def __init__(self, knowledge_base, interpreter, compiled_quest=None, rng=random):
+        '''
+        rng - source of random numbers with interface of random module (random.Random instance, for example)
+        '''
         self.knowledge_base = knowledge_base
         self.interpreter = interpreter
         self.unsatisfied_requirements = []
+        self.compiled_quest = compiled_quest
+        self.rng = rng
+
+        # Pointer fact of knowledge base; it is taken again, only when Pointer facts in knowledge base changed
+        # by other code (or by rollback)
+        self._pointer = None
+        self._pointer_version = None
+
+    def compile(self):
+        '''
+        switch machine to fast mode, knowledge base MUST contain finished quest
+        '''
+        self.compiled_quest = CompiledQuest(self.knowledge_base)
 
     @property
     def pointer(self):
-        if self.POINTER_UID not in self.knowledge_base:
-            self.knowledge_base += facts.Pointer()
-        return self.knowledge_base[self.POINTER_UID]
+        if self.knowledge_base.version(facts.Pointer) != self._pointer_version:
+            pointer = self.knowledge_base.get(self.POINTER_UID)
+
+            if pointer is None:
+                pointer = facts.Pointer()
+                self.knowledge_base += pointer
+
+            self._pointer = pointer
+            self._pointer_version = self.knowledge_base.version(facts.Pointer)
+
+        return self._pointer
+
+    def _move_pointer(self, state, jump):
+        pointer = self.pointer.change(state=state, jump=jump)
+
+        self.knowledge_base.replace(pointer)
+
+        self._pointer = pointer
+        self._pointer_version = self.knowledge_base.version(facts.Pointer)
 
     def _has_jumps(self, fact):
-        return bool([jump for jump in self.knowledge_base.filter(facts.Jump) if jump.state_from == fact.uid])
+        if self.compiled_quest is not None:
+            return bool(self.compiled_quest.state_jumps(fact))
+        return bool(self.knowledge_base.jumps_from(fact.uid))
 
     @property
     def is_processed(self): # TODO: tests
@@ -34,56 +133,65 @@ class Machine(object):
 
     @property
     def current_state(self):
-        if self.pointer.state is None:
+        state_uid = self.pointer.state
+        if state_uid is None:
             return None
-        return self.knowledge_base[self.pointer.state]
+        if self.compiled_quest is not None:
+            return self.compiled_quest.state(state_uid)
+        return self.knowledge_base[state_uid]
 
     def get_start_state(self):
-        jump_ends = set((jump.state_to for jump in self.knowledge_base.filter(facts.Jump)))
-        return next((start for start in self.knowledge_base.filter(facts.Start) if start.uid not in jump_ends))
+        if self.compiled_quest is not None:
+            return self.compiled_quest.start_state
+        return next((start for start in self.knowledge_base.filter(facts.Start) if not self.knowledge_base.jumps_to(start.uid)))
 
     @property
     def next_state(self):
-        if self.current_state is None:
+        pointer = self.pointer
+
+        if pointer.state is None:
             return self.get_start_state()
 
-        if self.pointer.jump is None:
+        if pointer.jump is None:
             return None
 
-        return self.knowledge_base[self.knowledge_base[self.pointer.jump].state_to]
+        if self.compiled_quest is not None:
+            return self.compiled_quest.jump_target(pointer.jump)
+
+        return self.knowledge_base[self.knowledge_base[pointer.jump].state_to]
 
     def step(self):
-        next_state = self.next_state
+        with instrumentation.stage(instrumentation.STAGE.MACHINE_STEP, knowledge_base=self.knowledge_base):
+            pointer = self.pointer
 
-        if next_state:
-            new_pointer = self.pointer.change(state=next_state.uid, jump=None)
+            next_state = self.next_state
 
-            if self.pointer.jump is not None:
-                next_jump = self.knowledge_base[self.pointer.jump]
-                self.interpreter.on_jump_end__before_actions(jump=next_jump)
-                self.do_actions(next_jump.end_actions)
-                self.interpreter.on_jump_end__after_actions(jump=next_jump)
+            if next_state:
+                if pointer.jump is not None:
+                    next_jump = self.knowledge_base[pointer.jump]
+                    self.interpreter.on_jump_end__before_actions(jump=next_jump)
+                    self.do_actions(next_jump.end_actions)
+                    self.interpreter.on_jump_end__after_actions(jump=next_jump)
 
-            self.interpreter.on_state__before_actions(state=next_state)
-            self.do_actions(next_state.actions)
-            self.interpreter.on_state__after_actions(state=next_state)
-        else:
-            next_jump = None
+                self.interpreter.on_state__before_actions(state=next_state)
+                self.do_actions(next_state.actions)
+                self.interpreter.on_state__after_actions(state=next_state)
 
-            if not self._has_jumps(self.current_state):
-                raise exceptions.NoJumpsFromLastStateError(state=self.current_state)
+                self._move_pointer(state=next_state.uid, jump=None)
+            else:
+                current_state = self.current_state
 
-            next_jump = self.get_next_jump(self.current_state)
+                if not self._has_jumps(current_state):
+                    raise exceptions.NoJumpsFromLastStateError(state=current_state)
 
-            new_pointer = self.pointer.change(jump=next_jump.uid if next_jump else None)
+                next_jump = self.get_next_jump(current_state)
 
-            if next_jump is not None:
-                self.interpreter.on_jump_start__before_actions(jump=next_jump)
-                self.do_actions(next_jump.start_actions)
-                self.interpreter.on_jump_start__after_actions(jump=next_jump)
+                if next_jump is not None:
+                    self.interpreter.on_jump_start__before_actions(jump=next_jump)
+                    self.do_actions(next_jump.start_actions)
+                    self.interpreter.on_jump_start__after_actions(jump=next_jump)
 
-        self.knowledge_base -= self.pointer
-        self.knowledge_base += new_pointer
+                self._move_pointer(state=pointer.state, jump=next_jump.uid if next_jump else None)
 
     def do_actions(self, actions):
         for action in actions:
@@ -127,19 +235,21 @@ class Machine(object):
             self.step()
 
     def sync_pointer(self):
-        if self.current_state is None:
+        current_state = self.current_state
+
+        if current_state is None:
             return
 
-        new_pointer = self.pointer.change(jump=self.get_next_jump(self.current_state).uid)
+        pointer = self.pointer
 
-        if new_pointer.jump is not None and self.pointer.jump != new_pointer.jump:
-            next_jump = self.knowledge_base[new_pointer.jump]
+        next_jump = self.get_next_jump(current_state)
+
+        if next_jump.uid is not None and pointer.jump != next_jump.uid:
             self.interpreter.on_jump_start__before_actions(jump=next_jump)
             self.do_actions(next_jump.start_actions)
             self.interpreter.on_jump_start__after_actions(jump=next_jump)
 
-            self.knowledge_base -= self.pointer
-            self.knowledge_base += new_pointer
+            self._move_pointer(state=pointer.state, jump=next_jump.uid)
 
 
     def get_next_jump(self, state, single=True):
@@ -148,20 +258,31 @@ class Machine(object):
             raise exceptions.NoJumpsAvailableError(state=state)
         if single and len(jumps) > 1:
             raise exceptions.MoreThenOneJumpsAvailableError(state=state)
-        return random.choice(jumps)
+        return self.rng.choice(jumps)
 
     def get_available_jumps(self, state):
+        if self.compiled_quest is not None:
+            return self._get_compiled_available_jumps(state)
+
         if isinstance(state, facts.Choice):
             defaults = [default for default in self.knowledge_base.filter(facts.ChoicePath) if default.choice == state.uid]
             return [self.knowledge_base[default.option] for default in defaults]
 
         if isinstance(state, facts.Question):
             condition = all(requirement.check(self.interpreter) for requirement in state.condition)
-            return [answer for answer in self.knowledge_base.filter(facts.Answer) if answer.state_from == state.uid and answer.condition == condition]
+            return [answer for answer in self.knowledge_base.jumps_from(state.uid) if isinstance(answer, facts.Answer) and answer.condition == condition]
 
-        return [jump
-                for jump in self.knowledge_base.filter(facts.Jump)
-                if jump.state_from == state.uid]
+        return self.knowledge_base.jumps_from(state.uid)
+
+    def _get_compiled_available_jumps(self, state):
+        if isinstance(state, facts.Choice):
+            return self.compiled_quest.choice_options(self.knowledge_base, state)
+
+        if isinstance(state, facts.Question):
+            condition = all(requirement.check(self.interpreter) for requirement in state.condition)
+            return list(self.compiled_quest.state_answers(state, condition))
+
+        return list(self.compiled_quest.state_jumps(state))
 
     def get_nearest_choice(self):
         current_state = self.current_state
@@ -176,10 +297,111 @@ class Machine(object):
             first_step = False
 
             if isinstance(current_state, facts.Choice):
-                options = [option for option in self.knowledge_base.filter(facts.Option) if option.state_from == current_state.uid]
+                options = [option for option in self.knowledge_base.jumps_from(current_state.uid) if isinstance(option, facts.Option)]
                 defaults = [default for default in self.knowledge_base.filter(facts.ChoicePath) if default.choice == current_state.uid]
                 return (current_state, options, defaults)
 
             current_state = self.knowledge_base[self.get_next_jump(current_state, single=True).state_to]
 
         return (None, None, None)
+
+
+class STEP_RESULT(object):
+    STEPPED = 0
+    BLOCKED = 1
+    FINISHED = 2
+
+
+class MachinePool(object):
+    '''
+    advances many machines in one call
+
+    requirements of all waiting machines are grouped by type, so checker can check every group in single call:
+        checker.check_located_in_many(requirements=[...], interpreters=[...]) -> iterable of booleans
+    if checker has no such method, requirements are checked one by one by interpreters of machines
+
+    without checker pool costs the same as Machine.do_step loop, it is faster only, when checker answers groups
+    cheaper than interpreters answer single requirements
+    '''
+
+    __slots__ = ('machines', 'checker')
+
+    def __init__(self, machines=(), checker=None):
+        self.machines = list(machines)
+        self.checker = checker
+
+    def add(self, machine):
+        self.machines.append(machine)
+
+    def remove_processed(self):
+        self.machines = [machine for machine in self.machines if not machine.is_processed]
+
+    def do_step(self):
+        '''
+        equivalent of Machine.do_step for every machine
+
+        returns array of STEP_RESULT values, one per machine
+        '''
+        results = array.array('B', bytes(len(self.machines)))
+
+        waiting = []
+
+        for i, machine in enumerate(self.machines):
+            if machine.is_processed:
+                results[i] = STEP_RESULT.FINISHED
+                continue
+
+            if machine.pointer.jump is None:
+                machine.step()
+                results[i] = STEP_RESULT.STEPPED
+                continue
+
+            results[i] = STEP_RESULT.BLOCKED
+
+            next_state = machine.next_state
+
+            if next_state is not None:
+                waiting.append((i, machine, next_state))
+
+        unsatisfied = self._check_requirements(waiting)
+
+        for (i, machine, next_state), unsatisfied_indexes in zip(waiting, unsatisfied):
+            machine.unsatisfied_requirements = [requirement
+                                                for requirement_index, requirement in enumerate(next_state.require)
+                                                if requirement_index in unsatisfied_indexes]
+
+            if machine.unsatisfied_requirements:
+                machine.satisfy_requirements(next_state)
+                continue
+
+            machine.step()
+            results[i] = STEP_RESULT.STEPPED
+
+        return results
+
+    def _check_requirements(self, waiting):
+        unsatisfied = [set() for i in range(len(waiting))]
+
+        groups = {}
+
+        for waiting_index, (i, machine, next_state) in enumerate(waiting):
+            for requirement_index, requirement in enumerate(next_state.require):
+                if requirement.__class__ not in groups:
+                    groups[requirement.__class__] = []
+                groups[requirement.__class__].append((waiting_index, requirement_index, requirement))
+
+        for requirement_class, group in groups.items():
+            for (waiting_index, requirement_index, requirement), is_satisfied in zip(group, self._check_group(requirement_class, group, waiting)):
+                if not is_satisfied:
+                    unsatisfied[waiting_index].add(requirement_index)
+
+        return unsatisfied
+
+    def _check_group(self, requirement_class, group, waiting):
+        check_many = getattr(self.checker, requirement_class._interpreter_check_many_method, None)
+
+        if check_many is not None:
+            return check_many(requirements=[requirement for waiting_index, requirement_index, requirement in group],
+                              interpreters=[waiting[waiting_index][1].interpreter for waiting_index, requirement_index, requirement in group])
+
+        return [requirement.check(waiting[waiting_index][1].interpreter) for waiting_index, requirement_index, requirement in group]
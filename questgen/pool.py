@@ -0,0 +1,224 @@
+# coding: utf-8
+'''
+pool of pregenerated quests
+
+quests are generated in worker processes, every worker holds deserialized world;
+for every key (for example, hero and start place) pool keeps several ready quests
+
+    pool = QuestPool(world, quests_base, restrictions, world_restrictions=world_restrictions, size=3)
+    pool.register(key, hero_facts)
+    ...
+    data = pool.get(key) # None, if there is no ready quest
+    kb = LayeredKnowledgeBase(world)
+    kb += KnowledgeBase.deserialize(serialization.decode(data, facts.FACTS), facts.FACTS).facts()
+'''
+import random
+import threading
+import collections
+
+from concurrent.futures import ProcessPoolExecutor
+
+from questgen import facts
+from questgen import exceptions
+from questgen import generation
+from questgen import serialization
+from questgen.knowledge_base import KnowledgeBase, LayeredKnowledgeBase
+
+
+# state of worker process
+_WORKER = {}
+
+
+def _initialize_worker(world_data, quests_base, restrictions, generation_arguments):
+    # forked workers share state of random generator with parent
+    random.seed()
+
+    _WORKER['world'] = KnowledgeBase.deserialize(serialization.decode(world_data, facts.FACTS), facts.FACTS)
+    _WORKER['quests_base'] = quests_base
+    _WORKER['restrictions'] = restrictions
+    _WORKER['generation_arguments'] = generation_arguments
+
+
+def _generate_quest(hero_data):
+    world = _WORKER['world']
+
+    hero_kb = LayeredKnowledgeBase(world)
+    hero_kb += [facts.FACTS[fact_data['type']].deserialize(fact_data)
+                for fact_data in serialization.decode(hero_data, facts.FACTS)['facts'].values()]
+
+    # world restrictions are validated by pool, before world is sent to workers
+    try:
+        result = generation.generate_quest(hero_kb,
+                                           _WORKER['quests_base'],
+                                           _WORKER['restrictions'],
+                                           **_WORKER['generation_arguments'])
+    except exceptions.GenerationError:
+        return None
+
+    kb = result.knowledge_base
+
+    # facts of world are not changed by generation, so only hero and quest facts are returned
+    return serialization.encode({'facts': {fact.uid: fact.serialize() for fact in kb.facts() if fact.uid not in world},
+                                 'ns_number': kb.ns_number},
+                                facts.FACTS)
+
+
+def world_version(world):
+    '''
+    changed every time, when any fact added to or removed from world
+    '''
+    return world.version(facts.Fact)
+
+
+class QuestPool(object):
+    '''
+    size - number of ready quests for every key
+    max_workers - number of worker processes, by default - number of processors
+    generation_arguments - other arguments of generation.generate_quest
+
+    quest is data of KnowledgeBase.serialize encoded by serialization.encode: facts of hero and quest without world facts
+
+    ready quests are dropped, when world is changed (see update_world);
+    quests, which could not be generated, are counted in errors and not retried until next get for their key
+    '''
+
+    def __init__(self, world, quests_base, restrictions, world_restrictions=(), size=3, max_workers=None, **generation_arguments):
+        self.size = size
+        self.errors = 0
+
+        self._quests_base = quests_base
+        self._restrictions = restrictions
+        self._world_restrictions = world_restrictions
+        self._max_workers = max_workers
+        self._generation_arguments = generation_arguments
+
+        self._lock = threading.Condition()
+        self._heroes = {}
+        self._ready = {}
+        self._pending = {}
+        self._version = None
+        self._executor = None
+
+        self._start(world)
+
+    def _start(self, world):
+        world.validate_consistency(self._world_restrictions)
+
+        self._version = world_version(world)
+        self._executor = ProcessPoolExecutor(max_workers=self._max_workers,
+                                             initializer=_initialize_worker,
+                                             initargs=(serialization.encode(world.serialize(), facts.FACTS),
+                                                       self._quests_base,
+                                                       self._restrictions,
+                                                       self._generation_arguments))
+
+    @property
+    def version(self): return self._version
+
+    def update_world(self, world):
+        '''
+        drop ready quests and restart workers with new world, if world changed
+        '''
+        if world_version(world) == self._version:
+            return
+
+        # pool continues to work with old world, if new one is broken
+        world.validate_consistency(self._world_restrictions)
+
+        with self._lock:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+            self._ready = {key: collections.deque() for key in self._heroes}
+            self._pending = {key: set() for key in self._heroes}
+
+            self._start(world)
+
+            for key in self._heroes:
+                self._refill(key)
+
+    def register(self, key, hero_facts):
+        '''
+        hero_facts - facts, which are added to world, when quests for key are generated (hero, location of hero, preferences)
+        '''
+        hero_kb = KnowledgeBase()
+        hero_kb += hero_facts
+
+        with self._lock:
+            self._heroes[key] = serialization.encode(hero_kb.serialize(), facts.FACTS)
+            self._ready[key] = collections.deque()
+            self._pending[key] = set()
+            self._refill(key)
+
+    def unregister(self, key):
+        with self._lock:
+            del self._heroes[key]
+            del self._ready[key]
+
+            for future in self._pending.pop(key):
+                future.cancel()
+
+    def ready_number(self, key):
+        return len(self._ready[key])
+
+    def get(self, key, timeout=0):
+        '''
+        ready quest for key; waits for it no more than timeout seconds (forever, if timeout is None)
+
+        returns None, if there is no ready quest, or if all generations for key failed while waiting
+        '''
+        with self._lock:
+            ready = self._ready[key]
+
+            if not ready and timeout != 0:
+                # generations failed before, so they are restarted for waiter
+                if not self._pending[key]:
+                    self._refill(key)
+
+                self._lock.wait_for(lambda: key not in self._ready or self._ready[key] or not self._pending[key], timeout=timeout)
+                ready = self._ready.get(key, ())
+
+            quest = ready.popleft() if ready else None
+
+            if key in self._heroes:
+                self._refill(key)
+
+            return quest
+
+    def _refill(self, key):
+        pending = self._pending[key]
+
+        for i in range(self.size - len(self._ready[key]) - len(pending)):
+            future = self._executor.submit(_generate_quest, self._heroes[key])
+            pending.add(future)
+            future.add_done_callback(lambda future, key=key, version=self._version: self._on_generated(key, version, future))
+
+    def _on_generated(self, key, version, future):
+        with self._lock:
+            if version != self._version or key not in self._heroes:
+                return
+
+            self._pending[key].discard(future)
+
+            if future.cancelled():
+                return
+
+            if future.exception() is not None or future.result() is None:
+                self.errors += 1
+            else:
+                self._ready[key].append(future.result())
+
+            self._lock.notify_all()
+
+    def close(self):
+        with self._lock:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._heroes = {}
+            self._ready = {}
+            self._pending = {}
+            self._lock.notify_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
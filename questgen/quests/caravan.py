@@ -1,7 +1,5 @@
 # coding: utf-8
 
-import random
-
 from questgen.quests.base_quest import QuestBetween2, ROLES, RESULTS
 from questgen import facts
 from questgen import requirements
@@ -38,9 +36,9 @@ class Caravan(QuestBetween2):
                         facts.QuestParticipant(start=start.uid, participant=receiver.uid, role=ROLES.RECEIVER),
                         facts.QuestParticipant(start=start.uid, participant=black_market.uid, role=ROLES.ANTAGONIST_POSITION)]
 
-        path_percents_1 = random.uniform(0.1, 0.3)
-        path_percents_2 = random.uniform(0.4, 0.6)
-        path_percents_3 = random.uniform(0.7, 0.9)
+        path_percents_1 = selector.rng.uniform(0.1, 0.3)
+        path_percents_2 = selector.rng.uniform(0.4, 0.6)
+        path_percents_3 = selector.rng.uniform(0.7, 0.9)
 
         first_moving = facts.State(uid=ns+'first_moving',
                                     description='moving with the caravan',
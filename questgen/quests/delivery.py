@@ -1,5 +1,4 @@
 # coding: utf-8
-import random
 
 from questgen.quests.base_quest import QuestBetween2, ROLES, RESULTS
 from questgen import facts
@@ -101,7 +100,7 @@ class Delivery(QuestBetween2):
                                        require=[requirements.LocatedOnRoad(object=hero.uid,
                                                                            place_from=initiator_position.uid,
                                                                            place_to=receiver_position.uid,
-                                                                           percents=random.uniform(0.6, 0.9))],
+                                                                           percents=selector.rng.uniform(0.6, 0.9))],
                                        actions=[actions.Message(type='delivery_stealed'),
                                                 actions.MoveNear(object=hero.uid)])
 
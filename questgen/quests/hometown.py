@@ -1,5 +1,4 @@
 # coding: utf-8
-import random
 
 from questgen.quests.base_quest import QuestBetween2, ROLES, RESULTS
 from questgen import facts
@@ -63,7 +62,7 @@ class Hometown(QuestBetween2):
                           facts.State(uid=ns+'remember_names', description='remember friends names', actions=[actions.Message(type='remember_names'),
                                                                                                                 actions.DoNothing(type='remember_names')])]
 
-        home_actions = random.sample(action_choices, 3)
+        home_actions = selector.rng.sample(action_choices, 3)
 
         finish = facts.Finish(uid=ns+'finish',
                               start=start.uid,
@@ -1,5 +1,4 @@
 # coding: utf-8
-import random
 
 from questgen.quests.base_quest import QuestBetween2, ROLES, RESULTS
 from questgen import facts
@@ -57,7 +56,7 @@ class Hunt(QuestBetween2):
 
         hunt_loop = []
 
-        for i in range(random.randint(*cls.HUNT_LOOPS)):
+        for i in range(selector.rng.randint(*cls.HUNT_LOOPS)):
 
             hunt = facts.State(uid=ns+'hunt_%d' % i,
                          description='Hunting',
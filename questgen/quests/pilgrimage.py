@@ -1,5 +1,4 @@
 # coding: utf-8
-import random
 
 from questgen.quests.base_quest import QuestBetween2, ROLES, RESULTS
 from questgen import facts
@@ -52,7 +51,7 @@ class Pilgrimage(QuestBetween2):
                           facts.State(uid=ns+'stagger_holy_streets', description='wander the streets', actions=[actions.Message(type='stagger_holy_streets'),
                                                                                                                    actions.DoNothing(type='stagger_holy_streets')])]
 
-        holy_actions = random.sample(action_choices, 1)
+        holy_actions = selector.rng.sample(action_choices, 1)
 
         finish = facts.Finish(uid=ns+'finish',
                               start=start.uid,
@@ -8,10 +8,53 @@ from questgen.quests.base_quest import BaseQuest
 
 
 
-class QuestsBase(object):
+class QuestStatistics(object):
+    '''
+    results of quest constructions
+
+    time - seconds spent on all constructions (with subquests)
+    '''
+
+    __slots__ = ('successes', 'rollbacks', 'time')
 
     def __init__(self):
+        self.successes = 0
+        self.rollbacks = 0
+        self.time = 0.0
+
+    @property
+    def constructions(self): return self.successes + self.rollbacks
+
+    @property
+    def success_rate(self):
+        # smoothed, so template with single rollback is not excluded forever
+        return (self.successes + 1.0) / (self.constructions + 2.0)
+
+    @property
+    def mean_time(self): return self.time / self.constructions if self.constructions else 0.0
+
+    def __repr__(self):
+        return 'QuestStatistics(successes=%r, rollbacks=%r, time=%r)' % (self.successes, self.rollbacks, self.time)
+
+
+class QuestsBase(object):
+    '''
+    weights - {quest type: weight}, default weight is 1.0; if not specified and not adaptive, quest choosed uniformly;
+              quests with zero weight are never choosed
+    adaptive - multiply weights by success rate and by ratio of mean construction time to mean time of quest
+    '''
+
+    CONSTRUCT_METHODS = ('construct_from_place', 'construct_from_person', 'construct_between_2')
+
+    def __init__(self, weights=None, adaptive=False):
         self._quests = {}
+        self._by_method = {}
+        self._by_tag = {}
+        self._choices_cache = {}
+        self._weights = dict(weights) if weights is not None else None
+        self._adaptive = adaptive
+        self._statistics = {}
+        self._total_statistics = QuestStatistics()
 
     def quests(self): return iter(self._quests.values())
 
@@ -22,65 +65,119 @@ class QuestsBase(object):
             if quest.TYPE in self._quests:
                 raise exceptions.DuplicatedQuestError(quest=quest)
             self._quests[quest.TYPE] = quest
+            self._register(quest)
         else:
             raise exceptions.WrongQuestTypeError(quest=quest)
 
         return self
 
-    def _available_quests(self, excluded=None, allowed=None, tags=None):
-        quests = iter(self._quests.values())
+    def _register(self, quest):
+        for method_name in self.CONSTRUCT_METHODS:
+            if hasattr(quest, method_name):
+                self._by_method[method_name] = self._by_method.get(method_name, frozenset()) | frozenset((quest.TYPE,))
+
+        for tag in quest.TAGS:
+            self._by_tag[tag] = self._by_tag.get(tag, frozenset()) | frozenset((quest.TYPE,))
+
+        self._choices_cache = {}
+
+    def _choices(self, method_name, excluded=None, allowed=None, tags=None):
+        '''
+        quests with construct method, in order of registration
+        '''
+        key = (method_name,
+               frozenset(excluded) if excluded is not None else None,
+               frozenset(allowed) if allowed is not None else None,
+               frozenset(tags) if tags is not None else None)
+
+        if key in self._choices_cache:
+            return self._choices_cache[key]
+
+        types = self._by_method.get(method_name, frozenset())
 
         if excluded is not None:
-            quests = (quest for quest in quests if quest.TYPE not in excluded)
+            types = types - key[1]
 
         if allowed is not None:
-            quests = (quest for quest in quests if quest.TYPE in allowed)
+            types = types & key[2]
 
         if tags is not None:
-            for tag in tags:
-                quests = (quest for quest in quests if tag in quest.TAGS)
-
-        return quests
+            for tag in key[3]:
+                types = types & self._by_tag.get(tag, frozenset())
 
-    def _quests_by_method(self, method_name, **kwargs):
-        return (quest for quest in self._available_quests(**kwargs)
-                if hasattr(quest, method_name))
+        choices = [quest for quest_type, quest in self._quests.items() if quest_type in types]
 
-    def _quests__from_place(self, **kwargs):
-        return self._quests_by_method(method_name='construct_from_place', **kwargs)
+        self._choices_cache[key] = choices
 
-    def _quests__from_person(self, **kwargs):
-        return self._quests_by_method(method_name='construct_from_person', **kwargs)
+        return choices
 
-    def _quests__between_2(self, **kwargs):
-        return self._quests_by_method(method_name='construct_between_2', **kwargs)
-
-    def quest_from_place(self, excluded=None, allowed=None, tags=None):
-        choices = list(self._quests__from_place(excluded=excluded, allowed=allowed, tags=tags))
+    def _choose(self, method_name, excluded, allowed, tags, rng):
+        choices = self._choices(method_name, excluded=excluded, allowed=allowed, tags=tags)
 
         if not choices:
             raise exceptions.NoQuestChoicesRollBackError()
 
-        quest_class = random.choice(choices)
+        if not self.is_weighted:
+            return rng.choice(choices)
 
-        return quest_class
+        weights = [self.weight(quest.TYPE) for quest in choices]
 
-    def quest_from_person(self, excluded=None, allowed=None, tags=None):
-        choices = list(self._quests__from_person(excluded=excluded, allowed=allowed, tags=tags))
+        choices = [quest for quest, weight in zip(choices, weights) if weight > 0]
 
         if not choices:
             raise exceptions.NoQuestChoicesRollBackError()
 
-        quest_class = random.choice(choices)
+        return rng.choices(choices, weights=[weight for weight in weights if weight > 0])[0]
 
-        return quest_class
+    @property
+    def is_weighted(self): return self._weights is not None or self._adaptive
 
-    def quest_between_2(self, excluded=None, allowed=None, tags=None):
-        choices = list(self._quests__between_2(excluded=excluded, allowed=allowed, tags=tags))
+    def record(self, quest_type, success, time):
+        '''
+        result of quest construction, rollbacks of subquests are rollbacks of quest too
+        '''
+        statistics = self._statistics.get(quest_type)
 
-        if not choices:
-            raise exceptions.NoQuestChoicesRollBackError()
+        if statistics is None:
+            statistics = QuestStatistics()
+            self._statistics[quest_type] = statistics
+
+        for statistics in (statistics, self._total_statistics):
+            if success:
+                statistics.successes += 1
+            else:
+                statistics.rollbacks += 1
+
+            statistics.time += time
+
+    def statistics(self, quest_type):
+        return self._statistics.get(quest_type) or QuestStatistics()
+
+    def reset_statistics(self):
+        self._statistics = {}
+        self._total_statistics = QuestStatistics()
+
+    def weight(self, quest_type):
+        weight = self._weights.get(quest_type, 1.0) if self._weights is not None else 1.0
+
+        if not self._adaptive:
+            return weight
+
+        # quests without statistics have the same prior success rate, as other quests
+        statistics = self.statistics(quest_type)
+
+        weight *= statistics.success_rate
+
+        if statistics.mean_time > 0:
+            weight *= self._total_statistics.mean_time / statistics.mean_time
+
+        return weight
+
+    def quest_from_place(self, excluded=None, allowed=None, tags=None, rng=random):
+        return self._choose('construct_from_place', excluded=excluded, allowed=allowed, tags=tags, rng=rng)
 
-        quest_class = random.choice(choices)
+    def quest_from_person(self, excluded=None, allowed=None, tags=None, rng=random):
+        return self._choose('construct_from_person', excluded=excluded, allowed=allowed, tags=tags, rng=rng)
 
-        return quest_class
+    def quest_between_2(self, excluded=None, allowed=None, tags=None, rng=random):
+        return self._choose('construct_between_2', excluded=excluded, allowed=allowed, tags=tags, rng=rng)
@@ -39,16 +39,55 @@ class RecordMetaclass(type):
             else:
                 record_attributes[attribute_name] = attribute
 
-        record_attributes['__slots__'] = tuple(_attributes.keys())
+        slots = tuple(_attributes.keys())
+
+        if not any(isinstance(base, RecordMetaclass) for base in bases):
+            slots += ('_hash',) # cached hash value, declared once in root record class
+
+        record_attributes['__slots__'] = slots
         record_attributes['_references'] = _references
         record_attributes['_attributes'] = _attributes
 
         return super(RecordMetaclass, cls).__new__(cls, name, bases, record_attributes)
 
 
+def _hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(element) for element in value)
+    if isinstance(value, dict):
+        return frozenset((key, _hashable(element)) for key, element in value.items())
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+_SCALARS = frozenset((str, int, float, bool))
+
+
+def canonical(value):
+    '''
+    value with dicts and sets replaced by sorted lists, so its repr does not depend on order of insertion and on hash seed
+    '''
+    if value is None or value.__class__ in _SCALARS:
+        return value
+    if isinstance(value, Record):
+        return (value.type_name(), [canonical(getattr(value, attribute)) for attribute in value._attributes])
+    if isinstance(value, tuple):
+        return tuple(canonical(element) for element in value)
+    if isinstance(value, list):
+        return [canonical(element) for element in value]
+    if isinstance(value, dict):
+        return ('dict', sorted(((canonical(key), canonical(element)) for key, element in value.items()), key=repr))
+    if isinstance(value, (set, frozenset)):
+        return ('set', sorted((canonical(element) for element in value), key=repr))
+    return value
+
+
 class Record(object, metaclass=RecordMetaclass):
     def __init__(self, **kwargs):
         super(Record, self).__init__()
+        self._hash = None
+
         for slot_attribute in self._attributes.keys():
             if slot_attribute in kwargs:
                 setattr(self, slot_attribute, kwargs[slot_attribute])
@@ -76,8 +115,14 @@ class Record(object, metaclass=RecordMetaclass):
     def __ne__(self, other):
         return not (self == other)
 
+    def _hash_key(self):
+        return tuple(_hashable(getattr(self, attribute)) for attribute in self._attributes.keys())
+
     def __hash__(self):
-        return hash(self.__class__) # bad implementaion, but fast
+        # records are never changed after creation, so hash can be calculated once
+        if self._hash is None:
+            self._hash = hash((self.__class__, self._hash_key()))
+        return self._hash
 
     @classmethod
     def type_name(cls): return cls.__name__
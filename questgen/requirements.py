@@ -14,6 +14,7 @@ class RequirementMetaclass(records.RecordMetaclass):
         new_class = super(RequirementMetaclass, cls).__new__(cls, name, bases, attributes)
 
         new_class._interpreter_check_method = 'check_%s' % utils.camel_to_underscores(name)
+        new_class._interpreter_check_many_method = 'check_%s_many' % utils.camel_to_underscores(name)
         new_class._interpreter_satisfy_method = 'satisfy_%s' % utils.camel_to_underscores(name)
 
         return new_class
@@ -8,13 +8,94 @@ from questgen import requirements
 from questgen import actions
 
 
+class ValidationContext(object):
+    '''
+    views of knowledge base, shared by restrictions during single validate_consistency call
+
+    every view is built on first request, restrictions MUST NOT change knowledge base
+    '''
+
+    __slots__ = ('knowledge_base', '_facts_by_type', '_jumps_from', '_in_degree', '_answers', '_absolute_start')
+
+    def __init__(self, knowledge_base):
+        self.knowledge_base = knowledge_base
+        self._facts_by_type = {}
+        self._jumps_from = None
+        self._in_degree = None
+        self._answers = None
+        self._absolute_start = None
+
+    def filter(self, fact_type):
+        if fact_type not in self._facts_by_type:
+            self._facts_by_type[fact_type] = list(self.knowledge_base.filter(fact_type))
+        return self._facts_by_type[fact_type]
+
+    def _build_graph(self):
+        self._jumps_from = {}
+        self._in_degree = {}
+        self._answers = {}
+
+        for jump in self.filter(facts.Jump):
+            if jump.state_from not in self._jumps_from:
+                self._jumps_from[jump.state_from] = []
+            self._jumps_from[jump.state_from].append(jump)
+
+            self._in_degree[jump.state_to] = self._in_degree.get(jump.state_to, 0) + 1
+
+            if isinstance(jump, facts.Answer):
+                if jump.state_from not in self._answers:
+                    self._answers[jump.state_from] = []
+                self._answers[jump.state_from].append(jump)
+
+    def jumps_from(self, state_uid):
+        if self._jumps_from is None:
+            self._build_graph()
+        return self._jumps_from.get(state_uid, ())
+
+    def in_degree(self, state_uid):
+        if self._in_degree is None:
+            self._build_graph()
+        return self._in_degree.get(state_uid, 0)
+
+    def answers(self, question_uid):
+        if self._answers is None:
+            self._build_graph()
+        return self._answers.get(question_uid, ())
+
+    @property
+    def absolute_start(self):
+        if self._absolute_start is None:
+            self._absolute_start = logic.get_absolute_start(self.knowledge_base)
+        return self._absolute_start
+
+
 class Restriction(object):
+    # fact types, which restriction checks;
+    # knowledge base does not repeat successful validation, while facts of that types are not changed
+    DEPENDS_ON = (facts.Fact,)
 
     def validate(self, knowledge_base):
         raise NotImplementedError
 
+    def validate_with_context(self, knowledge_base, context):
+        self.validate(knowledge_base)
+
+
+class ContextRestriction(Restriction):
+    '''
+    restriction, which checks knowledge base through ValidationContext
+    '''
+
+    def validate(self, knowledge_base):
+        self.validate_with_context(knowledge_base, ValidationContext(knowledge_base))
+
+    def validate_with_context(self, knowledge_base, context):
+        raise NotImplementedError
+
 
 class AlwaysSuccess(Restriction):
+    DEPENDS_ON = ()
+
     def validate(self, knowledge_base): pass
 
 
@@ -27,38 +108,42 @@ class AlwaysError(Restriction):
         raise self.Error()
 
 
-class SingleStartStateWithNoEnters(Restriction):
+class SingleStartStateWithNoEnters(ContextRestriction):
 
     class Error(exceptions.RollBackError):
         MSG = 'MUST be only one Start statement without entering jumps'
 
-    def validate(self, knowledge_base):
-        enter_uids = set(jump.state_to for jump in knowledge_base.filter(facts.Jump))
-        starts = (start for start in knowledge_base.filter(facts.Start) if start.uid not in enter_uids)
+    DEPENDS_ON = (facts.Start, facts.Jump)
 
-        if len(list(starts)) != 1:
+    def validate_with_context(self, knowledge_base, context):
+        starts = [start for start in context.filter(facts.Start) if not context.in_degree(start.uid)]
+
+        if len(starts) != 1:
             raise self.Error()
 
 
-class FinishStateExists(Restriction):
+class FinishStateExists(ContextRestriction):
 
     class Error(exceptions.RollBackError):
         MSG = 'at least one Finish state MUST exists'
 
-    def validate(self, knowledge_base):
-        if len(list(knowledge_base.filter(facts.Finish))) == 0:
+    DEPENDS_ON = (facts.Finish,)
+
+    def validate_with_context(self, knowledge_base, context):
+        if not context.filter(facts.Finish):
             raise self.Error()
 
 
-class AllStatesHasJumps(Restriction):
+class AllStatesHasJumps(ContextRestriction):
 
     class Error(exceptions.RollBackError):
         MSG = 'no jumps from state "%(state)s"'
 
-    def validate(self, knowledge_base):
-        from_uids = set(jump.state_from for jump in knowledge_base.filter(facts.Jump))
-        for state in knowledge_base.filter(facts.State):
-            if not isinstance(state, facts.Finish) and state.uid not in from_uids:
+    DEPENDS_ON = (facts.State, facts.Jump)
+
+    def validate_with_context(self, knowledge_base, context):
+        for state in context.filter(facts.State):
+            if not isinstance(state, facts.Finish) and not context.jumps_from(state.uid):
                 raise self.Error(state=state)
 
 
@@ -66,6 +151,8 @@ class SingleLocationForObject(Restriction):
     class Error(exceptions.RollBackError):
         MSG = 'every person MUST be located in single place. Problem in %(location_1)r and %(location_2)s'
 
+    DEPENDS_ON = (facts.LocatedIn, facts.LocatedNear)
+
     def validate(self, knowledge_base):
         objects_to_locations = {}
         for location in itertools.chain(knowledge_base.filter(facts.LocatedIn), knowledge_base.filter(facts.LocatedNear)):
@@ -88,12 +175,14 @@ class ReferencesIntegrity(Restriction):
                     raise self.Error(fact=fact, attribute=reference, uid=uid)
 
 
-class RequirementsConsistency(Restriction):
+class RequirementsConsistency(ContextRestriction):
     class Error(exceptions.RollBackError):
         MSG = 'wrong class of requirement "%(requirement)s" in state "%(state)s"'
 
-    def validate(self, knowledge_base):
-        for state in knowledge_base.filter(facts.State):
+    DEPENDS_ON = (facts.State,)
+
+    def validate_with_context(self, knowledge_base, context):
+        for state in context.filter(facts.State):
             for requirement in state.require:
                 if not isinstance(requirement, requirements.Requirement):
                     raise self.Error(requirement=requirement, state=state)
@@ -104,118 +193,135 @@ class RequirementsConsistency(Restriction):
                         raise self.Error(requirement=requirement, state=state)
 
 
-class ActionsConsistency(Restriction):
+class ActionsConsistency(ContextRestriction):
     class Error(exceptions.RollBackError):
         MSG = 'wrong class of action "%(action)s" in fact "%(fact)s"'
 
-    def validate(self, knowledge_base):
-        for state in knowledge_base.filter(facts.State):
+    DEPENDS_ON = (facts.State, facts.Jump)
+
+    def validate_with_context(self, knowledge_base, context):
+        for state in context.filter(facts.State):
             for action in state.actions:
                 if not isinstance(action, actions.Action):
                     raise self.Error(action=action, fact=state)
 
-        for jump in knowledge_base.filter(facts.Jump):
+        for jump in context.filter(facts.Jump):
             for action in itertools.chain(jump.start_actions, jump.end_actions):
                 if not isinstance(action, actions.Action):
                     raise self.Error(action=action, fact=jump)
 
 
 
-class ConnectedStateJumpGraph(Restriction):
+class ConnectedStateJumpGraph(ContextRestriction):
     class Error(exceptions.RollBackError):
         MSG = 'States not reached from absolute Start: %(states)r'
 
-    def validate(self, knowledge_base):
-        start_uid = logic.get_absolute_start(knowledge_base).uid
+    DEPENDS_ON = (facts.State, facts.Jump)
+
+    def validate_with_context(self, knowledge_base, context):
+        start_uid = context.absolute_start.uid
 
         riched_states = set()
         query = [start_uid]
 
         while query:
-            state_uid = query.pop(0)
+            state_uid = query.pop()
 
             if state_uid in riched_states: continue
 
             riched_states.add(state_uid)
 
-            for jump in knowledge_base.filter(facts.Jump):
-                if jump.state_from != state_uid: continue
+            for jump in context.jumps_from(state_uid):
                 query.append(jump.state_to)
 
-        all_states = set(state.uid for state in knowledge_base.filter(facts.State))
+        all_states = set(state.uid for state in context.filter(facts.State))
 
         if riched_states != all_states:
             raise self.Error(states=all_states-riched_states)
 
 
-class NoCirclesInStateJumpGraph(Restriction):
+class NoCirclesInStateJumpGraph(ContextRestriction):
     class Error(exceptions.RollBackError):
         MSG = 'Jumps in circle: %(jumps)r'
 
-    def _bruteforce(self, path, table):
-        current_state = path[-1]
+    def _find_circle(self, start_uid, graph):
+        # iterative depth-first search: states on current path are "gray", processed states are "black"
+        path = [start_uid]
+        path_states = set(path)
+        processed_states = set()
+        jumps_stack = [iter(graph.jumps_from(start_uid))]
+
+        while jumps_stack:
+            for jump in jumps_stack[-1]:
+                next_state = jump.state_to
 
-        if not table.get(current_state):
-            return
+                if next_state in path_states:
+                    return path + [next_state]
 
-        for next_state in table[current_state]:
+                if next_state in processed_states:
+                    continue
 
-            if next_state in path:
-                raise self.Error(jumps=path+[next_state])
+                path.append(next_state)
+                path_states.add(next_state)
+                jumps_stack.append(iter(graph.jumps_from(next_state)))
+                break
 
-            path.append(next_state)
-            self._bruteforce(path, table)
-            path.pop()
+            else:
+                jumps_stack.pop()
+                state_uid = path.pop()
+                path_states.remove(state_uid)
+                processed_states.add(state_uid)
 
+        return None
 
-    def validate(self, knowledge_base):
-        start_uid = logic.get_absolute_start(knowledge_base).uid
+    DEPENDS_ON = (facts.Start, facts.Jump)
+
+    def validate_with_context(self, knowledge_base, context):
+        circle = self._find_circle(context.absolute_start.uid, context)
 
-        table = {}
-        for jump in knowledge_base.filter(facts.Jump):
-            if jump.state_from not in table:
-                table[jump.state_from] = []
-            table[jump.state_from].append(jump.state_to)
-        self._bruteforce([start_uid], table)
+        if circle is not None:
+            raise self.Error(jumps=circle)
 
 
-class MultipleJumpsFromNormalState(Restriction):
+class MultipleJumpsFromNormalState(ContextRestriction):
     class Error(exceptions.RollBackError):
         MSG = 'States with multiple jumps: %(states)r'
 
-    def validate(self, knowledge_base):
+    DEPENDS_ON = (facts.State, facts.Jump)
+
+    def validate_with_context(self, knowledge_base, context):
 
         wrong_states = []
 
-        for state in knowledge_base.filter(facts.State):
+        for state in context.filter(facts.State):
             if isinstance(state, (facts.Choice, facts.Question)):
                continue
 
-            jumps = list(jump for jump in knowledge_base.filter(facts.Jump) if jump.state_from == state.uid)
-
-            if len(jumps) > 1:
+            if len(context.jumps_from(state.uid)) > 1:
                 wrong_states.append(state.uid)
 
         if wrong_states:
             raise self.Error(states=wrong_states)
 
 
-class ChoicesConsistency(Restriction):
+class ChoicesConsistency(ContextRestriction):
     class OptionLikeJumpError(exceptions.RollBackError):
         MSG = 'Option not connected to choice state: %(option)r'
 
     class JumpLikeOptionError(exceptions.RollBackError):
         MSG = 'Jump connected to choice state: %(jump)r'
 
-    def validate(self, knowledge_base):
+    DEPENDS_ON = (facts.State, facts.Jump)
 
-        for option in knowledge_base.filter(facts.Option):
+    def validate_with_context(self, knowledge_base, context):
+
+        for option in context.filter(facts.Option):
             if isinstance(knowledge_base[option.state_from], facts.Choice):
                continue
 
             raise self.OptionLikeJumpError(option=option)
 
-        for jump in knowledge_base.filter(facts.Jump):
+        for jump in context.filter(facts.Jump):
             if not isinstance(knowledge_base[jump.state_from], facts.Choice):
                continue
 
@@ -226,7 +332,7 @@ class ChoicesConsistency(Restriction):
 
 
 
-class QuestionsConsistency(Restriction):
+class QuestionsConsistency(ContextRestriction):
     class AnswerLikeJumpError(exceptions.RollBackError):
         MSG = 'Answer not connected to question state: %(answer)r'
 
@@ -239,15 +345,17 @@ class QuestionsConsistency(Restriction):
     class WrongAnswersStructure(exceptions.RollBackError):
         MSG = '%(question)r must has 2 answers: false & true'
 
-    def validate(self, knowledge_base):
+    DEPENDS_ON = (facts.State, facts.Jump)
+
+    def validate_with_context(self, knowledge_base, context):
 
-        for answer in knowledge_base.filter(facts.Answer):
+        for answer in context.filter(facts.Answer):
             if isinstance(knowledge_base[answer.state_from], facts.Question):
                continue
 
             raise self.AnswerLikeJumpError(answer=answer)
 
-        for jump in knowledge_base.filter(facts.Jump):
+        for jump in context.filter(facts.Jump):
             if not isinstance(knowledge_base[jump.state_from], facts.Question):
                continue
 
@@ -256,9 +364,9 @@ class QuestionsConsistency(Restriction):
 
             raise self.JumpLikeAnswerError(jump=jump)
 
-        for question in knowledge_base.filter(facts.Question):
+        for question in context.filter(facts.Question):
 
-            answers = [answer for answer in knowledge_base.filter(facts.Answer) if answer.state_from == question.uid]
+            answers = context.answers(question.uid)
 
             if len(answers) != 2:
                 raise self.WrongAnswersNumber(question=question)
@@ -270,24 +378,30 @@ class QuestionsConsistency(Restriction):
             raise self.WrongAnswersStructure(question=question)
 
 
-class FinishResultsConsistency(Restriction):
+class FinishResultsConsistency(ContextRestriction):
     class ParticipantNotInResults(exceptions.RollBackError):
         MSG = 'no result for participant "%(participant)r"'
 
     class ParticipantNotExists(exceptions.RollBackError):
         MSG = 'no participant for object "%(object)r"'
 
-    def validate(self, knowledge_base):
+    DEPENDS_ON = (facts.Start, facts.Finish, facts.QuestParticipant)
+
+    def validate_with_context(self, knowledge_base, context):
+
+        participants_by_start = {}
 
-        for finish in knowledge_base.filter(facts.Finish):
+        for participant in context.filter(facts.QuestParticipant):
+            if participant.start not in participants_by_start:
+                participants_by_start[participant.start] = []
+            participants_by_start[participant.start].append(participant)
+
+        for finish in context.filter(facts.Finish):
             start = knowledge_base[finish.start]
 
             participants = set()
 
-            for participant in knowledge_base.filter(facts.QuestParticipant):
-                if participant.start != start.uid:
-                    continue
-
+            for participant in participants_by_start.get(start.uid, ()):
                 if participant.participant not in finish.results:
                     raise self.ParticipantNotInResults(participant=participant)
 
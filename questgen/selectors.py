@@ -1,24 +1,115 @@
 # coding: utf-8
+import time
 import random
+import itertools
 
 from questgen import exceptions
+from questgen import instrumentation
 
 from questgen import facts
 
 
+class Index(object):
+    '''
+    positions in facts list are used as keys, so candidates are selected in the same order as from knowledge base
+    '''
+    # index is rebuilt, when facts of that types are changed
+    FACTS = ()
+
+    __slots__ = ()
+
+    @staticmethod
+    def _add(index, key, position):
+        if key not in index:
+            index[key] = []
+        index[key].append(position)
+
+    def positions(self, index, keys):
+        return set(itertools.chain.from_iterable(index.get(key, ()) for key in keys))
+
+
+class PersonsIndex(Index):
+    '''
+    persons with their places (in order of LocatedIn facts) and social connections
+    '''
+    FACTS = (facts.LocatedIn, facts.Person, facts.SocialConnection, facts.NotFirstInitiator)
+
+    __slots__ = ('locations', 'by_place', 'by_person', 'by_profession', 'social_connections', 'not_first_initiators')
+
+    def __init__(self, kb):
+        self.locations = []
+        self.by_place = {}
+        self.by_person = {}
+        self.by_profession = {}
+
+        for location in kb.filter(facts.LocatedIn):
+            person = kb.get(location.object)
+
+            if not isinstance(person, facts.Person):
+                continue
+
+            position = len(self.locations)
+
+            self.locations.append((location.place, person))
+
+            self._add(self.by_place, location.place, position)
+            self._add(self.by_person, person.uid, position)
+            self._add(self.by_profession, person.profession, position)
+
+        self.social_connections = set((connection.person_from, connection.person_to, connection.type)
+                                      for connection in kb.filter(facts.SocialConnection))
+
+        self.not_first_initiators = set(restriction.person for restriction in kb.filter(facts.NotFirstInitiator))
+
+
+class PlacesIndex(Index):
+    '''
+    places by uid, terrain and type
+    '''
+    FACTS = (facts.Place,)
+
+    __slots__ = ('places', 'all_positions', 'by_uid', 'by_terrain', 'by_type')
+
+    def __init__(self, kb):
+        self.places = list(kb.filter(facts.Place))
+        self.all_positions = range(len(self.places))
+        self.by_uid = {}
+        self.by_terrain = {}
+        self.by_type = {}
+
+        for position, place in enumerate(self.places):
+            self._add(self.by_uid, place.uid, position)
+            self._add(self.by_type, place.type, position)
+
+            for terrain in frozenset(place.terrains or ()):
+                self._add(self.by_terrain, terrain, position)
+
+
+def get_index(index_class, kb):
+    '''
+    index is cached by knowledge base, all selectors (and attempts of quest generation) over the same world use it
+    '''
+    return kb.index(index_class)
+
+
 class Selector(object):
-    __slots__ = ('_kb', '_qb', '_is_first_quest', '_reserved', '_excluded_quests', '_social_connection_probability')
+    __slots__ = ('_kb', '_qb', '_is_first_quest', '_reserved', '_excluded_quests', '_social_connection_probability', '_constructions', 'rng')
 
-    def __init__(self, kb, qb, social_connection_probability=0):
+    def __init__(self, kb, qb, social_connection_probability=0, rng=random):
+        '''
+        rng - source of random numbers with interface of random module, used by selector and by quests
+        '''
         self._kb = kb
         self._qb = qb
         self._social_connection_probability = social_connection_probability
+        self.rng = rng
         self.reset()
 
     def reset(self):
         self._reserved = set()
         self._is_first_quest = True
         self._excluded_quests = set()
+        self._constructions = []
 
     @property
     def is_first_quest(self):
@@ -50,28 +141,39 @@ class Selector(object):
     def heroes(self): return list(h for h in self._kb.filter(facts.Hero))
 
     def new_place(self, candidates=None, terrains=None, types=None):
-        places = (place for place in self._kb.filter(facts.Place) if place.uid not in self._reserved)
-
-        if types is not None:
-            places = (place for place in places if place.type in types)
-
-        if candidates is not None:
-            places = (place for place in places if place.uid in candidates)
+        index = get_index(PlacesIndex, self._kb)
 
         if terrains:
             terrains = set(terrains)
-            places = (place for place in places if set(place.terrains) & terrains)
 
-        places = list(places)
+        positions = None
+
+        for keys, places_index in ((types, index.by_type),
+                                   (candidates, index.by_uid),
+                                   (terrains or None, index.by_terrain)):
+            if keys is None:
+                continue
+
+            selected_positions = index.positions(places_index, keys)
+            positions = selected_positions if positions is None else positions & selected_positions
+
+        reserved_positions = index.positions(index.by_uid, self._reserved)
+
+        if positions is not None:
+            places = [index.places[position] for position in sorted(positions - reserved_positions)]
+        elif reserved_positions:
+            places = [index.places[position] for position in index.all_positions if position not in reserved_positions]
+        else:
+            places = index.places
 
         if not places:
             raise exceptions.NoFactSelectedError(method='new_place',
                                                  arguments={'terrains': terrains,
                                                             'types': types,
                                                             'candidates': candidates},
-                                                 reserved=self._reserved)
+                                                 reserved=frozenset(self._reserved))
 
-        place = random.choice(places)
+        place = self.rng.choice(places)
         self._reserved.add(place.uid)
 
         return place
@@ -81,17 +183,16 @@ class Selector(object):
         locations = list(self._locations(objects=objects, restrict_places=False, restrict_objects=False))
 
         if not locations:
-            raise exceptions.NoFactSelectedError(method='place', arguments={'objects': objects}, reserved=self._reserved)
+            raise exceptions.NoFactSelectedError(method='place', arguments={'objects': objects}, reserved=frozenset(self._reserved))
 
-        place = self._kb[random.choice(locations).place]
+        place = self._kb[self.rng.choice(locations).place]
 
         self._reserved.add(place.uid)
 
         return place
 
     def check_social_connections(self, person, connected_person_uid, social_connection_type):
-        return any(fact.person_from == person.uid and fact.person_to == connected_person_uid and fact.type == social_connection_type
-                   for fact in self._kb.filter(facts.SocialConnection))
+        return (person.uid, connected_person_uid, social_connection_type) in get_index(PersonsIndex, self._kb).social_connections
 
     def new_person(self,
                    first_initiator=False,
@@ -102,22 +203,46 @@ class Selector(object):
                    restrict_persons=True,
                    restrict_social_connections=(),
                    social_connections=()):
-        locations = self._locations(places=places, restrict_places=restrict_places, restrict_objects=restrict_persons)
+        index = get_index(PersonsIndex, self._kb)
+
+        # start from the most selective index, other filters are still applied
+        if candidates is not None:
+            positions = sorted(index.positions(index.by_person, candidates))
+        elif places is not None:
+            positions = sorted(index.positions(index.by_place, places))
+        elif professions is not None:
+            positions = sorted(index.positions(index.by_profession, professions))
+        else:
+            positions = range(len(index.locations))
 
-        persons = (self._kb[location.object] for location in locations if isinstance(self._kb[location.object], facts.Person))
+        persons = []
+
+        for position in positions:
+            place_uid, person = index.locations[position]
+
+            if restrict_places and place_uid in self._reserved:
+                continue
+
+            if restrict_persons and person.uid in self._reserved:
+                continue
+
+            if places is not None and place_uid not in places:
+                continue
+
+            persons.append(person)
 
         for connected_person_uid, social_connection_type in restrict_social_connections:
             persons = (person for person in persons
-                       if not self.check_social_connections(person, connected_person_uid, social_connection_type))
+                       if (person.uid, connected_person_uid, social_connection_type) not in index.social_connections)
 
         social_filter_applied = False
 
         if social_connections:
             probability = self._social_connection_probability * len(set(connected_person_uid for connected_person_uid, social_connection_type in social_connections))
-            if random.random() < probability:
+            if self.rng.random() < probability:
                 social_filter_applied = True
                 persons = (person for person in persons
-                           if any(self.check_social_connections(person, connected_person_uid, social_connection_type)
+                           if any((person.uid, connected_person_uid, social_connection_type) in index.social_connections
                                   for connected_person_uid, social_connection_type in social_connections))
 
         if professions is not None:
@@ -127,8 +252,7 @@ class Selector(object):
             persons = (person for person in persons if person.uid in candidates)
 
         if first_initiator:
-            not_initiators = set(restriction.person for restriction in self._kb.filter(facts.NotFirstInitiator))
-            persons = (person for person in persons if person.uid not in not_initiators)
+            persons = (person for person in persons if person.uid not in index.not_first_initiators)
 
         persons = list(persons)
 
@@ -150,9 +274,9 @@ class Selector(object):
                                                                 'places': places,
                                                                 'restrict_places': restrict_places,
                                                                 'restrict_persons': restrict_persons},
-                                                     reserved=self._reserved)
+                                                     reserved=frozenset(self._reserved))
 
-        person = random.choice(persons)
+        person = self.rng.choice(persons)
         self._reserved.add(person.uid)
 
         return person
@@ -161,62 +285,80 @@ class Selector(object):
         try:
             return next(self._kb.filter(facts.PreferenceMob))
         except StopIteration:
-            raise exceptions.NoFactSelectedError(method='preferences_mob', arguments={}, reserved=self._reserved)
+            raise exceptions.NoFactSelectedError(method='preferences_mob', arguments={}, reserved=frozenset(self._reserved))
 
     def preferences_hometown(self):
         try:
             return next(self._kb.filter(facts.PreferenceHometown))
         except StopIteration:
-            raise exceptions.NoFactSelectedError(method='preferences_hometown', arguments={}, reserved=self._reserved)
+            raise exceptions.NoFactSelectedError(method='preferences_hometown', arguments={}, reserved=frozenset(self._reserved))
 
     def preferences_enemy(self):
         try:
             return next(self._kb.filter(facts.PreferenceEnemy))
         except StopIteration:
-            raise exceptions.NoFactSelectedError(method='preferences_enemy', arguments={}, reserved=self._reserved)
+            raise exceptions.NoFactSelectedError(method='preferences_enemy', arguments={}, reserved=frozenset(self._reserved))
 
     def preferences_friend(self):
         try:
             return next(self._kb.filter(facts.PreferenceFriend))
         except StopIteration:
-            raise exceptions.NoFactSelectedError(method='preferences_friend', arguments={}, reserved=self._reserved)
+            raise exceptions.NoFactSelectedError(method='preferences_friend', arguments={}, reserved=frozenset(self._reserved))
 
     def upgrade_equipment_cost(self):
         try:
             return next(self._kb.filter(facts.UpgradeEquipmentCost))
         except StopIteration:
-            raise exceptions.NoFactSelectedError(method='upgrade_equipment_cost', arguments={}, reserved=self._reserved)
+            raise exceptions.NoFactSelectedError(method='upgrade_equipment_cost', arguments={}, reserved=frozenset(self._reserved))
+
+    def _construct(self, quest_class, method_name, **kwargs):
+        started_at = time.perf_counter()
+
+        try:
+            with instrumentation.stage(instrumentation.STAGE.CONSTRUCT, quest_class.TYPE, self._kb):
+                return getattr(quest_class, method_name)(**kwargs)
+        finally:
+            self._constructions.append((quest_class.TYPE, time.perf_counter() - started_at))
+
+    def record_constructions(self, success):
+        '''
+        report result of quest to quests base: all constructed templates (and subquests) succeeded or failed together
+        '''
+        for quest_type, construction_time in self._constructions:
+            self._qb.record(quest_type, success=success, time=construction_time)
+
+        self._constructions = []
 
     def create_quest_from_place(self, nesting, initiator_position, **kwargs):
         excluded = set(kwargs.get('excluded', []))
         excluded |= self._excluded_quests
         kwargs['excluded'] = excluded
 
-        quest_class = self._qb.quest_from_place(**kwargs)
+        quest_class = self._qb.quest_from_place(rng=self.rng, **kwargs)
         if 'has_subquests' in quest_class.TAGS:
             self._excluded_quests.add(quest_class.TYPE)
 
-        return quest_class.construct_from_place(nesting=nesting, selector=self, start_place=initiator_position)
+        return self._construct(quest_class, 'construct_from_place', nesting=nesting, selector=self, start_place=initiator_position)
 
     def create_quest_from_person(self, nesting, initiator, **kwargs):
         excluded = set(kwargs.get('excluded', []))
         excluded |= self._excluded_quests
         kwargs['excluded'] = excluded
 
-        quest_class = self._qb.quest_from_person(**kwargs)
+        quest_class = self._qb.quest_from_person(rng=self.rng, **kwargs)
         if 'has_subquests' in quest_class.TAGS:
             self._excluded_quests.add(quest_class.TYPE)
 
-        return quest_class.construct_from_person(nesting=nesting, selector=self, initiator=initiator)
+        return self._construct(quest_class, 'construct_from_person', nesting=nesting, selector=self, initiator=initiator)
 
     def create_quest_between_2(self, nesting, initiator, receiver, **kwargs):
         excluded = set(kwargs.get('excluded', []))
         excluded |= self._excluded_quests
         kwargs['excluded'] = excluded
 
-        quest_class = self._qb.quest_between_2(**kwargs)
+        quest_class = self._qb.quest_between_2(rng=self.rng, **kwargs)
 
         if 'has_subquests' in quest_class.TAGS:
             self._excluded_quests.add(quest_class.TYPE)
 
-        return quest_class.construct_between_2(nesting=nesting, selector=self, initiator=initiator, receiver=receiver)
+        return self._construct(quest_class, 'construct_between_2', nesting=nesting, selector=self, initiator=initiator, receiver=receiver)
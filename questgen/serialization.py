@@ -0,0 +1,327 @@
+# coding: utf-8
+'''
+compact binary form of KnowledgeBase.serialize() data
+
+    data = serialization.encode(kb.serialize(), facts.FACTS)
+    kb = KnowledgeBase.deserialize(serialization.decode(data, facts.FACTS), facts.FACTS)
+
+- every string is written once, next occurrences are references to it (string table is built while reading)
+- attributes of facts, actions and requirements are written by position in _attributes of record class,
+  so encoded data can be decoded only with the same record classes
+- attributes, which are missed or equal to default, are marked in masks and not written
+- integers are zigzag varints, tuples and lists are different values, so decode(encode(data)) == data
+'''
+import struct
+
+from questgen import exceptions
+
+
+FORMAT_VERSION = 1
+
+MAGIC = b'QG' + bytes((FORMAT_VERSION, ))
+
+_FLOAT = struct.Struct('<d')
+
+
+class TAG(object):
+    NONE = 0
+    TRUE = 1
+    FALSE = 2
+    INT = 3
+    FLOAT = 4
+    STRING = 5
+    LIST = 6
+    TUPLE = 7
+    DICT = 8
+
+
+_LAYOUTS = {}
+
+
+def _layout(record_class):
+    '''
+    (name, bit, attribute, classes of nested records) for attributes in order of positions
+    '''
+    layout = _LAYOUTS.get(record_class)
+
+    if layout is None:
+        layout = tuple((name, 1 << position, attribute, getattr(attribute, 'deserialization_classes', None))
+                       for position, (name, attribute) in enumerate(record_class._attributes.items()))
+        _LAYOUTS[record_class] = layout
+
+    return layout
+
+
+def _is_default(attribute, value):
+    # 1 == 1.0 and 0 == False, so types are compared too
+    return attribute.has_default and type(value) is type(attribute.default) and value == attribute.default
+
+
+class _Encoder(object):
+    __slots__ = ('buffer', 'strings')
+
+    def __init__(self):
+        self.buffer = bytearray(MAGIC)
+        self.strings = {}
+
+    def varint(self, number):
+        buffer = self.buffer
+
+        while number > 0x7f:
+            buffer.append((number & 0x7f) | 0x80)
+            number >>= 7
+
+        buffer.append(number)
+
+    def string(self, string):
+        index = self.strings.get(string)
+
+        if index is not None:
+            self.varint(index + 1)
+            return
+
+        self.strings[string] = len(self.strings)
+
+        encoded = string.encode('utf-8')
+
+        self.varint(0)
+        self.varint(len(encoded))
+        self.buffer.extend(encoded)
+
+    def value(self, value):
+        value_type = type(value)
+
+        if value is None:
+            self.buffer.append(TAG.NONE)
+
+        elif value_type is bool:
+            self.buffer.append(TAG.TRUE if value else TAG.FALSE)
+
+        elif value_type is int:
+            self.buffer.append(TAG.INT)
+            self.varint(value << 1 if value >= 0 else ((-value) << 1) - 1)
+
+        elif value_type is str:
+            self.buffer.append(TAG.STRING)
+            self.string(value)
+
+        elif value_type is float:
+            self.buffer.append(TAG.FLOAT)
+            self.buffer.extend(_FLOAT.pack(value))
+
+        elif value_type is list or value_type is tuple:
+            self.buffer.append(TAG.LIST if value_type is list else TAG.TUPLE)
+            self.varint(len(value))
+
+            for element in value:
+                self.value(element)
+
+        elif value_type is dict:
+            self.buffer.append(TAG.DICT)
+            self.varint(len(value))
+
+            for key, element in value.items():
+                self.value(key)
+                self.value(element)
+
+        else:
+            raise exceptions.UnserializableValueError(value=value, type=value_type.__name__)
+
+    def record(self, data, record_classes):
+        type_name = data['type']
+        attributes = data['attributes']
+
+        self.string(type_name)
+
+        record_class = record_classes[type_name]
+
+        for name in attributes:
+            if name not in record_class._attributes:
+                raise exceptions.WrongRecordAttributeError(record=type_name, attribute=name)
+
+        presence_mask = 0
+        default_mask = 0
+        values = []
+
+        for name, bit, attribute, classes in _layout(record_class):
+            if name not in attributes:
+                continue
+
+            presence_mask |= bit
+
+            value = attributes[name]
+
+            if _is_default(attribute, value):
+                default_mask |= bit
+                continue
+
+            values.append((classes, value))
+
+        self.varint(presence_mask)
+        self.varint(default_mask)
+
+        for classes, value in values:
+            if classes is None:
+                self.value(value)
+                continue
+
+            self.varint(len(value))
+
+            for record_data in value:
+                self.record(record_data, classes)
+
+
+class _Decoder(object):
+    __slots__ = ('data', 'position', 'strings')
+
+    def __init__(self, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise exceptions.WrongSerializedDataError(message='unknown format or version')
+
+        self.data = data
+        self.position = len(MAGIC)
+        self.strings = []
+
+    def varint(self):
+        data = self.data
+        position = self.position
+
+        number = 0
+        shift = 0
+
+        while True:
+            byte = data[position]
+            position += 1
+
+            number |= (byte & 0x7f) << shift
+
+            if byte < 0x80:
+                break
+
+            shift += 7
+
+        self.position = position
+
+        return number
+
+    def string(self):
+        index = self.varint()
+
+        if index:
+            return self.strings[index - 1]
+
+        length = self.varint()
+
+        if self.position + length > len(self.data):
+            raise IndexError()
+
+        string = self.data[self.position:self.position + length].decode('utf-8')
+
+        self.position += length
+        self.strings.append(string)
+
+        return string
+
+    def value(self):
+        tag = self.data[self.position]
+        self.position += 1
+
+        if tag == TAG.STRING:
+            return self.string()
+
+        if tag == TAG.INT:
+            number = self.varint()
+            return number >> 1 if not number & 1 else -((number + 1) >> 1)
+
+        if tag == TAG.NONE:
+            return None
+
+        if tag == TAG.TRUE:
+            return True
+
+        if tag == TAG.FALSE:
+            return False
+
+        if tag == TAG.FLOAT:
+            value = _FLOAT.unpack_from(self.data, self.position)[0]
+            self.position += _FLOAT.size
+            return value
+
+        if tag == TAG.LIST:
+            return [self.value() for i in range(self.varint())]
+
+        if tag == TAG.TUPLE:
+            return tuple(self.value() for i in range(self.varint()))
+
+        if tag == TAG.DICT:
+            value = {}
+
+            for i in range(self.varint()):
+                key = self.value()
+                value[key] = self.value()
+
+            return value
+
+        raise exceptions.WrongSerializedDataError(message='unknown tag %d at position %d' % (tag, self.position - 1))
+
+    def record(self, record_classes):
+        type_name = self.string()
+
+        presence_mask = self.varint()
+        default_mask = self.varint()
+
+        attributes = {}
+
+        for name, bit, attribute, classes in _layout(record_classes[type_name]):
+            if not presence_mask & bit:
+                continue
+
+            if default_mask & bit:
+                attributes[name] = attribute.default
+                continue
+
+            if classes is None:
+                attributes[name] = self.value()
+            else:
+                attributes[name] = [self.record(classes) for i in range(self.varint())]
+
+        return {'type': type_name, 'attributes': attributes}
+
+
+def encode(data, fact_classes):
+    '''
+    data - result of KnowledgeBase.serialize
+    fact_classes - {type name: fact class}, like for KnowledgeBase.deserialize
+    '''
+    encoder = _Encoder()
+
+    encoder.value(data['ns_number'])
+    encoder.varint(len(data['facts']))
+
+    for uid, fact_data in data['facts'].items():
+        encoder.string(uid)
+        encoder.record(fact_data, fact_classes)
+
+    return bytes(encoder.buffer)
+
+
+def decode(data, fact_classes):
+    '''
+    returns data for KnowledgeBase.deserialize
+    '''
+    decoder = _Decoder(data)
+
+    facts = {}
+
+    try:
+        ns_number = decoder.value()
+
+        for i in range(decoder.varint()):
+            uid = decoder.string()
+            facts[uid] = decoder.record(fact_classes)
+
+    except IndexError:
+        raise exceptions.WrongSerializedDataError(message='unexpected end of data')
+
+    return {'facts': facts,
+            'ns_number': ns_number}
@@ -8,6 +8,14 @@ from questgen.tests.transformators_tests import *
 from questgen.tests.simple_quest_tests import *
 from questgen.tests.selectors_tests import *
 from questgen.tests.quest_tests import *
+from questgen.tests.quests_base_tests import *
 from questgen.tests.records_tests import *
 from questgen.tests.actions_tests import *
 from questgen.tests.requirements_tests import *
+from questgen.tests.analysers_tests import *
+from questgen.tests.generation_tests import *
+from questgen.tests.exceptions_tests import *
+from questgen.tests.serialization_tests import *
+from questgen.tests.pool_tests import *
+from questgen.tests.benchmarks_tests import *
+from questgen.tests.instrumentation_tests import *
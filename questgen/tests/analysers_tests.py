@@ -0,0 +1,67 @@
+# coding: utf-8
+
+import random
+import unittest
+
+from questgen.knowledge_base import KnowledgeBase
+from questgen import facts
+from questgen import analysers
+from questgen.tests import worlds
+from questgen.tests.legacy import legacy_percents_collector
+
+
+class PercentsCollectorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.kb = KnowledgeBase()
+
+        self.kb += [facts.Start(uid='start', type='test', nesting=0),
+                    facts.State(uid='state_1'),
+                    facts.Start(uid='sub_start', type='test', nesting=1),
+                    facts.State(uid='sub_state_1'),
+                    facts.Finish(uid='sub_finish', start='sub_start', results={}, nesting=1),
+                    facts.Finish(uid='finish', start='start', results={}, nesting=0),
+                    facts.Jump(state_from='start', state_to='state_1'),
+                    facts.Jump(state_from='state_1', state_to='sub_start'),
+                    facts.Jump(state_from='start', state_to='sub_start'),
+                    facts.Jump(state_from='sub_start', state_to='sub_state_1'),
+                    facts.Jump(state_from='sub_state_1', state_to='sub_finish'),
+                    facts.Jump(state_from='sub_finish', state_to='finish')]
+
+    def test_percents(self):
+        percents = analysers.percents_collector(self.kb)
+
+        expected_percents = {'start': 0.0,
+                             'state_1': 0.2,
+                             'sub_start': 0.0, # percents of nested quest
+                             'sub_state_1': 0.5,
+                             'sub_finish': 1.0,
+                             'finish': 1.0}
+
+        self.assertEqual(set(percents.keys()), set(expected_percents.keys()))
+
+        for state_uid, expected_percent in expected_percents.items():
+            self.assertAlmostEqual(percents[state_uid], expected_percent)
+
+    def test_same_as_paths_enumeration(self):
+        self.assertEqual(analysers.percents_collector(self.kb), legacy_percents_collector(self.kb))
+
+    def test_diamonds(self):
+        kb = worlds.create_diamonds_graph(30)
+        self.assertEqual(analysers.percents_collector(kb), legacy_percents_collector(kb))
+
+
+def create_test_same_as_paths_enumeration_method(quest_class):
+    def test_method(self):
+        for seed in range(5):
+            kb = worlds.create_valid_quest(quest_class, quests=worlds.BASE_QUESTS, rng=random.Random(seed))
+            self.assertEqual(analysers.percents_collector(kb), legacy_percents_collector(kb))
+
+    test_method.__name__ = 'test_%s_same_as_paths_enumeration' % quest_class.TYPE
+
+    return test_method
+
+
+for Quest in worlds.QUESTS:
+    method = create_test_same_as_paths_enumeration_method(Quest)
+    setattr(PercentsCollectorTests, method.__name__, method)
@@ -0,0 +1,59 @@
+# coding: utf-8
+import io
+import os
+import json
+import contextlib
+import tempfile
+import unittest
+
+from questgen.quests.simplest import Simplest
+from questgen.benchmarks import suite
+
+
+class SuiteTests(unittest.TestCase):
+
+    def create_report(self, results):
+        return {'meta': {}, 'results': results}
+
+    def test_run(self):
+        report = suite.run(world_sizes=(20, ), quests=[Simplest], number=1)
+
+        self.assertEqual(report['meta']['skipped'], [])
+        self.assertEqual(set(report['results'].keys()),
+                         set(suite.result_key(20, Simplest.TYPE, stage)
+                             for name, stage in suite.STAGE.__dict__.items() if not name.startswith('_')))
+        self.assertTrue(all(seconds >= 0 for seconds in report['results'].values()))
+
+        json.dumps(report)
+
+    def test_compare(self):
+        rows = suite.compare(self.create_report({'a': 1.0, 'b': 1.0, 'c': 1.0}),
+                             self.create_report({'a': 1.05, 'b': 2.0, 'd': 1.0}),
+                             threshold=0.1)
+
+        self.assertEqual(rows, [('a', 1.0, 1.05, 1.05, False),
+                                ('b', 1.0, 2.0, 2.0, True),
+                                ('c', 1.0, None, None, False),
+                                ('d', None, 1.0, None, False)])
+
+    def test_main__compare_reports(self):
+        paths = []
+
+        try:
+            for results in ({'a': 1.0}, {'a': 3.0}):
+                descriptor, path = tempfile.mkstemp(suffix='.json')
+                paths.append(path)
+
+                with os.fdopen(descriptor, 'w') as report_file:
+                    json.dump(self.create_report(results), report_file)
+
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                self.assertEqual(suite.main(['--compare', paths[0], paths[0]]), 0)
+                self.assertEqual(suite.main(['--compare', paths[0], paths[1]]), 1)
+                self.assertEqual(suite.main(['--compare', paths[0], paths[1], '--threshold', '3']), 0)
+
+            self.assertEqual(output.getvalue().count('REGRESSION'), 1)
+
+        finally:
+            for path in paths:
+                os.remove(path)
@@ -0,0 +1,71 @@
+# coding: utf-8
+
+import pickle
+import unittest
+
+from questgen import facts
+from questgen import exceptions
+from questgen import restrictions
+from questgen.knowledge_base import KnowledgeBase
+
+
+class CountedRepr(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def __repr__(self):
+        self.calls += 1
+        return 'counted'
+
+
+class ExceptionsTests(unittest.TestCase):
+
+    def test_lazy_message(self):
+        argument = CountedRepr()
+
+        error = exceptions.NoJumpsAvailableError(state=argument)
+
+        self.assertEqual(argument.calls, 0)
+        self.assertEqual(str(error), 'no jumps available for state counted')
+        self.assertEqual(argument.calls, 1)
+
+    def test_arguments(self):
+        error = exceptions.NoFactSelectedError(method='new_place', arguments={'terrains': ()}, reserved=set())
+
+        self.assertEqual(error.method, 'new_place')
+        self.assertEqual(error.reserved, set())
+        self.assertEqual(error.arguments, {'method': 'new_place', 'arguments': {'terrains': ()}, 'reserved': set()})
+        self.assertRaises(AttributeError, getattr, error, 'unknown')
+
+    def test_repr(self):
+        self.assertEqual(repr(exceptions.RollBackError(message='test')), "RollBackError(message='test')")
+
+    def test_wrong_arguments(self):
+        self.assertEqual(str(exceptions.RollBackError()), 'RollBackError()')
+        self.assertEqual(str(exceptions.RollBackError(mesage='test')), "RollBackError(mesage='test')")
+        self.assertEqual(str(exceptions.GenerationBudgetExceededError(attempts_number='x', time=1)),
+                         "GenerationBudgetExceededError(attempts_number='x', time=1)")
+
+    def test_args(self):
+        self.assertEqual(exceptions.RollBackError(message='test').args, ('RollBackError',))
+
+    def test_pickle(self):
+        error = pickle.loads(pickle.dumps(exceptions.NoFactSelectedError(method='new_place', arguments={}, reserved=set(['place_1']))))
+
+        self.assertTrue(isinstance(error, exceptions.NoFactSelectedError))
+        self.assertEqual(error.args, ('NoFactSelectedError',))
+        self.assertEqual(error.method, 'new_place')
+        self.assertEqual(str(error), 'can not found fact with method "new_place" and arguments: {} — with reserve: {\'place_1\'}')
+
+    def test_restriction(self):
+        self.assertEqual(exceptions.RollBackError(message='test').restriction, None)
+
+        kb = KnowledgeBase()
+        kb += facts.Start(uid='start', type='test', nesting=0)
+
+        with self.assertRaises(restrictions.FinishStateExists.Error) as context:
+            kb.validate_consistency([restrictions.FinishStateExists()])
+
+        self.assertEqual(context.exception.restriction, restrictions.FinishStateExists)
+        self.assertEqual(pickle.loads(pickle.dumps(context.exception)).restriction, restrictions.FinishStateExists)
@@ -51,6 +51,21 @@ class FactsTests(unittest.TestCase):
                           fact_1.change, xxx='yyy')
 
 
+    def test_hash(self):
+        fact_1 = facts.LocatedIn(object='person_1', place='place_1')
+        fact_2 = facts.LocatedIn(object='person_1', place='place_1')
+        fact_3 = fact_1.change(place='place_2')
+
+        self.assertEqual(hash(fact_1), hash(fact_2))
+        self.assertEqual(set([fact_1, fact_2, fact_3]), set([fact_1, fact_3]))
+
+    def test_hash__same_uid_different_attributes(self):
+        fact_1 = facts.State(uid='state', description='1')
+        fact_2 = facts.State(uid='state', description='2')
+
+        self.assertEqual(hash(fact_1), hash(fact_2))
+        self.assertEqual(len(set([fact_1, fact_2])), 2)
+
     def test_uid_not_setupped(self):
         self.assertEqual(facts.Fact().uid, '#fact()')
 
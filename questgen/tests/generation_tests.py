@@ -0,0 +1,198 @@
+# coding: utf-8
+
+import random
+import unittest
+
+from questgen import facts
+from questgen import exceptions
+from questgen import generation
+from questgen import restrictions
+from questgen.knowledge_base import LayeredKnowledgeBase
+from questgen.selectors import Selector
+from questgen.tests import worlds
+
+
+class GenerateQuestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.world = worlds.create_world(places_number=20, persons_number=40)
+        self.qb = worlds.create_quests_base()
+
+    def generate_quest(self, **kwargs):
+        arguments = {'world': self.world,
+                     'quests_base': self.qb,
+                     'restrictions': worlds.WORLD_RESTRICTIONS + worlds.QUEST_RESTRICTIONS,
+                     'world_restrictions': worlds.WORLD_RESTRICTIONS,
+                     'seed': 0}
+        arguments.update(kwargs)
+        return generation.generate_quest(**arguments)
+
+    def test_success(self):
+        world_data = self.world.serialize()
+
+        result = self.generate_quest()
+
+        self.assertEqual(self.world.serialize(), world_data)
+
+        self.assertEqual(len([start for start in result.knowledge_base.filter(facts.Start) if start.is_external]), 1)
+        self.assertTrue(result.attempts[-1].is_successful)
+        self.assertEqual(set(result.attempts[-1].stages_times.keys()),
+                         set([generation.STAGE.CONSTRUCT, generation.STAGE.TRANSFORM, generation.STAGE.VALIDATE]))
+
+    def test_same_as_generation_on_world_copy(self):
+        for seed in range(10):
+            result = self.generate_quest(max_attempts=1, restrictions=(), seed=seed)
+
+            self.assertTrue(isinstance(result.knowledge_base, LayeredKnowledgeBase))
+
+            rng = random.Random(seed)
+
+            kb = self.world.copy()
+            kb += generation.construct_from_hero_position(kb, Selector(kb, self.qb, rng=rng))
+
+            for transformator in generation.TRANSFORMATORS:
+                if generation._accepts_rng(transformator):
+                    transformator(kb, rng=rng)
+                else:
+                    transformator(kb)
+
+            self.assertEqual(result.knowledge_base.serialize(), kb.serialize())
+
+    def test_seed(self):
+        self.addCleanup(random.setstate, random.getstate())
+
+        results = []
+
+        for global_seed in (1, 2):
+            random.seed(global_seed)
+
+            state = random.getstate()
+
+            results.append([self.generate_quest(seed=seed).knowledge_base.serialize() for seed in range(10)])
+
+            self.assertEqual(random.getstate(), state)
+
+        self.assertEqual(results[0], results[1])
+        self.assertTrue(any(data != results[0][0] for data in results[0][1:]))
+
+    def test_cache(self):
+        cache = generation.GenerationCache()
+
+        result = self.generate_quest(seed=1, cache=cache)
+
+        self.assertFalse(result.is_cached)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 1, 1))
+
+        cached_result = self.generate_quest(seed=1, cache=cache)
+
+        self.assertTrue(cached_result.is_cached)
+        self.assertEqual(cached_result.attempts, [])
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 1, 1))
+
+        self.assertEqual(cached_result.knowledge_base.serialize(), result.knowledge_base.serialize())
+        self.assertEqual(cached_result.knowledge_base.ns_number, result.knowledge_base.ns_number)
+
+        self.generate_quest(seed=2, cache=cache)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 2, 2))
+
+    def test_cache__same_world_content(self):
+        cache = generation.GenerationCache()
+
+        self.generate_quest(seed=1, cache=cache)
+
+        self.world = worlds.create_world(places_number=20, persons_number=40)
+
+        self.assertTrue(self.generate_quest(seed=1, cache=cache).is_cached)
+
+        self.world += facts.Place(uid='new_place')
+
+        self.assertFalse(self.generate_quest(seed=1, cache=cache).is_cached)
+
+    def test_cache__without_seed(self):
+        cache = generation.GenerationCache()
+
+        self.generate_quest(seed=None, cache=cache)
+        self.generate_quest(seed=None, cache=cache)
+
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 0, 0))
+
+    def test_cache__eviction(self):
+        cache = generation.GenerationCache(max_size=2)
+
+        for seed in (1, 2, 1, 3):
+            self.generate_quest(seed=seed, cache=cache)
+
+        self.assertEqual((cache.hits, cache.misses, cache.evictions, len(cache)), (1, 3, 1, 2))
+
+        # seed 2 is least recently used
+        self.assertTrue(self.generate_quest(seed=1, cache=cache).is_cached)
+        self.assertFalse(self.generate_quest(seed=2, cache=cache).is_cached)
+
+    def test_wrong_world(self):
+        self.world += facts.LocatedIn(object='person_0', place='place_2')
+
+        self.assertRaises(restrictions.SingleLocationForObject.Error, self.generate_quest)
+
+    def test_rollbacks(self):
+        calls = []
+
+        def constructor(knowledge_base, selector):
+            calls.append(selector)
+
+            if len(calls) == 1:
+                raise exceptions.NoQuestChoicesRollBackError()
+
+            if len(calls) == 2:
+                selector.new_place(candidates=('unknown_place', ))
+
+            return generation.construct_from_hero_position(knowledge_base, selector)
+
+        result = self.generate_quest(constructor=constructor)
+
+        self.assertEqual(len(result.attempts), 3)
+        self.assertEqual(len(result.rollbacks), 2)
+
+        self.assertEqual(result.attempts[0].error, exceptions.NoQuestChoicesRollBackError)
+        self.assertEqual(result.attempts[0].method, None)
+        self.assertEqual(result.attempts[0].stage, generation.STAGE.CONSTRUCT)
+
+        self.assertEqual(result.attempts[1].error, exceptions.NoFactSelectedError)
+        self.assertEqual(result.attempts[1].method, 'new_place')
+
+        self.assertTrue(result.attempts[2].is_successful)
+
+    def test_validation_rollback(self):
+        with self.assertRaises(exceptions.GenerationBudgetExceededError) as context:
+            self.generate_quest(restrictions=[restrictions.AlwaysError()], max_attempts=3)
+
+        attempts = context.exception.arguments['attempts']
+
+        self.assertEqual(len(attempts), 3)
+        self.assertTrue(all(attempt.error == restrictions.AlwaysError.Error for attempt in attempts))
+        self.assertTrue(all(attempt.stage == generation.STAGE.VALIDATE for attempt in attempts))
+        self.assertTrue(all(attempt.restriction == restrictions.AlwaysError for attempt in attempts))
+
+    def test_quests_statistics(self):
+        with self.assertRaises(exceptions.GenerationBudgetExceededError):
+            self.generate_quest(restrictions=[restrictions.AlwaysError()], max_attempts=3)
+
+        self.assertEqual(sum(self.qb.statistics(quest.TYPE).successes for quest in self.qb.quests()), 0)
+        self.assertTrue(sum(self.qb.statistics(quest.TYPE).rollbacks for quest in self.qb.quests()) >= 3)
+
+        self.qb.reset_statistics()
+
+        result = self.generate_quest()
+
+        quest_type = next(start.type for start in result.knowledge_base.filter(facts.Start) if start.is_external)
+
+        self.assertTrue(self.qb.statistics(quest_type).successes >= 1)
+        self.assertTrue(self.qb.statistics(quest_type).time > 0)
+
+    def test_time_budget(self):
+        with self.assertRaises(exceptions.GenerationBudgetExceededError) as context:
+            self.generate_quest(time_budget=0)
+
+        self.assertEqual(context.exception.arguments['attempts'], [])
+
+    def test_rollback_error_message(self):
+        self.assertEqual(str(exceptions.RollBackError(message='test')), 'something is wrong (test), do rollback')
@@ -0,0 +1,190 @@
+# coding: utf-8
+
+import random
+import unittest
+
+from questgen import facts
+from questgen import generation
+from questgen import restrictions
+from questgen import transformators
+from questgen import instrumentation
+from questgen.machine import Machine
+from questgen.knowledge_base import KnowledgeBase
+from questgen.tests import worlds
+
+
+class InstrumentationTests(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        instrumentation.register(self.events.append)
+
+    def tearDown(self):
+        if self.events.append in instrumentation._callbacks:
+            instrumentation.unregister(self.events.append)
+
+    def test_disabled(self):
+        instrumentation.unregister(self.events.append)
+
+        self.assertFalse(instrumentation.is_enabled())
+        self.assertTrue(instrumentation.stage(instrumentation.STAGE.CONSTRUCT) is instrumentation._NO_OP)
+
+        kb = KnowledgeBase()
+        kb += facts.Start(uid='start', type='test', nesting=0)
+        transformators.activate_events(kb)
+
+        self.assertEqual(self.events, [])
+
+    def test_collect(self):
+        instrumentation.unregister(self.events.append)
+
+        events = []
+
+        with instrumentation.collect(events.append):
+            self.assertTrue(instrumentation.is_enabled())
+            with instrumentation.stage(instrumentation.STAGE.CONSTRUCT, name='test'):
+                pass
+
+        self.assertFalse(instrumentation.is_enabled())
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].stage, instrumentation.STAGE.CONSTRUCT)
+        self.assertEqual(events[0].name, 'test')
+        self.assertEqual(events[0].facts_number, None)
+        self.assertEqual(events[0].error, None)
+        self.assertTrue(events[0].duration >= 0)
+
+    def test_stage__error(self):
+        kb = KnowledgeBase()
+        kb += facts.Start(uid='start', type='test', nesting=0)
+
+        with self.assertRaises(ZeroDivisionError):
+            with instrumentation.stage(instrumentation.STAGE.CONSTRUCT, name='test', knowledge_base=kb):
+                1 / 0
+
+        self.assertEqual(len(self.events), 1)
+        self.assertEqual(self.events[0].error, ZeroDivisionError)
+        self.assertEqual(self.events[0].facts_number, 1)
+
+    def test_transformator(self):
+        kb = KnowledgeBase()
+        kb += [facts.Start(uid='start', type='test', nesting=0),
+               facts.State(uid='state'),
+               facts.Jump(state_from='start', state_to='state')]
+
+        transformators.remove_broken_states(kb)
+
+        self.assertEqual(len(self.events), 1)
+        self.assertEqual(self.events[0].stage, instrumentation.STAGE.TRANSFORMATOR)
+        self.assertEqual(self.events[0].name, 'remove_broken_states')
+        self.assertEqual(self.events[0].facts_number, kb.facts_number())
+        self.assertEqual(self.events[0].error, None)
+
+    def test_restriction(self):
+        kb = KnowledgeBase()
+        kb += facts.Start(uid='start', type='test', nesting=0)
+
+        with self.assertRaises(restrictions.FinishStateExists.Error):
+            kb.validate_consistency([restrictions.SingleStartStateWithNoEnters(),
+                                     restrictions.FinishStateExists()])
+
+        self.assertEqual([(event.stage, event.name, event.error) for event in self.events],
+                         [(instrumentation.STAGE.RESTRICTION, 'SingleStartStateWithNoEnters', None),
+                          (instrumentation.STAGE.RESTRICTION, 'FinishStateExists', restrictions.FinishStateExists.Error)])
+
+    def test_generation(self):
+        aggregator = instrumentation.Aggregator()
+
+        with instrumentation.collect(aggregator):
+            result = generation.generate_quest(worlds.create_world(places_number=20, persons_number=40),
+                                               worlds.create_quests_base(),
+                                               restrictions=worlds.QUEST_RESTRICTIONS,
+                                               world_restrictions=worlds.WORLD_RESTRICTIONS,
+                                               seed=0)
+
+        self.assertTrue(aggregator.count(instrumentation.STAGE.CONSTRUCT) >= 1)
+        self.assertEqual(aggregator.count(instrumentation.STAGE.TRANSFORMATOR),
+                         len(generation.TRANSFORMATORS) * len([attempt for attempt in result.attempts
+                                                               if generation.STAGE.TRANSFORM in attempt.stages_times]))
+
+        for transformator in generation.TRANSFORMATORS:
+            self.assertTrue(aggregator.count(instrumentation.STAGE.TRANSFORMATOR, transformator.__name__) >= 1)
+
+        for restriction in worlds.WORLD_RESTRICTIONS + worlds.QUEST_RESTRICTIONS:
+            self.assertTrue(aggregator.count(instrumentation.STAGE.RESTRICTION, restriction.__class__.__name__) >= 1)
+
+        constructed = [name for stage, name in aggregator.keys() if stage == instrumentation.STAGE.CONSTRUCT and name is not None]
+        self.assertTrue(set(constructed) <= set(quest_class.TYPE for quest_class in worlds.BASE_QUESTS))
+
+    def test_machine_step(self):
+        kb = worlds.create_valid_quest(worlds.Caravan, quests=worlds.BASE_QUESTS, rng=random.Random(0))
+
+        machine = Machine(knowledge_base=kb, interpreter=worlds.Interpreter(), rng=random.Random(0))
+
+        steps = 0
+
+        while not machine.is_processed:
+            if machine.can_do_step():
+                machine.step()
+                steps += 1
+            else:
+                machine.satisfy_requirements(machine.next_state)
+
+        step_events = [event for event in self.events if event.stage == instrumentation.STAGE.MACHINE_STEP]
+
+        self.assertEqual(len(step_events), steps)
+        self.assertTrue(all(event.facts_number == kb.facts_number() for event in step_events))
+
+
+class AggregatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.aggregator = instrumentation.Aggregator()
+
+    def event(self, name, duration, error=None):
+        return instrumentation.Event(stage=instrumentation.STAGE.CONSTRUCT, name=name, duration=duration, facts_number=None, error=error)
+
+    def test_percentile(self):
+        self.assertEqual(instrumentation.percentile([], 50), None)
+        self.assertEqual(instrumentation.percentile([1], 99), 1)
+
+        values = list(range(1, 101))
+
+        self.assertEqual(instrumentation.percentile(values, 0), 1)
+        self.assertEqual(instrumentation.percentile(values, 50), 50)
+        self.assertEqual(instrumentation.percentile(values, 90), 90)
+        self.assertEqual(instrumentation.percentile(values, 99), 99)
+        self.assertEqual(instrumentation.percentile(values, 100), 100)
+
+        self.assertEqual(instrumentation.percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(instrumentation.percentile([1, 2, 3, 4], 51), 3)
+
+    def test_aggregation(self):
+        for duration in range(1, 11):
+            self.aggregator(self.event('hunt', duration))
+
+        self.aggregator(self.event('caravan', 100, error=ZeroDivisionError))
+        self.aggregator(self.event(None, 1000))
+
+        stage = instrumentation.STAGE.CONSTRUCT
+
+        self.assertEqual(self.aggregator.keys(), [(stage, None), (stage, 'caravan'), (stage, 'hunt')])
+
+        self.assertEqual(self.aggregator.count(stage), 12)
+        self.assertEqual(self.aggregator.count(stage, 'hunt'), 10)
+        self.assertEqual(self.aggregator.count(stage, 'unknown'), 0)
+
+        self.assertEqual(self.aggregator.errors(stage), 1)
+        self.assertEqual(self.aggregator.errors(stage, 'caravan'), 1)
+        self.assertEqual(self.aggregator.errors(stage, 'hunt'), 0)
+
+        self.assertEqual(self.aggregator.total(stage, 'hunt'), 55)
+        self.assertEqual(self.aggregator.total(stage), 1155)
+
+        self.assertEqual(self.aggregator.percentiles(stage, 'hunt'), {50: 5, 90: 9, 99: 10})
+        self.assertEqual(self.aggregator.percentiles(stage, 'unknown', percents=(50,)), {50: None})
+
+        self.assertEqual(len(self.aggregator.report().split('\n')), 3)
+
+        self.aggregator.clear()
+
+        self.assertEqual(self.aggregator.keys(), [])
@@ -1,12 +1,25 @@
 # coding: utf-8
 
+import os
+import sys
 import unittest
+import subprocess
 
-from questgen.knowledge_base import KnowledgeBase
-from questgen.facts import Fact, Place, Person, FACTS
+from questgen.knowledge_base import KnowledgeBase, LayeredKnowledgeBase
+from questgen.facts import Fact, Place, Person, Finish, Jump, Option, Answer, LocatedIn, FACTS
 from questgen import exceptions
 from questgen import restrictions
 
+class CountingRestriction(restrictions.Restriction):
+    DEPENDS_ON = (Person,)
+
+    def __init__(self):
+        self.calls = 0
+
+    def validate(self, knowledge_base):
+        self.calls += 1
+
+
 class KnowledgeBaseTests(unittest.TestCase):
 
     def setUp(self):
@@ -71,6 +84,21 @@ class KnowledgeBaseTests(unittest.TestCase):
         self.assertRaises(exceptions.WrongFactTypeError,
                           self.kb.__isub__, [[self.fact]])
 
+    def test_replace(self):
+        version = self.kb.version(Fact)
+
+        fact = Fact(uid='fact', description='abc')
+        self.kb.replace(fact)
+
+        self.assertIs(self.kb['fact'], fact)
+        self.assertEqual([fact.uid for fact in self.kb.facts()], ['fact_2', 'fact'])
+        self.assertEqual([fact.uid for fact in self.kb.filter(Fact)], ['fact_2', 'fact'])
+        self.assertNotEqual(self.kb.version(Fact), version)
+        self.assertEqual(self.kb.fingerprint(), KnowledgeBase.deserialize(self.kb.serialize(), FACTS).fingerprint())
+
+    def test_replace__no_fact(self):
+        self.assertRaises(exceptions.NoFactError, self.kb.replace, Fact(uid='some fact'))
+
     def test_validate_consistency__success(self):
         self.kb.validate_consistency([])
         self.kb.validate_consistency([restrictions.AlwaysSuccess()])
@@ -78,6 +106,111 @@ class KnowledgeBaseTests(unittest.TestCase):
     def test_validate_consistency__error(self):
         self.assertRaises(restrictions.AlwaysError.Error, self.kb.validate_consistency, [restrictions.AlwaysError()])
 
+    def test_validate_consistency__memoized(self):
+        restriction = CountingRestriction()
+
+        self.kb.validate_consistency([restriction])
+        self.kb.validate_consistency([restriction])
+
+        self.assertEqual(restriction.calls, 1)
+
+        self.kb += Place(uid='place_1')
+        self.kb.validate_consistency([restriction])
+
+        self.assertEqual(restriction.calls, 1)
+
+        self.kb += Person(uid='person_1')
+        self.kb.validate_consistency([restriction])
+
+        self.assertEqual(restriction.calls, 2)
+
+        self.kb -= self.kb['person_1']
+        self.kb.validate_consistency([restriction])
+
+        self.assertEqual(restriction.calls, 3)
+
+    def test_validate_consistency__memoized_per_restriction(self):
+        restriction_1 = CountingRestriction()
+        restriction_2 = CountingRestriction()
+
+        self.kb.validate_consistency([restriction_1])
+        self.kb.validate_consistency([restriction_1, restriction_2])
+
+        self.assertEqual(restriction_1.calls, 1)
+        self.assertEqual(restriction_2.calls, 1)
+
+    def test_validate_consistency__error_not_memoized(self):
+        restriction = restrictions.AlwaysError()
+        restriction.DEPENDS_ON = ()
+
+        self.assertRaises(restrictions.AlwaysError.Error, self.kb.validate_consistency, [restriction])
+        self.assertRaises(restrictions.AlwaysError.Error, self.kb.validate_consistency, [restriction])
+
+    def test_validate_consistency__default_dependencies(self):
+        restriction = CountingRestriction()
+        restriction.DEPENDS_ON = restrictions.Restriction.DEPENDS_ON
+
+        self.kb.validate_consistency([restriction])
+        self.kb += Place(uid='place_1')
+        self.kb.validate_consistency([restriction])
+
+        self.assertEqual(restriction.calls, 2)
+
+    def test_validate_consistency__shared_context(self):
+        contexts = []
+
+        class ContextRestriction(restrictions.ContextRestriction):
+            def validate_with_context(self, knowledge_base, context):
+                contexts.append(context)
+
+        self.kb.validate_consistency([ContextRestriction(), ContextRestriction()])
+
+        self.assertEqual(len(contexts), 2)
+        self.assertIs(contexts[0], contexts[1])
+        self.assertIs(contexts[0].knowledge_base, self.kb)
+
+    def test_validate_consistency__restriction_without_context(self):
+        calls = []
+
+        class KnowledgeBaseOnlyRestriction(object):
+            def validate(self, knowledge_base):
+                calls.append(knowledge_base)
+
+        restriction = KnowledgeBaseOnlyRestriction()
+
+        self.kb.validate_consistency([restriction])
+        self.kb.validate_consistency([restriction])
+
+        self.assertEqual(calls, [self.kb])
+
+        self.kb += Place(uid='place_1')
+        self.kb.validate_consistency([restriction])
+
+        self.assertEqual(calls, [self.kb, self.kb])
+
+    def test_copy(self):
+        self.kb += [Place(uid='place_1'),
+                    Place(uid='place_2'),
+                    Jump(state_from='place_1', state_to='place_2')]
+
+        self.kb.validate_consistency([restrictions.ReferencesIntegrity()])
+
+        kb = self.kb.copy()
+
+        self.assertEqual(kb.serialize(), self.kb.serialize())
+        self.assertEqual(kb.version(Place), self.kb.version(Place))
+        self.assertEqual(kb._validated, self.kb._validated)
+
+        kb += Person(uid='person_1')
+        kb -= kb['place_1']
+
+        self.assertEqual(set(fact.uid for fact in self.kb.filter(Place)), set(['place_1', 'place_2']))
+        self.assertEqual(len(self.kb.jumps_from('place_1')), 1)
+        self.assertEqual(self.kb.get('person_1'), None)
+
+        self.assertNotEqual(kb.version(Place), self.kb.version(Place))
+        self.assertEqual(kb.jumps_to('place_2'), self.kb.jumps_to('place_2'))
+
     def test_uids(self):
         self.assertEqual(self.kb.uids(),
                          set(self.kb._facts.keys()))
@@ -103,3 +236,465 @@ class KnowledgeBaseTests(unittest.TestCase):
                          set([person_1.uid, person_2.uid]))
         self.assertEqual(set(fact.uid for fact in self.kb.filter(Place)),
                          set([place_1.uid]))
+
+    def test_filter__ancestors(self):
+        jump = Jump(state_from='state_1', state_to='state_2')
+        option = Option(state_from='state_1', state_to='state_3', type='option', markers=())
+        answer = Answer(state_from='state_2', state_to='state_3', condition=True)
+
+        self.kb += [jump, option, answer]
+
+        self.assertEqual(set(fact.uid for fact in self.kb.filter(Jump)),
+                         set([jump.uid, option.uid, answer.uid]))
+        self.assertEqual([fact.uid for fact in self.kb.filter(Option)], [option.uid])
+        self.assertEqual([fact.uid for fact in self.kb.filter(Answer)], [answer.uid])
+
+    def test_filter__tuple(self):
+        person = Person(uid='person_1')
+        place = Place(uid='place_1')
+
+        self.kb += [person, place]
+
+        self.assertEqual(set(fact.uid for fact in self.kb.filter((Person, Place))),
+                         set([person.uid, place.uid]))
+        self.assertEqual(set(fact.uid for fact in self.kb.filter((Person, Fact))),
+                         set([self.fact.uid, self.fact_2.uid, person.uid, place.uid]))
+
+    def test_filter__after_remove(self):
+        person_1 = Person(uid='person_1')
+        person_2 = Person(uid='person_2')
+
+        self.kb += [person_1, person_2]
+
+        self.kb -= person_1
+        del self.kb[person_2.uid]
+
+        self.assertEqual(list(self.kb.filter(Person)), [])
+        self.assertEqual(set(fact.uid for fact in self.kb.filter(Fact)),
+                         set([self.fact.uid, self.fact_2.uid]))
+
+    def test_filter__change_while_iterating(self):
+        self.kb += [Person(uid='person_1'), Person(uid='person_2')]
+
+        for person in self.kb.filter(Person):
+            self.kb -= person
+            self.kb += Place(uid=person.uid.replace('person', 'place'))
+
+        self.assertEqual(list(self.kb.filter(Person)), [])
+        self.assertEqual(set(fact.uid for fact in self.kb.filter(Place)),
+                         set(['place_1', 'place_2']))
+
+    def test_jumps_from_and_to(self):
+        jump_1 = Jump(state_from='state_1', state_to='state_2')
+        jump_2 = Jump(state_from='state_1', state_to='state_3')
+        answer = Answer(state_from='state_2', state_to='state_3', condition=True)
+
+        self.kb += [jump_1, jump_2, answer]
+
+        self.assertEqual(self.kb.jumps_from('state_1'), [jump_1, jump_2])
+        self.assertEqual(self.kb.jumps_from('state_2'), [answer])
+        self.assertEqual(self.kb.jumps_from('state_3'), [])
+
+        self.assertEqual(self.kb.jumps_to('state_1'), [])
+        self.assertEqual(self.kb.jumps_to('state_2'), [jump_1])
+        self.assertEqual(self.kb.jumps_to('state_3'), [jump_2, answer])
+
+    def test_jumps_from_and_to__after_remove(self):
+        jump_1 = Jump(state_from='state_1', state_to='state_2')
+        jump_2 = Jump(state_from='state_1', state_to='state_3')
+
+        self.kb += [jump_1, jump_2]
+
+        self.kb -= jump_1
+
+        self.assertEqual(self.kb.jumps_from('state_1'), [jump_2])
+        self.assertEqual(self.kb.jumps_to('state_2'), [])
+
+        del self.kb[jump_2.uid]
+
+        self.assertEqual(self.kb.jumps_from('state_1'), [])
+        self.assertEqual(self.kb.jumps_to('state_3'), [])
+        self.assertEqual(self.kb._jumps_from, {})
+        self.assertEqual(self.kb._jumps_to, {})
+
+    def test_version(self):
+        self.assertEqual(self.kb.version(Person), 0)
+
+        fact_version = self.kb.version(Fact)
+
+        person = Person(uid='person_1')
+        self.kb += person
+
+        person_version = self.kb.version(Person)
+
+        self.assertNotEqual(person_version, 0)
+        self.assertNotEqual(self.kb.version(Fact), fact_version)
+        self.assertEqual(self.kb.version(Place), 0)
+
+        self.kb += Place(uid='place_1')
+
+        self.assertEqual(self.kb.version(Person), person_version)
+
+        self.kb -= person
+
+        self.assertNotEqual(self.kb.version(Person), person_version)
+
+
+class SavepointsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.kb = KnowledgeBase()
+
+        self.kb += [Place(uid='place_1'),
+                    Place(uid='place_2'),
+                    Person(uid='person_1'),
+                    Jump(state_from='place_1', state_to='place_2')]
+
+    def check_state(self, data, versions):
+        self.assertEqual(self.kb.serialize(), data)
+        self.assertEqual([self.kb.version(fact_type) for fact_type in (Fact, Place, Person, Jump)], versions)
+
+    def get_state(self):
+        return self.kb.serialize(), [self.kb.version(fact_type) for fact_type in (Fact, Place, Person, Jump)]
+
+    def change(self):
+        self.kb += [Person(uid='person_2'),
+                    Jump(state_from='place_2', state_to='place_1')]
+        self.kb -= self.kb['place_1']
+        del self.kb['person_1']
+        self.kb += Person(uid='person_1')
+        self.kb.replace(Place(uid='place_2', terrains=(1,)))
+        self.kb.get_next_ns()
+
+    def test_rollback(self):
+        state = self.get_state()
+        jumps = self.kb.jumps_from('place_1')
+
+        savepoint = self.kb.savepoint()
+
+        self.change()
+
+        self.kb.rollback(savepoint)
+
+        self.check_state(*state)
+        self.assertEqual(self.kb.jumps_from('place_1'), jumps)
+        self.assertEqual(self.kb.jumps_from('place_2'), [])
+        self.assertEqual(self.kb.ns_number, 0)
+
+    def test_rollback__multiple_times(self):
+        state = self.get_state()
+
+        savepoint = self.kb.savepoint()
+
+        for i in range(3):
+            self.change()
+            self.kb.rollback(savepoint)
+            self.check_state(*state)
+
+    def test_rollback__nested_savepoints(self):
+        state = self.get_state()
+        savepoint_1 = self.kb.savepoint()
+
+        self.kb += Place(uid='place_3')
+
+        state_2 = self.get_state()
+        savepoint_2 = self.kb.savepoint()
+
+        self.change()
+
+        self.kb.rollback(savepoint_2)
+        self.check_state(*state_2)
+
+        self.kb.rollback(savepoint_1)
+        self.check_state(*state)
+
+        self.assertRaises(exceptions.WrongSavepointError, self.kb.rollback, savepoint_2)
+
+    def test_rollback__after_commit(self):
+        savepoint = self.kb.savepoint()
+
+        self.change()
+
+        data = self.kb.serialize()
+
+        self.kb.commit()
+
+        self.assertRaises(exceptions.WrongSavepointError, self.kb.rollback, savepoint)
+        self.assertEqual(self.kb.serialize(), data)
+        self.assertEqual(self.kb._undo_log, None)
+
+    def test_rollback__validation_results(self):
+        restriction = restrictions.SingleLocationForObject()
+
+        self.kb.validate_consistency([restriction])
+
+        validated = dict(self.kb._validated)
+
+        savepoint = self.kb.savepoint()
+
+        self.kb += LocatedIn(object='person_1', place='place_1')
+        self.kb.validate_consistency([restriction])
+
+        self.kb.rollback(savepoint)
+
+        self.assertEqual(self.kb._validated, validated)
+
+    def test_no_logging_without_savepoints(self):
+        self.change()
+        self.assertEqual(self.kb._undo_log, None)
+
+    def test_layered_knowledge_base(self):
+        world = self.kb
+        world_data = world.serialize()
+
+        self.kb = LayeredKnowledgeBase(world)
+
+        state = self.get_state()
+        facts_order = [fact.uid for fact in self.kb.facts()]
+
+        savepoint = self.kb.savepoint()
+
+        self.change()
+        del self.kb['person_1']
+        del self.kb['place_2']
+
+        self.kb.rollback(savepoint)
+
+        self.check_state(*state)
+        self.assertEqual([fact.uid for fact in self.kb.facts()], facts_order)
+        self.assertEqual(self.kb._removed, set())
+        self.assertEqual(self.kb._facts, {})
+        self.assertEqual(world.serialize(), world_data)
+
+
+class LayeredKnowledgeBaseTests(unittest.TestCase):
+
+    def setUp(self):
+        self.world = KnowledgeBase()
+
+        self.world += [Place(uid='place_1'),
+                       Place(uid='place_2'),
+                       Person(uid='person_1'),
+                       Jump(state_from='place_1', state_to='place_2')]
+
+        self.world_data = self.world.serialize()
+
+        self.kb = LayeredKnowledgeBase(self.world)
+
+        self.kb += [Person(uid='person_2'),
+                    Jump(state_from='place_2', state_to='place_1')]
+
+    def tearDown(self):
+        self.assertEqual(self.world.serialize(), self.world_data)
+
+    def create_flat_knowledge_base(self):
+        return KnowledgeBase.deserialize(self.kb.serialize(), FACTS)
+
+    def test_lookups(self):
+        self.assertTrue('place_1' in self.kb)
+        self.assertTrue('person_2' in self.kb)
+        self.assertFalse('person_2' in self.world)
+
+        self.assertEqual(self.kb['place_1'].uid, 'place_1')
+        self.assertEqual(self.kb.get('person_2').uid, 'person_2')
+        self.assertEqual(self.kb.get('wrong uid'), None)
+        self.assertRaises(exceptions.NoFactError, self.kb.__getitem__, 'wrong uid')
+
+    def test_same_as_flat_knowledge_base(self):
+        flat_kb = self.create_flat_knowledge_base()
+
+        self.assertEqual(self.kb.uids(), flat_kb.uids())
+        self.assertEqual([fact.uid for fact in self.kb.facts()], [fact.uid for fact in flat_kb.facts()])
+        self.assertEqual([fact.uid for fact in self.kb.filter(Person)], ['person_1', 'person_2'])
+        self.assertEqual([fact.uid for fact in self.kb.filter((Place, Person))], [fact.uid for fact in flat_kb.filter((Place, Person))])
+        self.assertEqual([jump.uid for jump in self.kb.jumps_from('place_1')], [jump.uid for jump in flat_kb.jumps_from('place_1')])
+        self.assertEqual([jump.uid for jump in self.kb.jumps_to('place_1')], [jump.uid for jump in flat_kb.jumps_to('place_1')])
+
+    def test_add__duplicate_world_fact(self):
+        self.assertRaises(exceptions.DuplicatedFactError, self.kb.__iadd__, Place(uid='place_1'))
+
+    def test_remove__world_fact(self):
+        jump = self.world.jumps_from('place_1')[0]
+
+        self.kb -= self.kb['person_1']
+        del self.kb[jump.uid]
+
+        self.assertFalse('person_1' in self.kb)
+        self.assertTrue('person_1' in self.world)
+        self.assertEqual([fact.uid for fact in self.kb.filter(Person)], ['person_2'])
+        self.assertEqual(self.kb.jumps_from('place_1'), [])
+        self.assertEqual(self.kb.jumps_to('place_2'), [])
+        self.assertFalse(jump.uid in self.kb.uids())
+        self.assertFalse('person_1' in self.kb.serialize()['facts'])
+
+        self.assertRaises(exceptions.NoFactError, self.kb.__delitem__, 'person_1')
+
+    def test_replace__world_fact(self):
+        self.kb.replace(Place(uid='place_1', terrains=(1,)))
+
+        self.assertEqual(self.kb['place_1'].terrains, (1,))
+        self.assertEqual(self.world['place_1'].terrains, None)
+        self.assertEqual(self.kb.serialize(), self.create_flat_knowledge_base().serialize())
+
+    def test_remove__overlay_fact(self):
+        self.kb -= self.kb['person_2']
+
+        self.assertFalse('person_2' in self.kb)
+        self.assertEqual([fact.uid for fact in self.kb.filter(Person)], ['person_1'])
+
+    def test_readd_removed_world_fact(self):
+        del self.kb['person_1']
+        self.kb += Person(uid='person_1')
+
+        self.assertEqual([fact.uid for fact in self.kb.filter(Person)], ['person_2', 'person_1'])
+
+        del self.kb['person_1']
+
+        self.assertFalse('person_1' in self.kb)
+
+    def test_version(self):
+        self.assertEqual(self.kb.version(Place), self.world.version(Place))
+        self.assertNotEqual(self.kb.version(Person), self.world.version(Person))
+
+        place_version = self.kb.version(Place)
+
+        del self.kb['place_2']
+
+        self.assertNotEqual(self.kb.version(Place), place_version)
+        self.assertEqual(self.world.version(Place), place_version)
+
+    def test_validation_results_of_world(self):
+        restriction = restrictions.SingleLocationForObject()
+
+        self.world.validate_consistency([restriction])
+
+        kb = LayeredKnowledgeBase(self.world)
+
+        self.assertEqual(kb._validated, self.world._validated)
+
+    def test_copy(self):
+        del self.kb['person_1']
+
+        kb = self.kb.copy()
+
+        self.assertIs(kb.world, self.world)
+
+        del kb['place_1']
+        kb += Person(uid='person_3')
+
+        self.assertTrue('place_1' in self.kb)
+        self.assertFalse('person_3' in self.kb)
+        self.assertFalse('person_1' in kb)
+
+    def test_nested_layers(self):
+        del self.kb['person_1']
+
+        kb = LayeredKnowledgeBase(self.kb)
+        kb += Place(uid='place_3')
+
+        self.assertEqual(kb.uids(), self.kb.uids() | set(['place_3']))
+        self.assertFalse('person_1' in kb)
+
+    def test_serialize(self):
+        self.assertEqual(self.kb.serialize(), self.create_flat_knowledge_base().serialize())
+        self.assertEqual(set(self.kb.serialize()['facts'].keys()), self.kb.uids())
+
+    def test_changes(self):
+        del self.kb['place_1']
+
+        added, removed = self.kb.changes()
+
+        self.assertEqual([fact.uid for fact in added], ['person_2', Jump(state_from='place_2', state_to='place_1').uid])
+        self.assertEqual([fact.uid for fact in removed], ['place_1'])
+
+    def test_fingerprint(self):
+        self.assertEqual(self.kb.fingerprint(), self.create_flat_knowledge_base().fingerprint())
+
+        del self.kb['place_1']
+        del self.kb['person_2']
+        self.kb += Place(uid='place_3')
+
+        self.assertEqual(self.kb.fingerprint(), self.create_flat_knowledge_base().fingerprint())
+
+
+class FingerprintTests(unittest.TestCase):
+
+    def setUp(self):
+        self.kb = KnowledgeBase()
+        self.kb += [Place(uid='place_1'),
+                    Person(uid='person_1'),
+                    LocatedIn(object='person_1', place='place_1')]
+
+    def create_knowledge_base(self, facts):
+        kb = KnowledgeBase()
+        kb += facts
+        return kb
+
+    def test_order_independent(self):
+        kb = self.create_knowledge_base(list(reversed(list(self.kb.facts()))))
+        self.assertEqual(kb.fingerprint(), self.kb.fingerprint())
+
+    def test_content(self):
+        kb = self.create_knowledge_base([Place(uid='place_1', terrains=(1,)),
+                                         Person(uid='person_1'),
+                                         LocatedIn(object='person_1', place='place_1')])
+
+        self.assertNotEqual(kb.fingerprint(), self.kb.fingerprint())
+
+    def test_empty(self):
+        self.assertEqual(KnowledgeBase().fingerprint(), '0' * 32)
+
+    def test_dict_order(self):
+        finish_1 = Finish(uid='finish', start='start', nesting=0, results={'a': 1, 'b': {'c': 2, 'd': 3}})
+        finish_2 = Finish(uid='finish', start='start', nesting=0, results={'b': {'d': 3, 'c': 2}, 'a': 1})
+
+        self.assertEqual(finish_1, finish_2)
+        self.assertEqual(self.create_knowledge_base([finish_1]).fingerprint(),
+                         self.create_knowledge_base([finish_2]).fingerprint())
+
+    def test_hash_seed(self):
+        code = ('from questgen.knowledge_base import KnowledgeBase\n'
+                'from questgen.facts import Place\n'
+                'kb = KnowledgeBase()\n'
+                'kb += Place(uid="place_1", terrains=frozenset("terrain_%d" % i for i in range(20)))\n'
+                'print(kb.fingerprint())')
+
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+        fingerprints = set()
+
+        for seed in ('1', '2', '3'):
+            environment = dict(os.environ, PYTHONHASHSEED=seed)
+            fingerprints.add(subprocess.check_output([sys.executable, '-c', code], cwd=root, env=environment).strip())
+
+        self.assertEqual(len(fingerprints), 1)
+
+    def test_incremental(self):
+        fingerprint = self.kb.fingerprint()
+
+        self.kb += Place(uid='place_2')
+        self.assertEqual(self.kb.fingerprint(), self.create_knowledge_base(list(self.kb.facts())).fingerprint())
+
+        del self.kb['place_2']
+        self.assertEqual(self.kb.fingerprint(), fingerprint)
+
+    def test_copy(self):
+        fingerprint = self.kb.fingerprint()
+
+        kb = self.kb.copy()
+        kb += Place(uid='place_2')
+
+        self.assertEqual(self.kb.fingerprint(), fingerprint)
+        self.assertNotEqual(kb.fingerprint(), fingerprint)
+
+    def test_rollback(self):
+        fingerprint = self.kb.fingerprint()
+
+        savepoint = self.kb.savepoint()
+
+        self.kb += Place(uid='place_2')
+        del self.kb['person_1']
+
+        self.kb.rollback(savepoint)
+
+        self.assertEqual(self.kb.fingerprint(), fingerprint)
@@ -0,0 +1,290 @@
+# coding: utf-8
+'''
+reference implementations, replaced by faster ones
+
+tests check, that new implementations give the same results, benchmarks compare their cost
+'''
+from questgen import facts
+from questgen import exceptions
+from questgen.machine import Machine
+from questgen.selectors import Selector
+from questgen.quests.quests_base import QuestsBase
+
+
+def legacy_percents_collector(knowledge_base):
+
+    states_to_percents = {}
+
+    for start in knowledge_base.filter(facts.Start):
+        states_to_longest_path = {}
+        processed_states = {}
+
+        _legacy_persents_collector(knowledge_base=knowledge_base,
+                                   path=[start],
+                                   internal_quests=-1,
+                                   states_to_longest_path=states_to_longest_path,
+                                   processed_states=processed_states)
+
+        longest_path = max(states_to_longest_path.values())
+
+        for state_uid, is_internal in processed_states.items():
+            if not is_internal:
+                states_to_percents[state_uid] = 1.0 - float(states_to_longest_path[state_uid]) / longest_path
+
+    return states_to_percents
+
+
+def _legacy_update_longest_paths(path, paths, delta):
+    for i, state in enumerate(reversed(path)):
+        if state.uid not in paths or paths[state.uid] < i + delta:
+            paths[state.uid] = i + delta
+
+
+def _legacy_persents_collector(knowledge_base, path, internal_quests, states_to_longest_path, processed_states):
+
+    if isinstance(path[-1], facts.Finish):
+        if not internal_quests:
+            _legacy_update_longest_paths(path, states_to_longest_path, 0)
+            processed_states[path[-1].uid] = internal_quests
+            return
+        internal_quests -= 1
+
+    elif isinstance(path[-1], facts.Start):
+        internal_quests += 1
+
+    for jump in (jump for jump in knowledge_base.filter(facts.Jump) if jump.state_from == path[-1].uid):
+        if jump.state_from in processed_states:
+            _legacy_update_longest_paths(path, states_to_longest_path, states_to_longest_path[jump.state_from])
+            continue
+
+        path.append(knowledge_base[jump.state_to])
+        _legacy_persents_collector(knowledge_base, path, internal_quests, states_to_longest_path, processed_states)
+        path.pop()
+
+    processed_states[path[-1].uid] = internal_quests
+
+
+def legacy_remove_broken_states(knowledge_base):
+
+    knowledge_base -= list(knowledge_base.filter(facts.FakeFinish))
+
+    while True:
+        states_to_remove = set()
+
+        for state in knowledge_base.filter(facts.State):
+            if isinstance(state, facts.Start) and state.is_external:
+                pass
+
+            elif not knowledge_base.jumps_to(state.uid):
+                states_to_remove.add(state)
+
+            elif isinstance(state, facts.Finish) and state.is_external:
+                pass
+
+            elif isinstance(state, facts.Question):
+                answers = [answer for answer in knowledge_base.jumps_from(state.uid) if isinstance(answer, facts.Answer)]
+
+                if len(answers) == 2:
+                    if ( (answers[0].condition and not answers[1].condition) or
+                         (not answers[0].condition and answers[1].condition) ):
+                        continue
+
+                states_to_remove.add(state)
+
+            elif not knowledge_base.jumps_from(state.uid):
+                states_to_remove.add(state)
+
+        knowledge_base -= states_to_remove
+
+        jumps_to_remove = set()
+
+        for jump in knowledge_base.filter(facts.Jump):
+            if jump.state_from in knowledge_base and jump.state_to in knowledge_base:
+                continue
+
+            jumps_to_remove.add(jump)
+
+            if isinstance(jump, facts.Option):
+                links = [l for l in knowledge_base.filter(facts.OptionsLink) if jump.uid in l.options]
+                if links:
+                    for link in links:
+                        for option_uid in link.options:
+                            jumps_to_remove.add(knowledge_base[option_uid])
+
+        knowledge_base -= jumps_to_remove
+
+        if not states_to_remove and not jumps_to_remove:
+            break
+
+
+class LegacyMachine(Machine):
+    '''
+    machine, which removes and adds Pointer fact on every step
+    '''
+
+    __slots__ = ()
+
+    @property
+    def pointer(self):
+        if self.POINTER_UID not in self.knowledge_base:
+            self.knowledge_base += facts.Pointer()
+        return self.knowledge_base[self.POINTER_UID]
+
+    def step(self):
+        next_state = self.next_state
+
+        if next_state:
+            new_pointer = self.pointer.change(state=next_state.uid, jump=None)
+
+            if self.pointer.jump is not None:
+                next_jump = self.knowledge_base[self.pointer.jump]
+                self.interpreter.on_jump_end__before_actions(jump=next_jump)
+                self.do_actions(next_jump.end_actions)
+                self.interpreter.on_jump_end__after_actions(jump=next_jump)
+
+            self.interpreter.on_state__before_actions(state=next_state)
+            self.do_actions(next_state.actions)
+            self.interpreter.on_state__after_actions(state=next_state)
+        else:
+            if not self._has_jumps(self.current_state):
+                raise exceptions.NoJumpsFromLastStateError(state=self.current_state)
+
+            next_jump = self.get_next_jump(self.current_state)
+
+            new_pointer = self.pointer.change(jump=next_jump.uid if next_jump else None)
+
+            if next_jump is not None:
+                self.interpreter.on_jump_start__before_actions(jump=next_jump)
+                self.do_actions(next_jump.start_actions)
+                self.interpreter.on_jump_start__after_actions(jump=next_jump)
+
+        self.knowledge_base -= self.pointer
+        self.knowledge_base += new_pointer
+
+
+class LegacySelector(Selector):
+    __slots__ = ()
+
+    def new_place(self, candidates=None, terrains=None, types=None):
+        places = (place for place in self._kb.filter(facts.Place) if place.uid not in self._reserved)
+
+        if types is not None:
+            places = (place for place in places if place.type in types)
+
+        if candidates is not None:
+            places = (place for place in places if place.uid in candidates)
+
+        if terrains:
+            terrains = set(terrains)
+            places = (place for place in places if set(place.terrains) & terrains)
+
+        places = list(places)
+
+        if not places:
+            raise exceptions.NoFactSelectedError(method='new_place',
+                                                 arguments={'terrains': terrains,
+                                                            'types': types,
+                                                            'candidates': candidates},
+                                                 reserved=self._reserved)
+
+        place = self.rng.choice(places)
+        self._reserved.add(place.uid)
+
+        return place
+
+    def check_social_connections(self, person, connected_person_uid, social_connection_type):
+        return any(fact.person_from == person.uid and fact.person_to == connected_person_uid and fact.type == social_connection_type
+                   for fact in self._kb.filter(facts.SocialConnection))
+
+    def new_person(self,
+                   first_initiator=False,
+                   candidates=None,
+                   professions=None,
+                   places=None,
+                   restrict_places=True,
+                   restrict_persons=True,
+                   restrict_social_connections=(),
+                   social_connections=()):
+        locations = self._locations(places=places, restrict_places=restrict_places, restrict_objects=restrict_persons)
+
+        persons = (self._kb[location.object] for location in locations if isinstance(self._kb[location.object], facts.Person))
+
+        for connected_person_uid, social_connection_type in restrict_social_connections:
+            persons = (person for person in persons
+                       if not self.check_social_connections(person, connected_person_uid, social_connection_type))
+
+        social_filter_applied = False
+
+        if social_connections:
+            probability = self._social_connection_probability * len(set(connected_person_uid for connected_person_uid, social_connection_type in social_connections))
+            if self.rng.random() < probability:
+                social_filter_applied = True
+                persons = (person for person in persons
+                           if any(self.check_social_connections(person, connected_person_uid, social_connection_type)
+                                  for connected_person_uid, social_connection_type in social_connections))
+
+        if professions is not None:
+            persons = (person for person in persons if person.profession in professions)
+
+        if candidates is not None:
+            persons = (person for person in persons if person.uid in candidates)
+
+        if first_initiator:
+            not_initiators = set(restriction.person for restriction in self._kb.filter(facts.NotFirstInitiator))
+            persons = (person for person in persons if person.uid not in not_initiators)
+
+        persons = list(persons)
+
+        if not persons:
+            if social_filter_applied:
+                return self.new_person(first_initiator=first_initiator,
+                                       candidates=candidates,
+                                       professions=professions,
+                                       places=places,
+                                       restrict_places=restrict_places,
+                                       restrict_persons=restrict_persons,
+                                       restrict_social_connections=restrict_social_connections,
+                                       social_connections=())
+            else:
+                raise exceptions.NoFactSelectedError(method='new_person',
+                                                     arguments={'first_initiator': first_initiator,
+                                                                'candidates': candidates,
+                                                                'professions': professions,
+                                                                'places': places,
+                                                                'restrict_places': restrict_places,
+                                                                'restrict_persons': restrict_persons},
+                                                     reserved=self._reserved)
+
+        person = self.rng.choice(persons)
+        self._reserved.add(person.uid)
+
+        return person
+
+
+class LegacyQuestsBase(QuestsBase):
+
+    def _available_quests(self, excluded=None, allowed=None, tags=None):
+        quests = iter(self._quests.values())
+
+        if excluded is not None:
+            quests = (quest for quest in quests if quest.TYPE not in excluded)
+
+        if allowed is not None:
+            quests = (quest for quest in quests if quest.TYPE in allowed)
+
+        if tags is not None:
+            for tag in tags:
+                quests = (quest for quest in quests if tag in quest.TAGS)
+
+        return quests
+
+    def _choose(self, method_name, excluded, allowed, tags, rng):
+        choices = [quest for quest in self._available_quests(excluded=excluded, allowed=allowed, tags=tags)
+                   if hasattr(quest, method_name)]
+
+        if not choices:
+            raise exceptions.NoQuestChoicesRollBackError()
+
+        quest_class = rng.choice(choices)
+
+        return quest_class
@@ -1,15 +1,18 @@
 # coding: utf-8
 
+import random
 import unittest
 
 from unittest import mock
 
 from questgen.knowledge_base import KnowledgeBase
-from questgen.machine import Machine
+from questgen.machine import Machine, CompiledQuest, MachinePool, STEP_RESULT
 from questgen import exceptions
 from questgen import facts
 from questgen import requirements
 from questgen.tests.helpers import FakeInterpreter
+from questgen.tests import worlds
+from questgen.tests.legacy import LegacyMachine
 
 
 class MachineTests(unittest.TestCase):
@@ -33,6 +36,75 @@ class MachineTests(unittest.TestCase):
         pointer = self.machine.pointer
         self.assertEqual(list(self.kb.filter(facts.Pointer)), [pointer])
 
+    def test_pointer__replaced_on_step(self):
+        jump_1 = facts.Jump(state_from=self.start.uid, state_to=self.state_1.uid)
+        self.kb += jump_1
+
+        pointer = self.machine.pointer
+
+        copy = self.kb.copy()
+        version = self.kb.version(facts.Pointer)
+
+        self.machine.step()
+        self.machine.step()
+
+        self.assertEqual(self.kb[self.machine.POINTER_UID], facts.Pointer(state=self.start.uid, jump=jump_1.uid))
+        self.assertIs(self.machine.pointer, self.kb[self.machine.POINTER_UID])
+        self.assertNotEqual(self.kb.version(facts.Pointer), version)
+
+        # facts are never changed
+        self.assertEqual(pointer, facts.Pointer())
+        self.assertEqual(copy[self.machine.POINTER_UID], facts.Pointer())
+
+        expected_kb = KnowledgeBase()
+        expected_kb += [self.start, self.state_1, self.state_2, self.finish_1, self.hero, jump_1,
+                        facts.Pointer(state=self.start.uid, jump=jump_1.uid)]
+
+        self.assertEqual(self.kb.fingerprint(), expected_kb.fingerprint())
+
+        machine = Machine(knowledge_base=self.kb, interpreter=FakeInterpreter())
+        self.assertEqual(machine.pointer, facts.Pointer(state=self.start.uid, jump=jump_1.uid))
+
+    def test_pointer__rollback(self):
+        jump_1 = facts.Jump(state_from=self.start.uid, state_to=self.state_1.uid)
+        self.kb += jump_1
+
+        self.machine.pointer
+
+        savepoint = self.kb.savepoint()
+
+        self.machine.step()
+        self.machine.step()
+
+        self.kb.rollback(savepoint)
+
+        self.assertEqual(self.kb[self.machine.POINTER_UID], facts.Pointer())
+        self.assertEqual(self.machine.pointer, facts.Pointer())
+
+    def test_pointer__same_serialization(self):
+        data = worlds.create_valid_quest(worlds.Caravan, quests=worlds.BASE_QUESTS, rng=random.Random(0)).serialize()
+
+        legacy_kb = KnowledgeBase.deserialize(data, facts.FACTS)
+        worlds.run_machine(LegacyMachine(knowledge_base=legacy_kb, interpreter=worlds.Interpreter(), rng=random.Random(0)))
+
+        kb = KnowledgeBase.deserialize(data, facts.FACTS)
+        worlds.run_machine(Machine(knowledge_base=kb, interpreter=worlds.Interpreter(), rng=random.Random(0)))
+
+        self.assertEqual(kb.serialize(), legacy_kb.serialize())
+
+    def test_pointer__replaced_in_knowledge_base(self):
+        jump_1 = facts.Jump(state_from=self.start.uid, state_to=self.state_1.uid)
+        self.kb += jump_1
+
+        pointer = self.machine.pointer
+        self.kb -= pointer
+        self.kb += pointer.change(state=self.start.uid, jump=jump_1.uid)
+
+        self.machine.step()
+
+        self.assertEqual(self.machine.pointer.state, self.state_1.uid)
+        self.assertEqual(self.machine.pointer.jump, None)
+
     def test_get_available_jumps__no_jumps(self):
         self.assertEqual(self.machine.get_available_jumps(self.start), [])
 
@@ -86,6 +158,18 @@ class MachineTests(unittest.TestCase):
 
         self.assertEqual(jumps, set([jump_1.uid, jump_2.uid]))
 
+    def test_get_next_jump__rng(self):
+        self.kb += [facts.Jump(state_from=self.start.uid, state_to=self.state_1.uid),
+                    facts.Jump(state_from=self.start.uid, state_to=self.state_2.uid)]
+
+        jumps = []
+
+        for i in range(2):
+            machine = Machine(knowledge_base=self.kb, interpreter=FakeInterpreter(), rng=random.Random(0))
+            jumps.append([machine.get_next_jump(self.start, single=False).uid for j in range(20)])
+
+        self.assertEqual(jumps[0], jumps[1])
+
     def test_get_next_jump__require_one_jump__exception(self):
         jump_1 = facts.Jump(state_from=self.start.uid, state_to=self.state_1.uid)
         jump_2 = facts.Jump(state_from=self.start.uid, state_to=self.state_2.uid)
@@ -477,3 +561,233 @@ class MachineTests(unittest.TestCase):
 
         self.assertEqual(step.call_args_list, [])
         self.assertEqual(satisfy_requirements.call_args_list, [mock.call('next-state')])
+
+
+
+class CompiledQuestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.kb = KnowledgeBase()
+
+        self.start = facts.Start(uid='start', type='test', nesting=0)
+        self.choice = facts.Choice(uid='choice')
+        self.question = facts.Question(uid='question', condition=[requirements.IsAlive(object='hero')])
+        self.finish_1 = facts.Finish(start='start', uid='finish_1', results={}, nesting=0)
+        self.finish_2 = facts.Finish(start='start', uid='finish_2', results={}, nesting=0)
+
+        self.jump = facts.Jump(state_from=self.start.uid, state_to=self.choice.uid)
+        self.option_1 = facts.Option(state_from=self.choice.uid, state_to=self.question.uid, type='opt_1', markers=())
+        self.option_2 = facts.Option(state_from=self.choice.uid, state_to=self.finish_2.uid, type='opt_2', markers=())
+        self.answer_1 = facts.Answer(state_from=self.question.uid, state_to=self.finish_1.uid, condition=True)
+        self.answer_2 = facts.Answer(state_from=self.question.uid, state_to=self.finish_2.uid, condition=False)
+
+        self.path = facts.ChoicePath(choice=self.choice.uid, option=self.option_1.uid, default=True)
+
+        self.kb += [self.start, self.choice, self.question, self.finish_1, self.finish_2,
+                    self.jump, self.option_1, self.option_2, self.answer_1, self.answer_2,
+                    self.path]
+
+        self.compiled_quest = CompiledQuest(self.kb)
+
+    def test_states(self):
+        self.assertEqual(set(self.compiled_quest.states), set([self.start, self.choice, self.question, self.finish_1, self.finish_2]))
+
+        for state in self.compiled_quest.states:
+            self.assertEqual(self.compiled_quest.state(state.uid), state)
+
+    def test_start_state(self):
+        self.assertEqual(self.compiled_quest.start_state, self.start)
+
+    def test_start_state__no_start(self):
+        self.kb -= self.jump
+        self.kb -= self.start
+
+        self.assertRaises(StopIteration, Machine(knowledge_base=self.kb, interpreter=FakeInterpreter()).get_start_state)
+        self.assertRaises(StopIteration, CompiledQuest, self.kb)
+
+    def test_state_jumps(self):
+        self.assertEqual(self.compiled_quest.state_jumps(self.start), (self.jump,))
+        self.assertEqual(self.compiled_quest.state_jumps(self.choice), (self.option_1, self.option_2))
+        self.assertEqual(self.compiled_quest.state_jumps(self.finish_1), ())
+
+    def test_jump_target(self):
+        self.assertEqual(self.compiled_quest.jump_target(self.option_2.uid), self.finish_2)
+
+    def test_state_answers(self):
+        self.assertEqual(self.compiled_quest.state_answers(self.question, True), (self.answer_1,))
+        self.assertEqual(self.compiled_quest.state_answers(self.question, False), (self.answer_2,))
+
+    def test_choice_options(self):
+        self.assertEqual(self.compiled_quest.choice_options(self.kb, self.choice), [self.option_1])
+
+    def test_choice_options__choice_changed(self):
+        self.compiled_quest.choice_options(self.kb, self.choice)
+
+        self.kb -= self.path
+        self.kb += facts.ChoicePath(choice=self.choice.uid, option=self.option_2.uid, default=False)
+
+        self.assertEqual(self.compiled_quest.choice_options(self.kb, self.choice), [self.option_2])
+
+    def test_machine(self):
+        machine = Machine(knowledge_base=self.kb, interpreter=FakeInterpreter(check_is_alive=False))
+        machine.compile()
+
+        self.assertEqual(machine.get_available_jumps(self.question), [self.answer_2])
+
+        while machine.do_step():
+            pass
+
+        self.assertEqual(machine.current_state, self.finish_2)
+
+
+def create_test_compiled_machine_method(quest_class):
+    def test_method(self):
+        for seed in range(5):
+            kb = worlds.create_valid_quest(quest_class, quests=worlds.BASE_QUESTS, rng=random.Random(seed))
+            compiled_kb = KnowledgeBase.deserialize(kb.serialize(), facts.FACTS)
+
+            interpreter = worlds.Interpreter(log=True)
+            compiled_interpreter = worlds.Interpreter(log=True)
+
+            machine = Machine(knowledge_base=kb, interpreter=interpreter, rng=random.Random(seed))
+            compiled_machine = Machine(knowledge_base=compiled_kb, interpreter=compiled_interpreter, rng=random.Random(seed))
+            compiled_machine.compile()
+
+            worlds.run_machine(machine)
+            worlds.run_machine(compiled_machine)
+
+            self.assertTrue(compiled_machine.is_processed)
+            self.assertEqual(interpreter.log, compiled_interpreter.log)
+            self.assertEqual(kb.serialize(), compiled_kb.serialize())
+
+    test_method.__name__ = 'test_%s_same_as_not_compiled' % quest_class.TYPE
+
+    return test_method
+
+
+for Quest in worlds.QUESTS:
+    method = create_test_compiled_machine_method(Quest)
+    setattr(CompiledQuestTests, method.__name__, method)
+
+
+
+class BulkChecker(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def check_located_in_many(self, requirements, interpreters):
+        self.calls.append(('located_in', len(requirements)))
+        return [requirement in interpreter.satisfied_requirements for requirement, interpreter in zip(requirements, interpreters)]
+
+
+class MachinePoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.kb = KnowledgeBase()
+
+        self.start = facts.Start(uid='start', type='test', nesting=0)
+        self.state_1 = facts.State(uid='state_1', require=[requirements.LocatedIn(object='hero', place='place_1'),
+                                                           requirements.IsAlive(object='hero')])
+        self.finish_1 = facts.Finish(start='start', uid='finish_1', results={}, nesting=0)
+
+        self.kb += [self.start,
+                    self.state_1,
+                    self.finish_1,
+                    facts.Jump(state_from=self.start.uid, state_to=self.state_1.uid),
+                    facts.Jump(state_from=self.state_1.uid, state_to=self.finish_1.uid)]
+
+    def create_machines(self, number):
+        return [Machine(knowledge_base=KnowledgeBase.deserialize(self.kb.serialize(), facts.FACTS),
+                        interpreter=worlds.Interpreter())
+                for i in range(number)]
+
+    def test_do_step(self):
+        pool = MachinePool(self.create_machines(3))
+
+        results = []
+
+        while True:
+            step_results = pool.do_step()
+            results.append(list(step_results))
+
+            if all(result == STEP_RESULT.FINISHED for result in step_results):
+                break
+
+        self.assertEqual(results,
+                         [[STEP_RESULT.STEPPED] * 3, # start
+                          [STEP_RESULT.STEPPED] * 3, # jump to state_1
+                          [STEP_RESULT.BLOCKED] * 3, # satisfy LocatedIn
+                          [STEP_RESULT.BLOCKED] * 3, # satisfy IsAlive
+                          [STEP_RESULT.STEPPED] * 3, # state_1
+                          [STEP_RESULT.STEPPED] * 3, # jump to finish
+                          [STEP_RESULT.STEPPED] * 3, # finish
+                          [STEP_RESULT.FINISHED] * 3])
+
+    def test_do_step__unsatisfied_requirements_order(self):
+        machine = self.create_machines(1)[0]
+        pool = MachinePool([machine])
+
+        pool.do_step()
+        pool.do_step()
+        pool.do_step()
+
+        self.assertEqual(machine.unsatisfied_requirements, list(self.state_1.require))
+
+    def test_do_step__checker(self):
+        checker = BulkChecker()
+
+        pool = MachinePool(self.create_machines(3), checker=checker)
+
+        for i in range(3):
+            pool.do_step()
+
+        self.assertEqual(checker.calls, [('located_in', 3)])
+
+    def test_remove_processed(self):
+        pool = MachinePool(self.create_machines(2))
+
+        for i in range(7):
+            pool.do_step()
+
+        pool.add(self.create_machines(1)[0])
+        pool.remove_processed()
+
+        self.assertEqual(len(pool.machines), 1)
+
+
+def create_test_machine_pool_method(quest_class):
+    def test_method(self):
+        quests_kbs = []
+
+        for seed in range(3):
+            quests_kbs.append(worlds.create_valid_quest(quest_class, quests=worlds.BASE_QUESTS, rng=random.Random(seed)))
+
+        machines = [Machine(knowledge_base=kb, interpreter=worlds.Interpreter(log=True), rng=random.Random(seed))
+                    for seed, kb in enumerate(quests_kbs)]
+        pool_machines = [Machine(knowledge_base=KnowledgeBase.deserialize(kb.serialize(), facts.FACTS), interpreter=worlds.Interpreter(log=True), rng=random.Random(seed))
+                         for seed, kb in enumerate(quests_kbs)]
+
+        pool = MachinePool(pool_machines)
+
+        for i in range(1000):
+            results = pool.do_step()
+
+            for machine, result in zip(machines, results):
+                self.assertEqual(machine.do_step(), result != STEP_RESULT.FINISHED)
+
+            if all(result == STEP_RESULT.FINISHED for result in results):
+                break
+
+        for machine, pool_machine in zip(machines, pool_machines):
+            self.assertTrue(pool_machine.is_processed)
+            self.assertEqual(machine.interpreter.log, pool_machine.interpreter.log)
+
+    test_method.__name__ = 'test_%s_same_as_machines' % quest_class.TYPE
+
+    return test_method
+
+
+for Quest in worlds.QUESTS:
+    method = create_test_machine_pool_method(Quest)
+    setattr(MachinePoolTests, method.__name__, method)
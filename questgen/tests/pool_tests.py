@@ -0,0 +1,134 @@
+# coding: utf-8
+import time
+import unittest
+
+from questgen import facts
+from questgen import restrictions
+from questgen import serialization
+from questgen.pool import QuestPool, world_version
+from questgen.knowledge_base import KnowledgeBase, LayeredKnowledgeBase
+from questgen.tests import worlds
+
+
+KEY = ('hero', 'place_1')
+
+
+class QuestPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.world = worlds.create_world(places_number=20, persons_number=40, hero=False)
+        self.pool = QuestPool(self.world,
+                              worlds.create_quests_base(),
+                              restrictions=worlds.QUEST_RESTRICTIONS,
+                              world_restrictions=worlds.WORLD_RESTRICTIONS,
+                              size=2,
+                              max_workers=1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def wait_ready(self, key=KEY):
+        for i in range(500):
+            if self.pool.ready_number(key) == self.pool.size:
+                return
+            time.sleep(0.01)
+
+    def test_get(self):
+        self.pool.register(KEY, worlds.create_hero_facts())
+
+        data = self.pool.get(KEY, timeout=None)
+
+        kb = LayeredKnowledgeBase(self.world)
+        kb += KnowledgeBase.deserialize(serialization.decode(data, facts.FACTS), facts.FACTS).facts()
+
+        kb.validate_consistency(worlds.WORLD_RESTRICTIONS + worlds.QUEST_RESTRICTIONS)
+
+        self.assertEqual([hero.uid for hero in kb.filter(facts.Hero)], ['hero'])
+        self.assertEqual(len([start for start in kb.filter(facts.Start) if start.is_external]), 1)
+
+    def test_ready_quests_refilled(self):
+        self.pool.register(KEY, worlds.create_hero_facts())
+
+        self.wait_ready()
+        self.assertEqual(self.pool.ready_number(KEY), 2)
+
+        self.assertNotEqual(self.pool.get(KEY), None)
+        self.assertEqual(self.pool.ready_number(KEY), 1)
+
+        self.wait_ready()
+        self.assertEqual(self.pool.ready_number(KEY), 2)
+
+    def test_unknown_key(self):
+        self.assertRaises(KeyError, self.pool.get, KEY)
+
+    def test_unregister(self):
+        self.pool.register(KEY, worlds.create_hero_facts())
+        self.pool.unregister(KEY)
+        self.assertRaises(KeyError, self.pool.get, KEY)
+
+    def test_update_world__not_changed(self):
+        self.pool.register(KEY, worlds.create_hero_facts())
+        self.wait_ready()
+
+        self.pool.update_world(self.world)
+
+        self.assertEqual(self.pool.ready_number(KEY), 2)
+
+    def test_update_world(self):
+        self.pool.register(KEY, worlds.create_hero_facts())
+        self.wait_ready()
+
+        self.world += facts.Place(uid='new_place')
+
+        self.assertNotEqual(self.pool.version, world_version(self.world))
+
+        self.pool.update_world(self.world)
+
+        self.assertEqual(self.pool.version, world_version(self.world))
+        self.assertEqual(self.pool.ready_number(KEY), 0)
+
+        self.assertNotEqual(self.pool.get(KEY, timeout=None), None)
+
+    def test_wrong_world(self):
+        self.pool.register(KEY, worlds.create_hero_facts())
+
+        version = self.pool.version
+
+        self.world += facts.LocatedIn(object='person_0', place='place_2')
+        self.assertRaises(restrictions.SingleLocationForObject.Error, self.pool.update_world, self.world)
+
+        self.assertEqual(self.pool.version, version)
+        self.assertNotEqual(self.pool.get(KEY, timeout=None), None)
+
+    def test_errors(self):
+        self.pool.close()
+
+        self.pool = QuestPool(self.world,
+                              worlds.create_quests_base(),
+                              restrictions=[restrictions.AlwaysError()],
+                              size=1,
+                              max_workers=1,
+                              max_attempts=1)
+
+        self.pool.register(KEY, worlds.create_hero_facts())
+
+        self.assertEqual(self.pool.get(KEY, timeout=0.5), None)
+        self.assertTrue(self.pool.errors >= 1)
+
+    def test_errors__wait_forever(self):
+        self.pool.close()
+
+        self.pool = QuestPool(self.world,
+                              worlds.create_quests_base(),
+                              restrictions=[restrictions.AlwaysError()],
+                              size=2,
+                              max_workers=1,
+                              max_attempts=1)
+
+        self.pool.register(KEY, worlds.create_hero_facts())
+
+        for i in range(3):
+            errors = self.pool.errors
+
+            self.assertEqual(self.pool.get(KEY, timeout=None), None)
+            self.assertTrue(self.pool.errors > errors)
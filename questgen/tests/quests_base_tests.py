@@ -0,0 +1,154 @@
+# coding: utf-8
+import random
+import unittest
+
+from questgen import exceptions
+from questgen.quests.quests_base import QuestsBase
+from questgen.quests.simple import Simple
+from questgen.quests.simplest import Simplest
+from questgen.tests import worlds
+from questgen.tests.legacy import LegacyQuestsBase
+
+
+METHODS = ('quest_from_place', 'quest_from_person', 'quest_between_2')
+
+
+class QuestsBaseTests(unittest.TestCase):
+
+    def setUp(self):
+        self.qb = QuestsBase()
+        self.qb += worlds.QUESTS
+
+        self.legacy_qb = LegacyQuestsBase()
+        self.legacy_qb += worlds.QUESTS
+
+    def test_duplicated_quest(self):
+        self.assertRaises(exceptions.DuplicatedQuestError, self.qb.__iadd__, Simple)
+
+    def test_wrong_quest_type(self):
+        self.assertRaises(exceptions.WrongQuestTypeError, self.qb.__iadd__, object)
+
+    def test_no_choices(self):
+        self.assertRaises(exceptions.NoQuestChoicesRollBackError, self.qb.quest_from_place, allowed=())
+        self.assertRaises(exceptions.NoQuestChoicesRollBackError, self.qb.quest_from_place, tags=('unknown_tag', ))
+        self.assertRaises(exceptions.NoQuestChoicesRollBackError, QuestsBase().quest_from_person)
+
+    def test_choices__registration_order(self):
+        choices = self.qb._choices('construct_from_place')
+        self.assertEqual(choices, [quest for quest in worlds.QUESTS if hasattr(quest, 'construct_from_place')])
+
+    def test_choices__cache_reset_on_registration(self):
+        qb = QuestsBase()
+        qb += [Simple]
+
+        self.assertEqual(qb._choices('construct_from_place'), [Simple])
+
+        qb += [Simplest]
+
+        self.assertEqual(qb._choices('construct_from_place'), [Simple, Simplest])
+
+    def test_not_weighted_by_default(self):
+        self.assertFalse(self.qb.is_weighted)
+        self.assertTrue(QuestsBase(weights={}).is_weighted)
+        self.assertTrue(QuestsBase(adaptive=True).is_weighted)
+
+    def test_weights(self):
+        qb = QuestsBase(weights={Simple.TYPE: 0})
+        qb += [Simple, Simplest]
+
+        self.assertEqual(qb.weight(Simple.TYPE), 0)
+        self.assertEqual(qb.weight(Simplest.TYPE), 1.0)
+
+        rng = random.Random(0)
+
+        self.assertEqual(set(qb.quest_from_place(rng=rng) for i in range(100)), set([Simplest]))
+
+    def test_weights__all_zero(self):
+        qb = QuestsBase(weights={Simple.TYPE: 0, Simplest.TYPE: 0})
+        qb += [Simple, Simplest]
+
+        self.assertRaises(exceptions.NoQuestChoicesRollBackError, qb.quest_from_place)
+
+    def test_record(self):
+        self.qb.record(Simple.TYPE, success=True, time=1.0)
+        self.qb.record(Simple.TYPE, success=False, time=2.0)
+
+        statistics = self.qb.statistics(Simple.TYPE)
+
+        self.assertEqual((statistics.successes, statistics.rollbacks, statistics.time), (1, 1, 3.0))
+        self.assertEqual(statistics.mean_time, 1.5)
+        self.assertEqual(statistics.success_rate, 0.5)
+
+        self.assertEqual(self.qb.statistics(Simplest.TYPE).constructions, 0)
+
+        self.qb.reset_statistics()
+
+        self.assertEqual(self.qb.statistics(Simple.TYPE).constructions, 0)
+
+    def test_weight__not_adaptive(self):
+        self.qb.record(Simple.TYPE, success=False, time=1.0)
+        self.assertEqual(self.qb.weight(Simple.TYPE), 1.0)
+
+    def test_weight__adaptive(self):
+        qb = QuestsBase(weights={Simple.TYPE: 2.0}, adaptive=True)
+        qb += [Simple, Simplest]
+
+        self.assertEqual(qb.weight(Simple.TYPE), 1.0)
+
+        qb.record(Simple.TYPE, success=False, time=1.0)
+        qb.record(Simplest.TYPE, success=True, time=1.0)
+
+        self.assertEqual(qb.weight(Simple.TYPE), 2.0 / 3)
+        self.assertEqual(qb.weight(Simplest.TYPE), 2.0 / 3)
+
+    def test_weight__adaptive_cost(self):
+        qb = QuestsBase(adaptive=True)
+        qb += [Simple, Simplest]
+
+        qb.record(Simple.TYPE, success=True, time=3.0)
+        qb.record(Simplest.TYPE, success=True, time=1.0)
+
+        self.assertEqual(qb.weight(Simple.TYPE), 2.0 / 3 * 2.0 / 3)
+        self.assertEqual(qb.weight(Simplest.TYPE), 2.0 / 3 * 2.0)
+
+    def test_weight__adaptive_untried(self):
+        qb = QuestsBase(adaptive=True)
+        qb += [Simple, Simplest]
+
+        for i in range(3):
+            qb.record(Simple.TYPE, success=True, time=1.0)
+
+        self.assertEqual(qb.weight(Simplest.TYPE), 0.5)
+        self.assertEqual(qb.weight(Simple.TYPE), 0.8)
+
+    def test_adaptive__avoids_failed_quests(self):
+        qb = QuestsBase(adaptive=True)
+        qb += [Simple, Simplest]
+
+        for i in range(100):
+            qb.record(Simple.TYPE, success=False, time=1.0)
+            qb.record(Simplest.TYPE, success=True, time=1.0)
+
+        rng = random.Random(0)
+
+        choices = [qb.quest_from_place(rng=rng) for i in range(100)]
+
+        self.assertTrue(choices.count(Simplest) > 90)
+
+    def test_same_as_filtering(self):
+        rng = random.Random(0)
+
+        for i in range(300):
+            arguments = worlds.random_quest_arguments(rng, worlds.QUESTS)
+            method_name = rng.choice(METHODS)
+            seed = rng.random()
+
+            results = []
+
+            for qb in (self.qb, self.legacy_qb):
+                try:
+                    results.append(getattr(qb, method_name)(rng=random.Random(seed), **arguments))
+                except exceptions.NoQuestChoicesRollBackError:
+                    results.append(None)
+
+            self.assertEqual(results[0], results[1])
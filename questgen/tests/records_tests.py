@@ -65,3 +65,22 @@ class RecordsTests(unittest.TestCase):
 
     def test_repr(self):
         self.assertEqual(ChildRecord(attr_1=1, attr_3=666).__repr__(), 'ChildRecord(attr_1=1, attr_2=None, attr_3=666)')
+
+    def test_hash(self):
+        record_1 = ChildRecord(attr_1=1, attr_3=666)
+        record_2 = ChildRecord(attr_1=1, attr_3=666)
+        record_3 = ChildRecord(attr_1=1, attr_3=666, attr_2=7)
+        self.assertEqual(hash(record_1), hash(record_2))
+        self.assertEqual(len(set([record_1, record_2, record_3])), 2)
+
+    def test_hash__unhashable_attributes(self):
+        record_1 = ChildRecord(attr_1=[1, 2], attr_3={'a': [3]})
+        record_2 = ChildRecord(attr_1=[1, 2], attr_3={'a': [3]})
+        self.assertEqual(hash(record_1), hash(record_2))
+        self.assertEqual(set([record_1]), set([record_2]))
+
+    def test_hash__cached(self):
+        record = ChildRecord(attr_1=1, attr_3=666)
+        self.assertEqual(record._hash, None)
+        value = hash(record)
+        self.assertEqual(record._hash, value)
@@ -230,6 +230,42 @@ class NoCirclesInStateJumpGraphTests(RestrictionsTestsBase):
         self.kb += facts.Jump(state_from='start_3', state_to='state_1')
         self.assertRaises(self.restriction.Error, self.restriction.validate, self.kb)
 
+    def test_circle_path(self):
+        self.kb += facts.Jump(state_from='start_3', state_to='state_1')
+
+        with self.assertRaises(self.restriction.Error) as context:
+            self.restriction.validate(self.kb)
+
+        self.assertEqual(str(context.exception),
+                         "Jumps in circle: ['start', 'state_1', 'state_2', 'start_3', 'state_1']")
+
+    def test_self_circle(self):
+        self.kb += facts.Jump(state_from='state_2', state_to='state_2')
+        self.assertRaises(self.restriction.Error, self.restriction.validate, self.kb)
+
+    def test_diamonds(self):
+        self.kb += [facts.State(uid='state_1_1'),
+                    facts.Jump(state_from='start', state_to='state_1_1'),
+                    facts.Jump(state_from='state_1_1', state_to='state_2')]
+        self.restriction.validate(self.kb)
+
+    def test_deep_graph(self):
+        kb = KnowledgeBase()
+        kb += facts.Start(uid='start', type='test', nesting=0)
+
+        previous_uid = 'start'
+
+        for i in range(5000):
+            kb += facts.State(uid='state_%d' % i)
+            kb += facts.Jump(state_from=previous_uid, state_to='state_%d' % i)
+            previous_uid = 'state_%d' % i
+
+        self.restriction.validate(kb)
+
+        kb += facts.Jump(state_from=previous_uid, state_to='state_1000')
+
+        self.assertRaises(self.restriction.Error, self.restriction.validate, kb)
+
 
 class MultipleJumpsFromNormalStateTests(RestrictionsTestsBase):
 
@@ -373,3 +409,45 @@ class FinishResultsConsistencyTests(RestrictionsTestsBase):
     def test_wrong_participant_in_results__2(self):
         self.finish_2.results['p1'] = 0
         self.assertRaises(self.restriction.ParticipantNotExists, self.restriction.validate, self.kb)
+
+
+class ValidationContextTests(RestrictionsTestsBase):
+
+    def setUp(self):
+        super(ValidationContextTests, self).setUp()
+
+        self.kb += [facts.Start(uid='start', type='test', nesting=0),
+                    facts.Question(uid='question', condition=()),
+                    facts.Finish(uid='finish_1', start='start', results={}, nesting=0),
+                    facts.Finish(uid='finish_2', start='start', results={}, nesting=0),
+                    facts.Jump(state_from='start', state_to='question'),
+                    facts.Answer(state_from='question', state_to='finish_1', condition=True),
+                    facts.Answer(state_from='question', state_to='finish_2', condition=False)]
+
+        self.context = restrictions.ValidationContext(self.kb)
+
+    def test_filter(self):
+        self.assertEqual(set(state.uid for state in self.context.filter(facts.Finish)), set(['finish_1', 'finish_2']))
+        self.assertIs(self.context.filter(facts.Finish), self.context.filter(facts.Finish))
+        self.assertEqual(self.context.filter(facts.Choice), [])
+
+    def test_jumps_from(self):
+        self.assertEqual(set(jump.uid for jump in self.context.jumps_from('question')),
+                         set(jump.uid for jump in self.kb.jumps_from('question')))
+        self.assertEqual(list(self.context.jumps_from('finish_1')), [])
+
+    def test_in_degree(self):
+        self.assertEqual(self.context.in_degree('start'), 0)
+        self.assertEqual(self.context.in_degree('question'), 1)
+        self.assertEqual(self.context.in_degree('finish_1'), 1)
+
+    def test_answers(self):
+        self.assertEqual(set(answer.state_to for answer in self.context.answers('question')), set(['finish_1', 'finish_2']))
+        self.assertEqual(list(self.context.answers('start')), [])
+
+    def test_absolute_start(self):
+        self.assertEqual(self.context.absolute_start.uid, 'start')
+
+    def test_validate_with_context__plain_restriction(self):
+        restrictions.AlwaysSuccess().validate_with_context(self.kb, self.context)
+        self.assertRaises(restrictions.AlwaysError.Error, restrictions.AlwaysError().validate_with_context, self.kb, self.context)
@@ -1,12 +1,15 @@
 # coding: utf-8
 
+import random
 import unittest
 
-from questgen.knowledge_base import KnowledgeBase
+from questgen.knowledge_base import KnowledgeBase, LayeredKnowledgeBase
 from questgen import facts
 from questgen import selectors
 from questgen import exceptions
 from questgen import relations
+from questgen.tests import worlds
+from questgen.tests.legacy import LegacySelector
 
 
 class SelectordsTests(unittest.TestCase):
@@ -47,6 +50,18 @@ class SelectordsTests(unittest.TestCase):
 
             self.selector.reset()
 
+    def test_rng(self):
+        state = random.getstate()
+
+        places = []
+
+        for i in range(2):
+            selector = selectors.Selector(self.kb, None, rng=random.Random(0))
+            places.append([selector.new_place().uid for j in range(3)] + [selector.new_person(restrict_places=False).uid for j in range(3)])
+
+        self.assertEqual(places[0], places[1])
+        self.assertEqual(random.getstate(), state)
+
     def test_new_place__not_found_exception(self):
         self.selector.new_place()
         self.selector.new_place()
@@ -54,6 +69,19 @@ class SelectordsTests(unittest.TestCase):
 
         self.assertRaises(exceptions.NoFactSelectedError, self.selector.new_place)
 
+    def test_new_place__not_found_exception__reserved_snapshot(self):
+        self.selector.new_place(terrains=[1])
+
+        with self.assertRaises(exceptions.NoFactSelectedError) as context:
+            self.selector.new_place(terrains=[1])
+
+        message = str(context.exception)
+
+        self.selector.new_place(terrains=[0])
+
+        self.assertEqual(context.exception.reserved, frozenset(['place_1']))
+        self.assertEqual(str(context.exception), message)
+
     def test_new_place__terrains(self):
         self.assertRaises(exceptions.NoFactSelectedError, self.selector.new_place, terrains=[2])
         self.assertEqual(self.selector.new_place(terrains=[1]).uid, 'place_1')
@@ -274,3 +302,132 @@ class SelectordsTests(unittest.TestCase):
 
     def test_preferences_enemy__not_found(self):
         self.assertRaises(exceptions.NoFactSelectedError, self.selector.preferences_enemy)
+
+
+class IndexesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.kb = worlds.create_world(places_number=20, persons_number=100, social_connections_number=100)
+
+        self.kb += [facts.NotFirstInitiator(person='person_%d' % i) for i in range(0, 100, 7)]
+
+        self.qb = worlds.create_quests_base()
+
+    def test_index_rebuilt_on_changes(self):
+        index = selectors.get_index(selectors.PersonsIndex, self.kb)
+
+        self.assertIs(selectors.get_index(selectors.PersonsIndex, self.kb), index)
+
+        self.kb += facts.Place(uid='new_place')
+
+        self.assertIs(selectors.get_index(selectors.PersonsIndex, self.kb), index)
+
+        self.kb += facts.Person(uid='new_person')
+        self.kb += facts.LocatedIn(object='new_person', place='new_place')
+
+        new_index = selectors.get_index(selectors.PersonsIndex, self.kb)
+
+        self.assertIsNot(new_index, index)
+        self.assertEqual([person.uid for position in new_index.by_place['new_place'] for person in [new_index.locations[position][1]]],
+                         ['new_person'])
+
+    def test_index_per_world(self):
+        other_kb = worlds.create_world(places_number=10, persons_number=10)
+
+        index = selectors.get_index(selectors.PersonsIndex, self.kb)
+        other_index = selectors.get_index(selectors.PersonsIndex, other_kb)
+
+        self.assertIsNot(other_index, index)
+        self.assertIs(selectors.get_index(selectors.PersonsIndex, self.kb), index)
+        self.assertIs(selectors.get_index(selectors.PersonsIndex, other_kb), other_index)
+
+    def test_index_of_layered_knowledge_base(self):
+        index = selectors.get_index(selectors.PersonsIndex, self.kb)
+
+        kb = LayeredKnowledgeBase(self.kb)
+        kb += facts.Place(uid='new_place')
+
+        self.assertIs(selectors.get_index(selectors.PersonsIndex, kb), index)
+
+        kb += facts.Person(uid='new_person')
+
+        self.assertIsNot(selectors.get_index(selectors.PersonsIndex, kb), index)
+        self.assertIs(selectors.get_index(selectors.PersonsIndex, self.kb), index)
+
+    def test_check_social_connections(self):
+        selector = selectors.Selector(self.kb, self.qb)
+
+        connection = next(self.kb.filter(facts.SocialConnection))
+
+        self.assertTrue(selector.check_social_connections(self.kb[connection.person_from], connection.person_to, connection.type))
+        self.assertFalse(selector.check_social_connections(self.kb[connection.person_to], connection.person_from, connection.type))
+
+    def test_new_person__same_as_facts_scanning(self):
+        rng = random.Random(0)
+
+        for i in range(30):
+            selector = selectors.Selector(self.kb, self.qb, social_connection_probability=0.5)
+            legacy_selector = LegacySelector(self.kb, self.qb, social_connection_probability=0.5)
+
+            for j in range(10):
+                arguments = worlds.random_new_person_arguments(rng, places_number=20, persons_number=100)
+
+                seed = rng.random()
+
+                selector.rng = random.Random(seed)
+                legacy_selector.rng = random.Random(seed)
+
+                try:
+                    person = selector.new_person(**arguments)
+                except exceptions.NoFactSelectedError:
+                    person = None
+
+                try:
+                    legacy_person = legacy_selector.new_person(**arguments)
+                except exceptions.NoFactSelectedError:
+                    legacy_person = None
+
+                self.assertEqual(person, legacy_person)
+                self.assertEqual(selector._reserved, legacy_selector._reserved)
+
+    def test_places_index_rebuilt_on_changes(self):
+        index = selectors.get_index(selectors.PlacesIndex, self.kb)
+
+        self.kb += facts.Person(uid='new_person')
+
+        self.assertIs(selectors.get_index(selectors.PlacesIndex, self.kb), index)
+
+        self.kb += facts.Place(uid='new_place', terrains=(100,))
+
+        new_index = selectors.get_index(selectors.PlacesIndex, self.kb)
+
+        self.assertIsNot(new_index, index)
+        self.assertEqual(new_index.positions(new_index.by_terrain, (100,)), set([len(new_index.places) - 1]))
+
+    def test_new_place__same_as_facts_scanning(self):
+        rng = random.Random(0)
+
+        for i in range(30):
+            selector = selectors.Selector(self.kb, self.qb)
+            legacy_selector = LegacySelector(self.kb, self.qb)
+
+            for j in range(10):
+                arguments = worlds.random_new_place_arguments(rng, places_number=20)
+
+                seed = rng.random()
+
+                selector.rng = random.Random(seed)
+                legacy_selector.rng = random.Random(seed)
+
+                try:
+                    place = selector.new_place(**arguments)
+                except exceptions.NoFactSelectedError as e:
+                    place = e.arguments
+
+                try:
+                    legacy_place = legacy_selector.new_place(**arguments)
+                except exceptions.NoFactSelectedError as e:
+                    legacy_place = e.arguments
+
+                self.assertEqual(place, legacy_place)
+                self.assertEqual(selector._reserved, legacy_selector._reserved)
@@ -0,0 +1,116 @@
+# coding: utf-8
+import random
+import unittest
+
+from questgen import facts
+from questgen import actions
+from questgen import exceptions
+from questgen import serialization
+from questgen.knowledge_base import KnowledgeBase
+from questgen.tests import worlds
+
+
+def _types(value):
+    if isinstance(value, dict):
+        return (dict, tuple(sorted((repr(key), _types(element)) for key, element in value.items())))
+    if isinstance(value, (list, tuple)):
+        return (type(value), tuple(_types(element) for element in value))
+    return type(value)
+
+
+class SerializationTests(unittest.TestCase):
+
+    def setUp(self):
+        self.kb = KnowledgeBase()
+        self.kb += [facts.Place(uid='place_1', terrains=(1, 2), externals={'id': -12345678901}),
+                    facts.Person(uid='person_1', description='описание'),
+                    facts.Start(uid='start', type='test', nesting=0, actions=[actions.GiveReward(object='person_1', type='money', scale=1),
+                                                                             actions.Fight(mob=None)]),
+                    facts.Finish(uid='finish', start='start', results={'person_1': 1, 'place_1': -1}, nesting=0),
+                    facts.Jump(state_from='start', state_to='finish', start_actions=(actions.Message(type='message'), )),
+                    facts.Answer(state_from='start', state_to='finish', condition=[], description=1.5)]
+
+        self.kb.ns_number = 7
+
+    def check_round_trip(self, data):
+        encoded = serialization.encode(data, facts.FACTS)
+        decoded = serialization.decode(encoded, facts.FACTS)
+
+        self.assertEqual(decoded, data)
+        self.assertEqual(_types(decoded), _types(data))
+
+        return encoded
+
+    def test_round_trip(self):
+        self.check_round_trip(self.kb.serialize())
+
+    def test_round_trip__short(self):
+        self.check_round_trip(self.kb.serialize(short=True))
+
+    def test_knowledge_base(self):
+        data = serialization.decode(serialization.encode(self.kb.serialize(), facts.FACTS), facts.FACTS)
+
+        kb = KnowledgeBase.deserialize(data, facts.FACTS)
+
+        self.assertEqual(kb.serialize(), self.kb.serialize())
+        self.assertEqual(kb.ns_number, 7)
+
+    def test_default_of_other_type(self):
+        data = self.kb.serialize()
+
+        reward = data['facts']['start']['attributes']['actions'][0]['attributes']
+
+        self.assertEqual(reward['scale'], 1)
+        self.assertEqual(type(reward['scale']), int)
+
+        self.check_round_trip(data)
+
+    def test_tuple_and_list(self):
+        data = {'facts': {'place': {'type': 'Place', 'attributes': {'uid': 'place', 'terrains': [(1, [2]), ()]}}},
+                'ns_number': 0}
+
+        self.check_round_trip(data)
+
+    def test_numbers(self):
+        values = [0, 1, -1, 63, 64, -64, -65, 2**70, -2**70, 0.1, -1e300, True, False, None]
+
+        data = {'facts': {'place': {'type': 'Place', 'attributes': {'uid': 'place', 'externals': values}}},
+                'ns_number': -3}
+
+        self.check_round_trip(data)
+
+    def test_many_attributes(self):
+        data = {'facts': {'place': {'type': 'Place', 'attributes': {name: 'value_%s' % name for name in facts.Place._attributes}}},
+                'ns_number': 0}
+
+        self.check_round_trip(data)
+
+    def test_strings_written_once(self):
+        encoded = self.check_round_trip(self.kb.serialize())
+        self.assertEqual(encoded.count(b'person_1'), 1)
+
+    def test_compact(self):
+        rng = random.Random(0)
+
+        for quest_class in worlds.QUESTS:
+            data = worlds.transform(worlds.create_quest(quest_class, quests=worlds.BASE_QUESTS, rng=rng), rng=rng).serialize()
+            encoded = self.check_round_trip(data)
+            self.assertTrue(len(encoded) < len(repr(data)) / 2)
+
+    def test_unserializable_value(self):
+        data = {'facts': {'place': {'type': 'Place', 'attributes': {'uid': 'place', 'externals': set([1])}}},
+                'ns_number': 0}
+
+        self.assertRaises(exceptions.UnserializableValueError, serialization.encode, data, facts.FACTS)
+
+    def test_wrong_attribute(self):
+        data = {'facts': {'place': {'type': 'Place', 'attributes': {'uid': 'place', 'unknown': 1}}},
+                'ns_number': 0}
+
+        self.assertRaises(exceptions.WrongRecordAttributeError, serialization.encode, data, facts.FACTS)
+
+    def test_wrong_data(self):
+        encoded = serialization.encode(self.kb.serialize(), facts.FACTS)
+
+        self.assertRaises(exceptions.WrongSerializedDataError, serialization.decode, b'{}' + encoded[2:], facts.FACTS)
+        self.assertRaises(exceptions.WrongSerializedDataError, serialization.decode, encoded[:-3], facts.FACTS)
@@ -1,5 +1,6 @@
 # coding: utf-8
 
+import random
 import unittest
 
 from questgen import exceptions
@@ -11,6 +12,8 @@ from questgen import records
 from questgen import actions
 from questgen import requirements
 from questgen import relations
+from questgen.tests import worlds
+from questgen.tests.legacy import legacy_remove_broken_states
 
 
 class TransformatorsTestsBase(unittest.TestCase):
@@ -296,6 +299,59 @@ class RemoveBrokenQuestionStatesTests(TransformatorsTestsBase):
         self.check_not_in_knowledge_base(self.kb, [self.question, self.answer_1, self.answer_2])
 
 
+class RemoveBrokenStatesSameAsFullSweepsTests(TransformatorsTestsBase):
+
+    def check_same_as_full_sweeps(self, kb):
+        data = kb.serialize()
+
+        legacy_kb = KnowledgeBase.deserialize(data, facts.FACTS)
+
+        try:
+            legacy_remove_broken_states(legacy_kb)
+        except exceptions.NoFactError:
+            self.assertRaises(exceptions.NoFactError, transformators.remove_broken_states, kb)
+            return
+
+        transformators.remove_broken_states(kb)
+
+        self.assertEqual(kb.serialize(), legacy_kb.serialize())
+
+    def test_dead_branch(self):
+        kb = worlds.create_dead_branch_quest(depth=100, main_path_length=10)
+
+        self.check_same_as_full_sweeps(kb)
+
+        self.assertFalse(any(state.uid.startswith('dead_') for state in kb.filter(facts.State)))
+        self.assertEqual(len(list(kb.filter(facts.State))), 13)
+
+    def test_random_graphs(self):
+        rng = random.Random(0)
+
+        for i in range(300):
+            states_number = rng.randint(1, 30)
+            kb = worlds.create_random_graph(rng,
+                                     states_number=states_number,
+                                     jumps_number=rng.randint(0, states_number * 3),
+                                     links_number=rng.randint(0, 3))
+            self.check_same_as_full_sweeps(kb)
+
+
+def create_test_same_as_full_sweeps_method(quest_class):
+    def test_method(self):
+        for seed in range(5):
+            rng = random.Random(seed)
+            self.check_same_as_full_sweeps(worlds.prepare_quest(worlds.create_quest(quest_class, quests=worlds.BASE_QUESTS, rng=rng), rng=rng))
+
+    test_method.__name__ = 'test_%s_same_as_full_sweeps' % quest_class.TYPE
+
+    return test_method
+
+
+for Quest in worlds.QUESTS:
+    method = create_test_same_as_full_sweeps_method(Quest)
+    setattr(RemoveBrokenStatesSameAsFullSweepsTests, method.__name__, method)
+
+
 class RemoveRestrictedStatesTests(TransformatorsTestsBase):
 
     def setUp(self):
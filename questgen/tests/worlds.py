@@ -0,0 +1,378 @@
+# coding: utf-8
+'''
+synthetic worlds and quests for tests and benchmarks
+'''
+import random
+
+from questgen.knowledge_base import KnowledgeBase
+from questgen import facts
+from questgen import exceptions
+from questgen import relations
+from questgen import transformators
+from questgen import restrictions
+from questgen.selectors import Selector
+
+from questgen.quests.quests_base import QuestsBase
+from questgen.quests.spying import Spying
+from questgen.quests.hunt import Hunt
+from questgen.quests.hometown import Hometown
+from questgen.quests.search_smith import SearchSmith
+from questgen.quests.delivery import Delivery
+from questgen.quests.caravan import Caravan
+from questgen.quests.collect_debt import CollectDebt
+from questgen.quests.simple import Simple
+from questgen.quests.simplest import Simplest
+from questgen.quests.complex import Complex
+from questgen.quests.help_friend import HelpFriend
+from questgen.quests.interfere_enemy import InterfereEnemy
+from questgen.quests.help import Help
+from questgen.quests.pilgrimage import Pilgrimage
+
+
+BASE_QUESTS = [Spying, Hunt, Hometown, SearchSmith, Delivery, Caravan, CollectDebt, HelpFriend, InterfereEnemy, Help]
+
+QUESTS = BASE_QUESTS + [Simple, Simplest, Complex, Pilgrimage]
+
+TERRAINS_NUMBER = 3
+
+WORLD_RESTRICTIONS = [restrictions.SingleLocationForObject(),
+                      restrictions.ReferencesIntegrity()]
+
+QUEST_RESTRICTIONS = [restrictions.SingleStartStateWithNoEnters(),
+                      restrictions.FinishStateExists(),
+                      restrictions.AllStatesHasJumps(),
+                      restrictions.ConnectedStateJumpGraph(),
+                      restrictions.NoCirclesInStateJumpGraph(),
+                      restrictions.MultipleJumpsFromNormalState(),
+                      restrictions.ChoicesConsistency(),
+                      restrictions.QuestionsConsistency(),
+                      restrictions.FinishResultsConsistency()]
+
+
+def create_hero_facts(uid='hero', place='place_1'):
+    return [facts.Hero(uid=uid),
+            facts.LocatedIn(object=uid, place=place),
+            facts.PreferenceMob(object=uid, mob='mob_1'),
+            facts.PreferenceHometown(object=uid, place='place_2'),
+            facts.PreferenceFriend(object=uid, person='person_4'),
+            facts.PreferenceEnemy(object=uid, person='person_5')]
+
+
+def create_world_facts(places_number, persons_number, social_connections_number=0, hero=True):
+    world = []
+
+    world.extend(facts.Place(uid='place_%d' % i,
+                             terrains=(i % TERRAINS_NUMBER,),
+                             type=relations.PLACE_TYPE.HOLY_CITY if i % 10 == 0 else relations.PLACE_TYPE.NONE)
+                 for i in range(places_number))
+
+    professions = (relations.PROFESSION.NONE, relations.PROFESSION.BLACKSMITH, relations.PROFESSION.ROGUE)
+
+    world.extend(facts.Person(uid='person_%d' % i, profession=professions[i % len(professions)])
+                 for i in range(persons_number))
+
+    world.extend(facts.LocatedIn(object='person_%d' % i, place='place_%d' % (i % places_number))
+                 for i in range(persons_number))
+
+    social_relations = (relations.SOCIAL_RELATIONS.PARTNER, relations.SOCIAL_RELATIONS.CONCURRENT)
+
+    world.extend(facts.SocialConnection(person_from='person_%d' % i,
+                                        person_to='person_%d' % ((i * 7 + 1) % persons_number),
+                                        type=social_relations[i % len(social_relations)])
+                 for i in range(min(social_connections_number, persons_number)))
+
+    world.extend([facts.Mob(uid='mob_1', terrains=(0,)),
+                  facts.UpgradeEquipmentCost(money=777)])
+
+    if hero:
+        world.extend(create_hero_facts())
+
+    return world
+
+
+def create_world(places_number=10, persons_number=10, social_connections_number=0, hero=True):
+    kb = KnowledgeBase()
+    kb += create_world_facts(places_number, persons_number, social_connections_number, hero=hero)
+    return kb
+
+
+def create_quests_base(quests=BASE_QUESTS, **kwargs):
+    qb = QuestsBase(**kwargs)
+    qb += quests
+    return qb
+
+
+def create_quest(quest_class, places_number=10, persons_number=10, quests=(Simple,), attempts=100, rng=random):
+    '''
+    knowledge base with world and raw (not transformed) quest facts of quest_class
+    '''
+    for i in range(attempts):
+        kb = create_world(places_number, persons_number)
+        selector = Selector(kb, create_quests_base(quests), rng=rng)
+
+        try:
+            kb += quest_class.construct_from_place(nesting=0, selector=selector, start_place=selector.new_place(candidates=('place_1',)))
+        except exceptions.RollBackError:
+            if i + 1 == attempts:
+                raise
+            continue
+
+        return kb
+
+
+def transform(kb, rng=random):
+    transformators.activate_events(kb, rng=rng)
+    transformators.remove_restricted_states(kb)
+    transformators.remove_broken_states(kb)
+    transformators.determine_default_choices(kb, rng=rng)
+    return kb
+
+
+def create_valid_quest(quest_class, places_number=10, persons_number=10, quests=(Simple,), attempts=100, rng=random):
+    '''
+    knowledge base with world and transformed quest facts, which passes all restrictions
+    '''
+    for i in range(attempts):
+        try:
+            kb = transform(create_quest(quest_class, places_number, persons_number, quests, rng=rng), rng=rng)
+            kb.validate_consistency(WORLD_RESTRICTIONS)
+            kb.validate_consistency(QUEST_RESTRICTIONS)
+        except exceptions.RollBackError:
+            if i + 1 == attempts:
+                raise
+            continue
+
+        return kb
+
+
+def create_diamonds_graph(diamonds_number):
+    kb = KnowledgeBase()
+
+    kb += facts.Start(uid='start', type='test', nesting=0)
+
+    previous_uid = 'start'
+
+    for i in range(diamonds_number):
+        left = facts.State(uid='left_%d' % i)
+        right = facts.State(uid='right_%d' % i)
+        join = facts.Choice(uid='join_%d' % i)
+
+        kb += [left,
+               right,
+               join,
+               facts.Jump(state_from=previous_uid, state_to=left.uid),
+               facts.Jump(state_from=previous_uid, state_to=right.uid),
+               facts.Jump(state_from=left.uid, state_to=join.uid),
+               facts.Jump(state_from=right.uid, state_to=join.uid)]
+
+        previous_uid = join.uid
+
+    kb += [facts.Finish(uid='finish', start='start', results={}, nesting=0),
+           facts.Jump(state_from=previous_uid, state_to='finish')]
+
+    return kb
+
+
+def create_random_graph(rng, states_number, jumps_number, links_number=0):
+    '''
+    random (usually broken) graph of all kinds of states and jumps
+    '''
+    kb = KnowledgeBase()
+
+    kb += facts.Start(uid='start', type='test', nesting=0)
+
+    constructors = (lambda uid: facts.State(uid=uid),
+                    lambda uid: facts.Choice(uid=uid),
+                    lambda uid: facts.Question(uid=uid, condition=()),
+                    lambda uid: facts.Start(uid=uid, type='test', nesting=rng.choice((0, 1))),
+                    lambda uid: facts.Finish(uid=uid, start='start', results={}, nesting=rng.choice((0, 1))),
+                    lambda uid: facts.FakeFinish(uid=uid, start='start', results={}, nesting=1))
+
+    kb += [rng.choice(constructors)('state_%d' % i) for i in range(states_number)]
+
+    states = [state.uid for state in kb.filter(facts.State)]
+    options = []
+
+    for i in range(jumps_number):
+        state_from = rng.choice(states)
+        state_to = rng.choice(states + ['missed_state'])
+        uid = 'jump_%d' % i
+
+        kind = rng.randint(0, 2)
+
+        if kind == 0:
+            kb += facts.Jump(uid=uid, state_from=state_from, state_to=state_to)
+        elif kind == 1:
+            kb += facts.Option(uid=uid, state_from=state_from, state_to=state_to, type='o', markers=())
+            options.append(uid)
+        else:
+            kb += facts.Answer(uid=uid, state_from=state_from, state_to=state_to, condition=rng.choice((True, False)))
+
+    rng.shuffle(options)
+
+    for i in range(links_number):
+        if len(options) < 2:
+            break
+        kb += facts.OptionsLink(uid='link_%d' % i, options=[options.pop(), options.pop()])
+
+    return kb
+
+
+def create_dead_branch_quest(depth, main_path_length=100):
+    '''
+    valid quest with long branch, which has no finish, so it is removed state by state from its end
+    '''
+    kb = KnowledgeBase()
+
+    kb += [facts.Start(uid='start', type='test', nesting=0),
+           facts.Choice(uid='choice'),
+           facts.Finish(uid='finish', start='start', results={}, nesting=0),
+           facts.Jump(state_from='start', state_to='choice')]
+
+    previous_uid = 'choice'
+
+    for i in range(main_path_length):
+        kb += [facts.State(uid='main_%d' % i),
+               facts.Jump(state_from=previous_uid, state_to='main_%d' % i)]
+        previous_uid = 'main_%d' % i
+
+    kb += facts.Jump(state_from=previous_uid, state_to='finish')
+
+    previous_uid = 'choice'
+
+    for i in range(depth):
+        kb += [facts.State(uid='dead_%d' % i),
+               facts.Jump(state_from=previous_uid, state_to='dead_%d' % i)]
+        previous_uid = 'dead_%d' % i
+
+    return kb
+
+
+def prepare_quest(kb, rng=random):
+    transformators.activate_events(kb, rng=rng)
+    transformators.remove_restricted_states(kb)
+    return kb
+
+
+def random_new_person_arguments(rng, places_number, persons_number):
+    '''
+    arguments of new_person call, like the ones used by quests
+    '''
+    arguments = {}
+
+    if rng.random() < 0.3:
+        arguments['first_initiator'] = True
+
+    if rng.random() < 0.2:
+        arguments['candidates'] = tuple('person_%d' % rng.randrange(persons_number) for i in range(rng.randint(1, 3)))
+
+    if rng.random() < 0.3:
+        arguments['professions'] = (rng.choice((relations.PROFESSION.NONE, relations.PROFESSION.BLACKSMITH, relations.PROFESSION.ROGUE)),)
+
+    if rng.random() < 0.3:
+        arguments['places'] = tuple('place_%d' % rng.randrange(places_number) for i in range(rng.randint(1, 3)))
+
+    if rng.random() < 0.3:
+        arguments['restrict_places'] = False
+
+    if rng.random() < 0.2:
+        arguments['restrict_persons'] = False
+
+    connection = ('person_%d' % rng.randrange(persons_number), rng.choice((relations.SOCIAL_RELATIONS.PARTNER, relations.SOCIAL_RELATIONS.CONCURRENT)))
+
+    if rng.random() < 0.5:
+        arguments['restrict_social_connections'] = (connection,)
+    else:
+        arguments['social_connections'] = (connection,)
+
+    return arguments
+
+
+def random_new_place_arguments(rng, places_number):
+    arguments = {}
+
+    if rng.random() < 0.3:
+        arguments['candidates'] = tuple('place_%d' % rng.randrange(places_number) for i in range(rng.randint(1, 3)))
+
+    if rng.random() < 0.5:
+        arguments['terrains'] = tuple(rng.randrange(TERRAINS_NUMBER + 1) for i in range(rng.randint(0, 2)))
+
+    if rng.random() < 0.3:
+        arguments['types'] = (rng.choice((relations.PLACE_TYPE.NONE, relations.PLACE_TYPE.HOLY_CITY)),)
+
+    return arguments
+
+
+TAGS = (None, ('can_start', ), ('can_continue', ), ('can_start', 'can_continue'))
+
+
+def random_quest_arguments(rng, quests):
+    '''
+    arguments of quest_from_* call, like the ones used by selector
+    '''
+    types = [quest.TYPE for quest in quests]
+
+    arguments = {'tags': rng.choice(TAGS)}
+
+    if rng.random() < 0.7:
+        arguments['excluded'] = set(rng.sample(types, rng.randint(0, 3)))
+
+    if rng.random() < 0.3:
+        arguments['allowed'] = tuple(rng.sample(types, rng.randint(1, 5)))
+
+    return arguments
+
+
+class Interpreter(object):
+    '''
+    interpreter, that satisfies every requirement when asked and logs all callbacks
+
+    Question conditions are satisfied only if they are in always_satisfied
+    '''
+
+    def __init__(self, always_satisfied=(), log=False):
+        self.satisfied_requirements = set(always_satisfied)
+        self.always_satisfied = frozenset(always_satisfied)
+        self.log = [] if log else None
+
+    def _log(self, *event):
+        if self.log is not None:
+            self.log.append(event)
+
+    def on_state__before_actions(self, state):
+        self._log('on_state__before_actions', state.uid)
+        self.satisfied_requirements = set(self.always_satisfied)
+
+    def on_state__after_actions(self, state): self._log('on_state__after_actions', state.uid)
+    def on_jump_start__before_actions(self, jump): self._log('on_jump_start__before_actions', jump.uid)
+    def on_jump_start__after_actions(self, jump): self._log('on_jump_start__after_actions', jump.uid)
+    def on_jump_end__before_actions(self, jump): self._log('on_jump_end__before_actions', jump.uid)
+    def on_jump_end__after_actions(self, jump): self._log('on_jump_end__after_actions', jump.uid)
+
+    def _do(self, action): self._log('do', action)
+
+    do_message = do_give_reward = do_fight = do_do_nothing = do_upgrade_equipment = do_move_near = _do
+
+    def _check(self, requirement):
+        self._log('check', requirement)
+        return requirement in self.satisfied_requirements
+
+    check_located_in = check_located_near = check_located_on_road = check_has_money = check_is_alive = _check
+
+    def _satisfy(self, requirement):
+        self._log('satisfy', requirement)
+        self.satisfied_requirements.add(requirement)
+
+    satisfy_located_in = satisfy_located_near = satisfy_located_on_road = satisfy_has_money = satisfy_is_alive = _satisfy
+
+
+def run_machine(machine, max_steps=10000):
+    steps = 0
+
+    while machine.do_step():
+        steps += 1
+
+        if steps >= max_steps:
+            break
+
+    return steps
@@ -4,10 +4,12 @@ import random
 
 from questgen import facts
 from questgen import exceptions
+from questgen import instrumentation
 from questgen.quests.base_quest import RESULTS
 
 
-def activate_events(knowledge_base):
+@instrumentation.instrumented(instrumentation.STAGE.TRANSFORMATOR)
+def activate_events(knowledge_base, rng=random):
     choosen_facts = []
     removed_facts = []
 
@@ -20,14 +22,15 @@ def activate_events(knowledge_base):
         if not event_facts:
             raise exceptions.NoEventMembersError(event=event)
 
-        choosen_facts.append(random.choice(event_facts))
+        choosen_facts.append(rng.choice(event_facts))
         removed_facts.extend(event_facts)
 
     knowledge_base -= set(removed_facts) - set(choosen_facts)
 
 
 # here we MUST already have correct graph
-def determine_default_choices(knowledge_base, preferred_markers=()):
+@instrumentation.instrumented(instrumentation.STAGE.TRANSFORMATOR)
+def determine_default_choices(knowledge_base, preferred_markers=(), rng=random):
     '''
     '''
     processed_choices = set()
@@ -48,8 +51,8 @@ def determine_default_choices(knowledge_base, preferred_markers=()):
         processed_choices.add(choice.uid)
 
         options_choices = [option
-                           for option in knowledge_base.filter(facts.Option)
-                           if option.state_from == choice.uid and option.uid not in restricted_options]
+                           for option in knowledge_base.jumps_from(choice.uid)
+                           if isinstance(option, facts.Option) and option.uid not in restricted_options]
 
         if not options_choices:
             # if there no valid options (in valuid graph), then all options where cancels by other chocices
@@ -65,7 +68,7 @@ def determine_default_choices(knowledge_base, preferred_markers=()):
         if not filtered_options_choices:
             filtered_options_choices = options_choices
 
-        default_option = random.choice(filtered_options_choices)
+        default_option = rng.choice(filtered_options_choices)
 
         if default_option.uid in linked_options:
             for linked_option_uid in linked_options[default_option.uid].options:
@@ -118,66 +121,106 @@ def change_choice(knowledge_base, new_option_uid, default):
     return True
 
 
+def _is_broken_state(knowledge_base, state, jumps_to_number, jumps_from_number):
+    if isinstance(state, facts.Start) and state.is_external:
+        return False
+
+    if not jumps_to_number.get(state.uid):
+        return True
+
+    if isinstance(state, facts.Finish) and state.is_external:
+        return False
+
+    if isinstance(state, facts.Question):
+        answers = [answer for answer in knowledge_base.jumps_from(state.uid) if isinstance(answer, facts.Answer)]
+
+        if len(answers) == 2:
+            if ( (answers[0].condition and not answers[1].condition) or
+                 (not answers[0].condition and answers[1].condition) ):
+                return False
+
+        return True
+
+    return not jumps_from_number.get(state.uid)
+
+
+@instrumentation.instrumented(instrumentation.STAGE.TRANSFORMATOR)
 def remove_broken_states(knowledge_base):
+    '''
+    removes states, which can not be reached or from which quest can not be continued, and jumps between removed states
 
-    # print '------------'
-    # print [s.uid for s in knowledge_base.filter(facts.State)]
-    # print '------------'
+    removing is done in rounds, like full sweeps until nothing changed,
+    but every round checks only states and jumps near to facts, removed in previous round
+    '''
 
     knowledge_base -= list(knowledge_base.filter(facts.FakeFinish))
 
-    while True:
-        states_to_remove = set()
+    jumps_to_number = {}
+    jumps_from_number = {}
 
-        for state in knowledge_base.filter(facts.State):
-            if isinstance(state, facts.Start) and state.is_external:
-                pass
+    for jump in knowledge_base.filter(facts.Jump):
+        jumps_from_number[jump.state_from] = jumps_from_number.get(jump.state_from, 0) + 1
+        jumps_to_number[jump.state_to] = jumps_to_number.get(jump.state_to, 0) + 1
 
-            elif not [jump for jump in knowledge_base.filter(facts.Jump) if jump.state_to == state.uid]:
-                states_to_remove.add(state)
+    links_by_option = {}
 
-            elif isinstance(state, facts.Finish) and state.is_external:
-                pass
+    for link in knowledge_base.filter(facts.OptionsLink):
+        for option_uid in link.options:
+            if option_uid not in links_by_option:
+                links_by_option[option_uid] = []
+            links_by_option[option_uid].append(link)
 
-            elif isinstance(state, facts.Question):
-                answers = [answer for answer in knowledge_base.filter(facts.Answer) if answer.state_from == state.uid]
+    states_to_check = list(knowledge_base.filter(facts.State))
+    jumps_to_check = None # all jumps
 
-                if len(answers) == 2:
-                    if ( (answers[0].condition and not answers[1].condition) or
-                         (not answers[0].condition and answers[1].condition) ):
-                        continue
+    while True:
+        states_to_remove = set(state
+                               for state in states_to_check
+                               if _is_broken_state(knowledge_base, state, jumps_to_number, jumps_from_number))
 
-                states_to_remove.add(state)
+        knowledge_base -= states_to_remove
 
-            elif not [jump for jump in knowledge_base.filter(facts.Jump) if jump.state_from == state.uid]:
-                states_to_remove.add(state)
+        if jumps_to_check is None:
+            jumps_to_check = knowledge_base.filter(facts.Jump)
+        else:
+            # only jumps of removed states lost their ends
+            jumps_to_check = set()
 
-        # print 'remove states', [s.uid for s in states_to_remove]
-        knowledge_base -= states_to_remove
+            for state in states_to_remove:
+                jumps_to_check.update(knowledge_base.jumps_from(state.uid))
+                jumps_to_check.update(knowledge_base.jumps_to(state.uid))
 
         jumps_to_remove = set()
 
-        for jump in knowledge_base.filter(facts.Jump):
+        for jump in jumps_to_check:
             if jump.state_from in knowledge_base and jump.state_to in knowledge_base:
                 continue
 
-            # print 'remove jump', jump.uid, (jump.state_from in knowledge_base), (jump.state_to in knowledge_base)
             jumps_to_remove.add(jump)
 
             if isinstance(jump, facts.Option):
-                links = [l for l in knowledge_base.filter(facts.OptionsLink) if jump.uid in l.options]
-                if links:
-                    for link in links:
-                        for option_uid in link.options:
-                            # print 'remove linked jump', option_uid
-                            jumps_to_remove.add(knowledge_base[option_uid])
+                for link in links_by_option.get(jump.uid, ()):
+                    for option_uid in link.options:
+                        jumps_to_remove.add(knowledge_base[option_uid])
 
         knowledge_base -= jumps_to_remove
 
         if not states_to_remove and not jumps_to_remove:
             break
 
+        states_to_check = set()
+
+        for jump in jumps_to_remove:
+            jumps_from_number[jump.state_from] -= 1
+            jumps_to_number[jump.state_to] -= 1
+
+            for state_uid in (jump.state_from, jump.state_to):
+                state = knowledge_base.get(state_uid)
+                if isinstance(state, facts.State):
+                    states_to_check.add(state)
+
 
+@instrumentation.instrumented(instrumentation.STAGE.TRANSFORMATOR)
 def remove_restricted_states(knowledge_base):
 
     states_to_remove = set()
@@ -215,6 +258,7 @@ def _get_actors(record):
     return used_actors
 
 
+@instrumentation.instrumented(instrumentation.STAGE.TRANSFORMATOR)
 def remove_unused_actors(knowledge_base):
     used_actors = set()
 